@@ -21,11 +21,16 @@ import urllib.parse
 import sys
 import os
 import json
+import glob
+import zlib
+import threading
+import time
+from datetime import datetime, timedelta
 from typing import Tuple, Union, Optional, Dict, List, Any
-import google.auth
-import google.oauth2
-from google.oauth2 import service_account
-from google_auth_oauthlib.flow import Flow
+from dispatch import Scheduler
+from ratelimit import limiter_for, DEFAULT_RATE
+# google.auth, google.oauth2 and google_auth_oauthlib are imported where they
+# are used to keep CLI startup fast.
 
 
 # If using Web flow, the redirect URL must match exactly what’s configured in
@@ -44,10 +49,23 @@ class Configure(object):
         service_account_path = os.path.join(config_dir, "service-account.json")
         client_secrets_path = os.path.join(config_dir, "client-secrets.json")
         token_path = "token.json"
+        token_cache_path = os.path.join(config_dir, "access-token-cache.json")
+        service_account_pool_dir = os.path.join(config_dir, "service-accounts")
+        feed_history_path = os.path.join(config_dir, "feed-history.sqlite")
+        product_index_path = os.path.join(config_dir, "product-index.sqlite")
+        shared_quota_dir = os.path.join(config_dir, "quota")
         config_object = {
             "service_account_path": service_account_path,
             "client_secrets_path": client_secrets_path,
             "token_path": token_path,
+            "token_cache_path": token_cache_path,
+            "service_account_pool_dir": service_account_pool_dir,
+            "feed_history_path": feed_history_path,
+            "product_index_path": product_index_path,
+            "shared_quota_dir": shared_quota_dir,
+            # fetch schedule of data sources created without a time_zone / fetch_hour
+            "feed_fetch_time_zone": "UTC",
+            "feed_fetch_hour": 2,
         }
         return config_object
     
@@ -75,6 +93,9 @@ class Storage(object):
       An instance of google.oauth2.credentials.Credentials if token
       retrieval succeeds, or None if it fails for any reason.
     """
+    import google.auth.exceptions
+    import google.auth.transport.requests
+    import google.oauth2.credentials
     try:
       with open(self._config["token_path"], "r") as infile:
         token = json.load(infile)
@@ -87,8 +108,11 @@ class Storage(object):
           token_uri=client_info["token_uri"],
           scopes=self._scopes)
       full_token_path = os.path.join(os.getcwd(), self._config["token_path"])
-      # Access tokens aren't stored (and may be expired even if we did), so
-      # we'll need to refresh to ensure we have valid credentials.
+      # Reuse a cached access token when it is still valid, otherwise we'll
+      # need to refresh to ensure we have valid credentials.
+      if TokenCache(self._config["token_cache_path"]).load(credentials):
+        print(f"Using stored credentials from {full_token_path} (cached access token).")
+        return credentials
       try:
         credentials.refresh(google.auth.transport.requests.Request())
         print(f"Using stored credentials from {full_token_path}.")
@@ -133,6 +157,252 @@ class Storage(object):
             "top-level README.")
       sys.exit(1)
 
+class TokenCache(object):
+  """On-disk cache of access tokens and their expiry, shared across runs.
+
+  Entries are keyed per credential identity (service account email or OAuth
+  client ID + refresh token) and the file is written with owner-only (0600)
+  permissions.
+  """
+  # tokens closer than this to expiry are not reused
+  _MIN_REMAINING = timedelta(minutes=5)
+
+  def __init__(self, path):
+    self._path = path
+    self._lock = threading.Lock()
+
+  @staticmethod
+  def cache_key(credentials):
+    """Returns a stable identity for the credentials, or None if unknown."""
+    email = getattr(credentials, "service_account_email", None)
+    if email:
+      return f"sa:{email}"
+    refresh_token = getattr(credentials, "refresh_token", None)
+    if refresh_token:
+      digest = hashlib.sha256(refresh_token.encode("utf-8")).hexdigest()[:16]
+      return f"user:{getattr(credentials, 'client_id', '')}:{digest}"
+    return None
+
+  def _read(self):
+    try:
+      with open(self._path, "r") as infile:
+        return json.load(infile)
+    except (IOError, ValueError):
+      return {}
+
+  def load(self, credentials):
+    """Applies a cached, unexpired access token to `credentials`.
+
+    Returns:
+      True if a usable token was found and applied, otherwise False.
+    """
+    key = self.cache_key(credentials)
+    if key is None:
+      return False
+    entry = self._read().get(key)
+    if not entry:
+      return False
+    try:
+      expiry = datetime.fromisoformat(entry["expiry"])
+    except (KeyError, TypeError, ValueError):
+      return False
+    # google-auth uses naive UTC datetimes for expiry
+    if expiry - _utcnow() < self._MIN_REMAINING:
+      return False
+    credentials.token = entry["token"]
+    credentials.expiry = expiry
+    return True
+
+  def save(self, credentials):
+    """Stores the current access token of `credentials` with its expiry."""
+    key = self.cache_key(credentials)
+    if key is None or not credentials.token or not credentials.expiry:
+      return
+    with self._lock:
+      cache = self._read()
+      cache[key] = {
+          "token": credentials.token,
+          "expiry": credentials.expiry.isoformat(),
+      }
+      os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+      tmp_path = f"{self._path}.{os.getpid()}.tmp"
+      fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+      with os.fdopen(fd, "w") as outfile:
+        json.dump(cache, outfile, sort_keys=True, indent=2)
+      os.chmod(tmp_path, 0o600)
+      os.replace(tmp_path, self._path)
+
+class TokenRefresher(threading.Thread):
+  """Background thread refreshing credentials ahead of expiry.
+
+  Keeps the access token valid so no RPC has to block on a synchronous
+  refresh, and writes every new token to the `TokenCache`.
+  """
+  def __init__(self, credentials, cache, lead_time=600, retry_interval=30,
+               request=None):
+    super().__init__(name="gmcm-token-refresher", daemon=True)
+    self._credentials = credentials
+    self._cache = cache
+    self._lead_time = lead_time
+    self._retry_interval = retry_interval
+    self._request = request
+    self._stop_event = threading.Event()
+
+  def refresh(self):
+    """Refreshes the credentials now and stores the new token."""
+    if self._request is None:
+      import google.auth.transport.requests
+      self._request = google.auth.transport.requests.Request()
+    self._credentials.refresh(self._request)
+    self._cache.save(self._credentials)
+
+  def seconds_until_refresh(self):
+    expiry = self._credentials.expiry
+    if not self._credentials.token or expiry is None:
+      return 0
+    return max(0, (expiry - _utcnow()).total_seconds() - self._lead_time)
+
+  def run(self):
+    while not self._stop_event.is_set():
+      wait = self.seconds_until_refresh()
+      if wait > 0:
+        self._stop_event.wait(wait)
+        continue
+      try:
+        self.refresh()
+      except Exception as e:
+        print(f"Background token refresh failed, retrying in "
+              f"{self._retry_interval}s: {repr(e)}")
+        self._stop_event.wait(self._retry_interval)
+        continue
+      if self.seconds_until_refresh() == 0:
+        # token lifetime shorter than the lead time, avoid a refresh loop
+        self._stop_event.wait(self._retry_interval)
+
+  def stop(self):
+    self._stop_event.set()
+
+_refreshers = []
+
+def _utcnow():
+  return datetime.utcnow()
+
+def prepare_credentials(credentials, config, background_refresh=True,
+                        request=None):
+  """Loads a cached access token (refreshing once if there is none) and
+  starts a background refresher.
+
+  Args:
+    credentials: google.auth credentials from any of the auth flows.
+    config: the configuration object from `Configure.get_config`.
+    background_refresh: start a `TokenRefresher` thread.
+    request: optional google.auth transport request, e.g. for a fake token
+      endpoint.
+
+  Returns:
+    The same credentials, holding a valid access token.
+  """
+  if credentials is None:
+    return None
+  cache = TokenCache(config["token_cache_path"])
+  refresher = TokenRefresher(credentials, cache, request=request)
+  # a cached token is used as is (Storage.get reports it for stored credentials)
+  if not cache.load(credentials):
+    if credentials.valid:
+      cache.save(credentials)
+    else:
+      refresher.refresh()
+  if background_refresh:
+    refresher.start()
+    _refreshers.append(refresher)
+  return credentials
+
+def stop_token_refreshers():
+  """Stops all background refreshers started by `prepare_credentials`."""
+  while _refreshers:
+    _refreshers.pop().stop()
+
+class Shard(object):
+  """A set of credentials tied to one GCP project quota, with its own rate limiter
+  and request scheduler."""
+  def __init__(self, name, credentials, rate=DEFAULT_RATE):
+    self.name = name
+    self.credentials = credentials
+    self.limiter = limiter_for(quota_key(name, credentials), rate)
+    self.scheduler = Scheduler()
+
+  def __repr__(self):
+    return f"Shard({self.name!r})"
+
+def quota_key(name, credentials):
+  """Identifies the quota `credentials` draw from: the GCP project of a service
+  account, else the OAuth client, else the shard name."""
+  for attribute in ("project_id", "service_account_email", "client_id"):
+    value = getattr(credentials, attribute, None)
+    if value:
+      return f"{attribute}:{value}"
+  return f"shard:{name}"
+
+class CredentialPool(object):
+  """Pool of service-account shards, merchants are routed to a shard either
+  by an explicit `"credential"` entry in merchant-info.json (the key file name
+  without `.json`) or by a stable hash of the merchant ID."""
+  def __init__(self, shards, assignments=None):
+    if not shards:
+      raise ValueError("CredentialPool requires at least one shard")
+    self.shards = list(shards)
+    self._by_name = {shard.name: shard for shard in self.shards}
+    self._assignments = {}
+    for merchant_id, name in (assignments or {}).items():
+      if name not in self._by_name:
+        print(f"Unknown credential '{name}' for merchant {merchant_id}, "
+              "using hash-based sharding instead.")
+        continue
+      self._assignments[str(merchant_id)] = self._by_name[name]
+
+  def shard_for(self, merchant_id=None):
+    """Returns the shard responsible for `merchant_id` (first shard if None)."""
+    if merchant_id is None:
+      return self.shards[0]
+    merchant_id = str(merchant_id)
+    shard = self._assignments.get(merchant_id)
+    if shard is None:
+      shard = self.shards[zlib.crc32(merchant_id.encode("utf-8")) % len(self.shards)]
+    return shard
+
+  def __iter__(self):
+    return iter(self.shards)
+
+  def __len__(self):
+    return len(self.shards)
+
+def load_credential_pool(config, background_refresh=True):
+  """Builds a `CredentialPool` from every key file in `authfiles/service-accounts/`.
+
+  Returns:
+    A CredentialPool, or None if the directory has no key files.
+  """
+  key_files = sorted(glob.glob(os.path.join(config["service_account_pool_dir"], "*.json")))
+  if not key_files:
+    return None
+  from google.oauth2 import service_account
+  shards = []
+  for key_file in key_files:
+    name = os.path.splitext(os.path.basename(key_file))[0]
+    credentials = service_account.Credentials.from_service_account_file(
+        key_file, scopes=[_SCOPE])
+    credentials = prepare_credentials(credentials, config,
+                                      background_refresh=background_refresh)
+    shards.append(Shard(name, credentials))
+  assignments = {
+      merchant["merchantId"]: merchant["credential"]
+      for merchant in Configure.read_merchant_ids()
+      if merchant.get("merchantId") and merchant.get("credential")
+  }
+  print(f"Service account pool found: {len(shards)} credential shard(s) "
+        f"({', '.join(shard.name for shard in shards)}).")
+  return CredentialPool(shards, assignments)
+
 # generate_user_credentials
 def get_credentials_from_token(config):
   """Generates OAuth2 refresh token from stored local token file."""
@@ -156,6 +426,7 @@ def get_credentials_from_client_secrets(config):
   Returns:
     Credentials used to authenticate with the Merchant API.
   """
+  from google_auth_oauthlib.flow import Flow
   # A list of API scopes to include in the auth request, see:
   # https://developers.google.com/identity/protocols/oauth2/scopes
   scopes = [_SCOPE]
@@ -262,15 +533,31 @@ def parse_raw_query_params(data):
   return {key: val for key, val in pairs}
 
 # main auth logic
-def authorize():
-  """Generates OAuth2 credentials."""
+def authorize(background_refresh=True):
+  """Generates OAuth2 credentials.
+
+  Access tokens are cached on disk between runs and refreshed in the
+  background ahead of expiry (see `prepare_credentials`). If
+  `authfiles/service-accounts/` holds key files, a `CredentialPool` sharding
+  merchants across them is returned instead of a single credential.
+  """
   # Gets the configuration object that has the paths on the local machine to
   # the `service-account.json`, `token.json`, and `client-secrets.json` files.
   config = Configure().get_config()
+  pool = load_credential_pool(config, background_refresh=background_refresh)
+  if pool is not None:
+    return pool
+  credentials = load_credentials(config)
+  return prepare_credentials(credentials, config,
+                             background_refresh=background_refresh)
+
+def load_credentials(config):
+  """Builds credentials from the service account, token or client secrets files."""
   service_account_path = config["service_account_path"]
   print("Configuring service account credentials.")
   if os.path.isfile(service_account_path):
     print("Service account credentials found. Attempting to authenticate.")
+    from google.oauth2 import service_account
     credentials = service_account.Credentials.from_service_account_file(
         service_account_path,
         scopes=[_SCOPE])
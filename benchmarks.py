@@ -0,0 +1,341 @@
+"""
+Benchmarks for GMCM.
+
+startup: measures CLI start time ('main.py --help' in a fresh interpreter) and
+the slowest imports reported by 'python -X importtime'. Exits non-zero when the
+median exceeds '--max-seconds' so wrapper scripts or CI can track regressions.
+
+api: runs the service functions against the local fake Merchant API
+(fakeapi.py) and reports throughput, p50/p99 RPC latency and peak memory per
+function. Results can be saved as JSON and compared with a saved baseline.
+
+decode: per-product cost of turning a decoded `ListProductsResponse` page into
+report records (and of building product details), reading fields through the
+proto-plus wrappers as the product loops used to vs the raw protobuf path.
+
+Usage:
+  python benchmarks.py startup --runs 10 --max-seconds 0.5
+  python benchmarks.py api --merchants 3 --catalog 5000 --latency-ms 20 --json bench.json
+  python benchmarks.py api --catalog 5000 --baseline bench.json --tolerance 0.2
+  python benchmarks.py decode --products 5000 --disapproved-rate 0.5
+"""
+
+# imports
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+def time_command(cmd, runs):
+    """Runs `cmd` `runs` times and returns the wall times in seconds."""
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run(cmd, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start_time)
+    return timings
+
+def import_times(module="main", top=10):
+    """Returns the `top` slowest (cumulative_us, module) pairs for importing `module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        entries.append((int(cumulative), name))
+    entries.sort(reverse=True)
+    return entries[:top]
+
+def bench_startup(runs=10, max_seconds=None):
+    """Benchmarks CLI startup, returns the median wall time in seconds."""
+    cmd = [sys.executable, os.path.join(BASE_DIR, "main.py"), "--help"]
+    time_command(cmd, 1)  # warm the filesystem/bytecode caches
+    timings = time_command(cmd, runs)
+    median = statistics.median(timings)
+    print(f"Startup ('main.py --help'), {runs} runs:\n"
+          f"  median: {median:.3f}s  min: {min(timings):.3f}s  max: {max(timings):.3f}s")
+    print("Slowest imports for 'import main' (cumulative):")
+    for cumulative, name in import_times("main"):
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    if max_seconds is not None and median > max_seconds:
+        print(f"FAIL: median startup {median:.3f}s exceeds {max_seconds}s")
+        sys.exit(1)
+    return median
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def api_cases(fake, prod_menu_choice="all_disapproved"):
+    """Returns (name, callable) pairs, each callable returns the number of items processed."""
+    import services
+    credentials = fake.credentials
+    merchants = fake.merchants
+    state = {}
+
+    def accounts():
+        return services.get_accounts(credentials, merchants=merchants)[2]
+
+    def account_errors():
+        return services.get_account_errors(credentials, merchants=merchants)[2]
+
+    def feeds_list():
+        state["feeds"] = services.get_feeds_list(credentials, merchants=merchants)[0]
+        return len(state["feeds"])
+
+    def feed_status():
+        result = services.get_feed_status(credentials, state["feeds"])
+        state["failed"] = result[2]
+        return len(state["feeds"])
+
+    def fetch():
+        services.fetch_feed(credentials, feed_info=state["failed"])
+        return len(state["failed"])
+
+    def products():
+        return services.disapproved_products(credentials, prod_menu_choice, merchants=merchants)[2]
+
+    return [
+        ("get_accounts", accounts),
+        ("get_account_errors", account_errors),
+        ("get_feeds_list", feeds_list),
+        ("get_feed_status", feed_status),
+        ("fetch_feed", fetch),
+        ("disapproved_products", products),
+    ]
+
+def run_case(fake, func, measure_memory=True):
+    """Runs one benchmark case and returns its metrics."""
+    fake.stats.reset()
+    requests_before = sum(fake.request_counts.values())
+    rejected_before = sum(fake.rejected_counts.values())
+    if measure_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    error = None
+    items = 0
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            items = func() or 0
+    except Exception as e:
+        # unhandled errors (e.g. a 429 in a function without retries) are part of the result
+        error = repr(e).split("\n")[0]
+    elapsed = time.perf_counter() - start_time
+    peak = 0
+    if measure_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    latencies = fake.stats.all_latencies()
+    return {
+        "seconds": round(elapsed, 4),
+        "items": items,
+        "items_per_sec": round(items / elapsed, 2) if elapsed else 0.0,
+        "rpcs": sum(fake.request_counts.values()) - requests_before,
+        "rejected_429": sum(fake.rejected_counts.values()) - rejected_before,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "peak_mem_mb": round(peak / 1024 / 1024, 2),
+        "error": error,
+    }
+
+def bench_api(merchants=3, catalog=1000, feeds=10, page_size=250, latency_ms=0.0,
+              latency_dist="fixed", rate_429=0.0, rate=0.0, measure_memory=True,
+              prod_menu_choice="all_disapproved"):
+    """Benchmarks the service functions against the fake API, returns {name: metrics}."""
+    import fakeapi
+    import services
+    from ratelimit import RateLimiter
+    results = {}
+    with fakeapi.FakeMerchantAPI(merchant_count=merchants, catalog_size=catalog,
+                                 feeds_per_merchant=feeds, page_size=page_size,
+                                 latency_ms=latency_ms, latency_dist=latency_dist,
+                                 rate_429=rate_429) as fake:
+        fake.install()
+        fake.prewarm(250)  # page size used by services.disapproved_products
+        # rate 0 = unlimited, measures the client code rather than the quota
+        services.get_shard(fake.credentials).limiter = RateLimiter(rate if rate > 0 else 1e9)
+        for name, func in api_cases(fake, prod_menu_choice):
+            results[name] = run_case(fake, func, measure_memory=measure_memory)
+    header = f"{'function':<22}{'sec':>9}{'items':>9}{'items/s':>11}{'rpcs':>7}{'429s':>6}{'p50 ms':>9}{'p99 ms':>9}{'peak MB':>9}"
+    print(f"Fake API: {merchants} merchants x {catalog} products, {feeds} feeds each, "
+          f"page size {page_size}, latency {latency_ms}ms ({latency_dist}), 429 rate {rate_429}")
+    print(header)
+    for name, metrics in results.items():
+        print(f"{name:<22}{metrics['seconds']:>9}{metrics['items']:>9}{metrics['items_per_sec']:>11}"
+              f"{metrics['rpcs']:>7}{metrics['rejected_429']:>6}{metrics['p50_ms']:>9}"
+              f"{metrics['p99_ms']:>9}{metrics['peak_mem_mb']:>9}")
+        if metrics["error"]:
+            print(f"  ERROR in {name}: {metrics['error']}")
+    return results
+
+def compare_baseline(results, baseline_path, tolerance):
+    """Returns a list of regressions where throughput dropped by more than `tolerance`."""
+    with open(baseline_path, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = []
+    for name, metrics in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get("items_per_sec"):
+            continue
+        change = metrics["items_per_sec"] / previous["items_per_sec"] - 1
+        if change < -tolerance:
+            regressions.append(f"{name}: {previous['items_per_sec']} -> {metrics['items_per_sec']} items/s ({change:+.0%})")
+    return regressions
+
+def _proto_plus_issue_records(products, prop, merchant_id, prod_menu_choice):
+    """The former proto-plus product loop of `services.disapproved_products` (reference)."""
+    import records
+    extra_fields = records.PRODUCT_ISSUE_EXTRA_FIELDS.get(prod_menu_choice, ())
+    for product in products:
+        attributes = product.attributes
+        product_name = getattr(attributes, "title", None)
+        product_link = getattr(attributes, "link", None)
+        product_price = getattr(attributes, "price", None)
+        product_sale_price = getattr(attributes, "sale_price", None)
+        feed_label = records.intern(product.feed_label)
+        advertised_price = product_sale_price if product_sale_price else product_price
+        for destination in product.product_status.destination_statuses:
+            if not destination.disapproved_countries:
+                continue
+            for issue in product.product_status.item_level_issues:
+                issue_code = issue.code if issue else ""
+                issue_severity = issue.severity.name if issue.severity else None
+                issue_attribute = issue.attribute if issue else ""
+                conditions = {
+                    "all_disapproved": issue_severity and issue_severity != "NOT_IMPACTED",
+                    "landing_page_errors": "landing_page_error" in issue_code,
+                    "broken_images": issue_code == "image_link_broken",
+                    "price_updates": "price" in issue_attribute,
+                    "policy_violations": "policy_violation" in issue_code,
+                    "invalid_upc": "invalid_upc" in issue_code,
+                    "no_impact": issue_severity == "NOT_IMPACTED",
+                }
+                if conditions.get(prod_menu_choice, False):
+                    amount_micros, currency = records.price_micros(advertised_price)
+                    yield records.ProductIssue(
+                        prop, merchant_id, product.offer_id, amount_micros, currency, product_name,
+                        product_link, product.name, feed_label, records.intern(issue_code),
+                        records.intern(issue_severity), records.intern(issue_attribute), issue.description,
+                        attributes.image_link if "image_link" in extra_fields else None,
+                        ",".join(attributes.gtin) if "gtin" in extra_fields else None)
+
+def _proto_plus_details(product):
+    """The former proto-plus product detail dict of `services.get_product_auto` (reference)."""
+    attributes = product.attributes
+    entry = {"feed_resource_id": product.data_source, "product_resource_id": product.name,
+             "productID": product.offer_id}
+    for key, field in (("product_name", "title"), ("product_price", "price"), ("product_sale_price", "sale_price"),
+                       ("product_link", "link"), ("mobile_link", "mobile_link"),
+                       ("canonical_link", "canonical_link"), ("image_link", "image_link"),
+                       ("ads_redirect", "ads_redirect"), ("display_ads_link", "display_ads_link"),
+                       ("link_template", "link_template"), ("mobile_link_template", "mobile_link_template"),
+                       ("gtin", "gtin")):
+        value = getattr(attributes, field, None)
+        entry[key] = value if field in ("price", "sale_price") else str(value)
+    entry["custom_attributes"] = [{"name": attr.name, "value": attr.value} for attr in product.custom_attributes]
+    return entry
+
+def _best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+def bench_decode(products=5000, disapproved_rate=0.2, repeat=5, prod_menu_choice="all_disapproved"):
+    """Per-product decode cost, proto-plus field access vs the raw protobuf path.
+    Returns {case: microseconds per product}."""
+    import fakeapi
+    import records
+    from google.shopping.merchant_products_v1beta import ListProductsResponse
+    fake = fakeapi.FakeMerchantAPI(merchant_count=1, catalog_size=products, disapproved_rate=disapproved_rate)
+    merchant_id = fake.merchants[0]["merchantId"]
+    payload = ListProductsResponse.serialize(ListProductsResponse(
+        products=[fake.make_product(merchant_id, index) for index in range(products)]))
+    response = ListProductsResponse.deserialize(payload)  # what the client hands back
+    proto_plus_rows = list(_proto_plus_issue_records(response.products, "prop", merchant_id, prod_menu_choice))
+    raw_rows = list(records.product_issue_records(response.products.pb, "prop", merchant_id, prod_menu_choice))
+    if proto_plus_rows != raw_rows:
+        raise AssertionError("raw protobuf records differ from the proto-plus records")
+    cases = {
+        "issue records, proto-plus": lambda: list(
+            _proto_plus_issue_records(response.products, "prop", merchant_id, prod_menu_choice)),
+        "issue records, raw": lambda: list(
+            records.product_issue_records(response.products.pb, "prop", merchant_id, prod_menu_choice)),
+        "product details, proto-plus": lambda: [_proto_plus_details(product) for product in response.products],
+        "product details, raw": lambda: [records.product_details(product) for product in response.products],
+    }
+    results = {name: round(_best_of(func, repeat) / products * 1e6, 3) for name, func in cases.items()}
+    print(f"Decode cost per product ({products} products, {disapproved_rate:.0%} disapproved, "
+          f"'{prod_menu_choice}', {len(raw_rows)} records, best of {repeat}):")
+    for name, micros in results.items():
+        print(f"  {name:<30}{micros:>9.2f} us")
+    for case in ("issue records", "product details"):
+        print(f"  {case}: {results[case + ', proto-plus'] / results[case + ', raw']:.1f}x faster on the raw path")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(prog="benchmarks", description="GMCM benchmarks")
+    subparsers = parser.add_subparsers(dest="bench", required=True)
+    startup = subparsers.add_parser("startup", help="CLI startup and import time")
+    startup.add_argument("--runs", type=int, default=10)
+    startup.add_argument("--max-seconds", type=float, default=None,
+                         help="Fail if the median startup time exceeds this value")
+    api = subparsers.add_parser("api", help="Service functions against the local fake Merchant API")
+    api.add_argument("--merchants", type=int, default=3)
+    api.add_argument("--catalog", type=int, default=1000, help="Products per merchant")
+    api.add_argument("--feeds", type=int, default=10, help="Data sources per merchant")
+    api.add_argument("--page-size", type=int, default=250)
+    api.add_argument("--latency-ms", type=float, default=0.0, help="Mean injected latency per RPC")
+    api.add_argument("--latency-dist", default="fixed", choices=["fixed", "uniform", "exponential", "lognormal"])
+    api.add_argument("--rate-429", type=float, default=0.0, help="Share of requests rejected with 429")
+    api.add_argument("--rate", type=float, default=0.0, help="Client rate limit in req/s (0 = unlimited)")
+    api.add_argument("--no-memory", action="store_true", help="Skip tracemalloc peak memory tracking")
+    api.add_argument("--json", help="Write the results to this JSON file")
+    api.add_argument("--baseline", help="Compare with a results JSON file from an earlier run")
+    api.add_argument("--tolerance", type=float, default=0.2, help="Allowed throughput drop vs baseline")
+    decode = subparsers.add_parser("decode", help="Per-product decode cost, proto-plus vs raw protobuf")
+    decode.add_argument("--products", type=int, default=5000)
+    decode.add_argument("--disapproved-rate", type=float, default=0.2)
+    decode.add_argument("--repeat", type=int, default=5)
+    decode.add_argument("--choice", default="all_disapproved", help="Disapproved products menu choice")
+    args = parser.parse_args()
+    if args.bench == "decode":
+        bench_decode(products=args.products, disapproved_rate=args.disapproved_rate,
+                     repeat=args.repeat, prod_menu_choice=args.choice)
+    elif args.bench == "startup":
+        bench_startup(runs=args.runs, max_seconds=args.max_seconds)
+    elif args.bench == "api":
+        results = bench_api(
+            merchants=args.merchants, catalog=args.catalog, feeds=args.feeds,
+            page_size=args.page_size, latency_ms=args.latency_ms, latency_dist=args.latency_dist,
+            rate_429=args.rate_429, rate=args.rate, measure_memory=not args.no_memory)
+        if args.json:
+            with open(args.json, "w") as json_file:
+                json.dump(results, json_file, indent=2)
+            print(f"Results saved to {args.json}")
+        if args.baseline:
+            regressions = compare_baseline(results, args.baseline, args.tolerance)
+            if regressions:
+                print("FAIL: throughput regressions vs baseline:\n  " + "\n  ".join(regressions))
+                sys.exit(1)
+            print("No regressions vs baseline.")
+
+if __name__ == '__main__':
+    main()
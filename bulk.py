@@ -0,0 +1,333 @@
+"""
+Bulk operations.
+
+create_data_sources: creates data sources from `helpers.process_file` rows.
+Every row is validated up front, rows matching an existing feed (same name or
+fetch URL in one `get_feeds_list` snapshot of the target accounts) are
+skipped (rows of accounts whose feeds could not be listed are marked failed
+rather than created), and the remaining rows are created concurrently under
+the per-shard rate limiters. A result CSV records the outcome per row; re-running with the
+same result file only retries the rows that did not succeed.
+
+insert_product_inputs: applies attribute patches (e.g. corrected landing page
+URLs from a CSV) as `ProductInput` inserts. Each product is fetched and diffed
+against its patch, inserts run concurrently with rate limiting and retries,
+and every item's outcome is recorded. A dry run only records the diffs.
+"""
+
+# imports
+import csv
+import os
+import re
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import dispatch
+import services
+
+FEED_FIELDS = ("account_id", "feed_name", "fetch_uri", "content_lang", "countries", "feed_label",
+               "time_zone", "fetch_hour")
+# fields identifying a feed across runs, the fetch schedule is not part of it
+FEED_KEY_FIELDS = FEED_FIELDS[:6]
+FEED_RESULT_FIELDS = ("row",) + FEED_FIELDS + ("status", "data_source", "error")
+# result statuses that are not retried on a re-run
+DONE_STATUSES = ("created", "exists")
+
+_LANGUAGE = re.compile(r"^[a-z]{2,3}$")
+_COUNTRY = re.compile(r"^[A-Z]{2}$")
+_FEED_LABEL = re.compile(r"^[A-Z0-9_-]{1,20}$")
+
+
+def validate_feed_entry(entry):
+    """Returns a list of problems with a feed entry, empty if it is valid."""
+    problems = []
+    if not str(entry.get("account_id", "")).strip().isdigit():
+        problems.append("account_id must be a numeric Merchant Center ID")
+    if not entry.get("feed_name", "").strip():
+        problems.append("feed name is empty")
+    if not re.match(r"^(https?|s?ftp)://[^\s/]+", entry.get("fetch_uri", "").strip()):
+        problems.append("fetch URI must be an http(s), ftp or sftp URL")
+    if not _LANGUAGE.match(entry.get("content_lang", "").strip()):
+        problems.append("content language must be an ISO 639-1 code, e.g. 'en'")
+    countries = [country.strip() for country in entry.get("countries", "").split(",") if country.strip()]
+    if not countries or not all(_COUNTRY.match(country) for country in countries):
+        problems.append("countries must be ISO 3166-1 alpha-2 codes, e.g. 'US,CA'")
+    if not _FEED_LABEL.match(entry.get("feed_label", "").strip()):
+        problems.append("feed label must be up to 20 uppercase letters, digits, '-' or '_'")
+    time_zone = str(entry.get("time_zone", "")).strip()
+    if time_zone and not _valid_time_zone(time_zone):
+        problems.append(f"unknown time zone '{time_zone}', e.g. 'America/New_York'")
+    fetch_hour = str(entry.get("fetch_hour", "")).strip()
+    if fetch_hour and not (fetch_hour.isdigit() and 0 <= int(fetch_hour) <= 23):
+        problems.append("fetch hour must be 0-23")
+    return problems
+
+def _valid_time_zone(time_zone):
+    import zoneinfo
+    try:
+        zoneinfo.ZoneInfo(time_zone)
+        return True
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        # without a time zone database (e.g. Windows without tzdata) it can't be checked
+        return not zoneinfo.available_timezones()
+
+def normalize_feed_entry(entry, defaults=None):
+    """Strips whitespace, normalizes the case of codes and fills an empty time_zone /
+    fetch_hour from `defaults` (the auth.py feed fetch settings)."""
+    entry = {field: str(entry.get(field, "")).strip() for field in FEED_FIELDS}
+    defaults = defaults or {}
+    entry["time_zone"] = entry["time_zone"] or str(defaults.get("feed_fetch_time_zone", ""))
+    entry["fetch_hour"] = entry["fetch_hour"] or str(defaults.get("feed_fetch_hour", ""))
+    entry["content_lang"] = entry["content_lang"].lower()
+    entry["countries"] = ",".join(country.strip().upper() for country in entry["countries"].split(",") if country.strip())
+    entry["feed_label"] = entry["feed_label"].upper()
+    return entry
+
+def feed_key(entry):
+    return tuple(entry[field] for field in FEED_KEY_FIELDS)
+
+def read_results(result_path):
+    """Previous results keyed by `feed_key`, {} if there is no result file."""
+    if not result_path or not os.path.isfile(result_path):
+        return {}
+    results = {}
+    with open(result_path, mode="r", encoding="utf-8", newline="") as result_file:
+        for row in csv.DictReader(result_file):
+            key = feed_key(row)
+            if key not in results or row["status"] in DONE_STATUSES:
+                results[key] = row
+    return results
+
+def write_results(result_path, results):
+    with open(result_path, mode="w", encoding="utf-8", newline="") as result_file:
+        writer = csv.DictWriter(result_file, fieldnames=FEED_RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+def existing_feeds(credentials, account_ids):
+    """One `get_feeds_list` snapshot of the given accounts:
+    {account_id: (set of lowercase feed names, set of fetch URLs)}. Accounts whose
+    feeds could not be listed are left out."""
+    merchants = [{"propName": account_id, "merchantId": account_id} for account_id in sorted(account_ids)]
+    failed = set()
+    all_feed_data, _, _ = services.get_feeds_list(credentials, merchants=merchants, failed=failed)
+    snapshot = {account_id: (set(), set()) for account_id in account_ids if account_id not in failed}
+    for feed in all_feed_data:
+        feed_names, feed_urls = snapshot.setdefault(str(feed["mID"]), (set(), set()))
+        feed_names.add(str(feed["feed_name"]).lower())
+        if feed["url"]:
+            feed_urls.add(feed["url"])
+    return snapshot
+
+def create_data_sources(credentials, entries, result_path=None, workers=4):
+    """Creates data sources for `entries` (`helpers.process_file` rows).
+    Returns the per-row results, also written to `result_path` if given."""
+    from auth import Configure as ac
+    defaults = ac().get_config()
+    previous = read_results(result_path)
+    results = []
+    pending = []
+    seen = set()
+    for row_number, entry in enumerate(entries, 1):
+        entry = normalize_feed_entry(entry, defaults)
+        result = {"row": row_number, **entry, "status": "", "data_source": "", "error": ""}
+        results.append(result)
+        key = feed_key(entry)
+        done = previous.get(key)
+        if key in seen:
+            result.update(status="duplicate", error="same feed as an earlier row")
+        elif done and done["status"] in DONE_STATUSES:
+            result.update(status=done["status"], data_source=done["data_source"], error=done["error"])
+        else:
+            problems = validate_feed_entry(entry)
+            if problems:
+                result.update(status="invalid", error="; ".join(problems))
+            else:
+                pending.append(result)
+        seen.add(key)
+    if pending:
+        snapshot = existing_feeds(credentials, {result["account_id"] for result in pending})
+        to_create = []
+        for result in pending:
+            if result["account_id"] not in snapshot:
+                # not created blind, a re-run retries the row
+                result.update(status="failed", error="could not check existing feeds")
+                continue
+            feed_names, feed_urls = snapshot[result["account_id"]]
+            if result["feed_name"].lower() in feed_names or result["fetch_uri"] in feed_urls:
+                result.update(status="exists", error="a feed with this name or fetch URI exists")
+            else:
+                to_create.append(result)
+        unchecked = sum(result["status"] == "failed" for result in pending)
+        print(f"Creating {len(to_create)} data sources ({len(pending) - len(to_create) - unchecked} already exist"
+              f"{f', {unchecked} in accounts whose feeds could not be listed' if unchecked else ''})...")
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for result, outcome in zip(to_create, executor.map(lambda result: _create(credentials, result), to_create)):
+                result.update(outcome)
+                print(f"Row {result['row']}: {result['feed_name']} ({result['account_id']}) - {result['status']}"
+                      f"{' - ' + result['error'] if result['error'] else ''}")
+    if result_path:
+        write_results(result_path, results)
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    print("Data source results: " + ", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))
+          + (f"\nPer row results saved to {result_path}" if result_path else ""))
+    return results
+
+def _create(credentials, entry):
+    try:
+        with dispatch.priority(dispatch.BULK):
+            response = services.create_data_source(credentials, entry)
+        return {"status": "created", "data_source": response.name}
+    except Exception as e:
+        return {"status": "failed", "error": str(e).split("\n")[0]}
+
+def read_product_patches(file_path):
+    """Streams (product_resource_id, {attribute: value}, data_source) from a CSV with a
+    'product_resource_id' column (a resource name, or an offer ID, GTIN or link to look
+    up in the product index), one column per attribute to set (e.g. 'link',
+    'mobile_link') and an optional 'data_source' column. Empty cells are ignored,
+    values are converted with `parse_attribute`."""
+    with open(file_path, mode="r", encoding="utf-8", newline="") as csv_file:
+        reader = csv.DictReader(csv_file)
+        if "product_resource_id" not in (reader.fieldnames or []):
+            raise ValueError("CSV must contain a 'product_resource_id' column.")
+        for attribute in reader.fieldnames:
+            if attribute and attribute.strip() not in ("product_resource_id", "data_source"):
+                attribute_field(attribute.strip())
+        for row in reader:
+            product_resource_id = row.pop("product_resource_id").strip()
+            data_source = (row.pop("data_source", None) or "").strip() or None
+            patch = {attribute.strip(): value.strip() for attribute, value in row.items()
+                     if attribute and value and value.strip()}
+            if product_resource_id:
+                yield product_resource_id, patch, data_source
+
+# CSV values of scalar attribute types, repeated strings are comma-separated
+_BOOLEANS = {"true": True, "yes": True, "1": True, "false": False, "no": False, "0": False}
+_PARSERS = {
+    "STRING": str,
+    "INT64": int,
+    "DOUBLE": float,
+    "BOOL": lambda value: _BOOLEANS[value.lower()],
+}
+
+def attribute_field(attribute):
+    """The proto-plus field of a patchable `Attributes` attribute. Raises ValueError
+    for unknown attributes and message attributes (e.g. price), which a CSV cell can't set."""
+    from google.shopping.merchant_products_v1beta import Attributes
+    field = Attributes.meta.fields.get(attribute)
+    if field is None:
+        raise ValueError(f"Unknown product attribute '{attribute}'")
+    if field.proto_type.name not in _PARSERS or (field.repeated and field.proto_type.name != "STRING"):
+        raise ValueError(f"Product attribute '{attribute}' can't be set from a CSV column")
+    return field
+
+def parse_attribute(attribute, value):
+    """Converts a CSV value to the type of `attribute`: str, int, float, bool or a
+    list of str for repeated attributes (e.g. gtin, comma-separated)."""
+    field = attribute_field(attribute)
+    if field.repeated:
+        return [item.strip() for item in value.split(",") if item.strip()]
+    try:
+        return _PARSERS[field.proto_type.name](value)
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid value {value!r} for product attribute '{attribute}'") from None
+
+def diff_attributes(attributes, patch):
+    """[(attribute, current value, new value)] for the patch values that differ."""
+    changes = []
+    for attribute, value in patch.items():
+        new = parse_attribute(attribute, value)
+        current = getattr(attributes, attribute)
+        if isinstance(new, list):
+            current = list(current)
+        if current != new:
+            changes.append((attribute, current, new))
+    return changes
+
+def apply_patch(product_resource_id, product, patch):
+    """Builds the `ProductInput` for `product` with the patched attributes set,
+    `patch` values are already converted (see `diff_attributes`)."""
+    product_input, account = services.create_product_input(product_resource_id, product)
+    for attribute, value in patch.items():
+        setattr(product_input.attributes, attribute, value)
+    return product_input, account
+
+PRODUCT_RESULT_FIELDS = ("product_resource_id", "status", "changes", "data_source", "product_input", "error")
+
+def _patch_product(credentials, product_resource_id, patch, data_source, dry_run):
+    result = {"product_resource_id": product_resource_id, "status": "", "changes": "",
+              "data_source": data_source or "", "product_input": "", "error": ""}
+    with dispatch.priority(dispatch.BULK):
+        try:
+            product = services.get_product(credentials, product_resource_id)
+            changes = diff_attributes(product.attributes, patch)
+            result["changes"] = "; ".join(f"{attribute}: {current!r} -> {new!r}" for attribute, current, new in changes)
+            result["data_source"] = data_source or product.data_source
+            if not changes:
+                result["status"] = "unchanged"
+            elif dry_run:
+                result["status"] = "dry_run"
+            else:
+                product_input, account = apply_patch(product_resource_id, product, {
+                    attribute: new for attribute, _, new in changes})
+                response = services.send_product_input(credentials, account, result["data_source"], product_input)
+                result.update(status="inserted", product_input=response.name)
+        except Exception as e:
+            result.update(status="failed", error=str(e).split("\n")[0])
+    return result
+
+def _failed(product_resource_id, data_source, error):
+    """A done future with a failed `_patch_product` result."""
+    future = Future()
+    future.set_result({"product_resource_id": product_resource_id, "status": "failed", "changes": "",
+                       "data_source": data_source or "", "product_input": "", "error": error})
+    return future
+
+def insert_product_inputs(credentials, patches, dry_run=False, result_path=None, workers=4, index=None):
+    """Applies (product_resource_id, patch, data_source) patches as `ProductInput` inserts.
+    Every product is fetched and diffed against its patch; unchanged products are
+    skipped and `dry_run` only records the diff. Up to `workers` products are in
+    flight at a time (all requests pass the shard rate limiters), so `patches` can
+    be a stream. IDs that are not resource names are resolved with `index` (a
+    `productindex.ProductIndex`). Returns {status: count}, per item outcomes go to `result_path`."""
+    counts = {}
+    result_file = open(result_path, mode="w", encoding="utf-8", newline="") if result_path else None
+    writer = csv.DictWriter(result_file, fieldnames=PRODUCT_RESULT_FIELDS) if result_file else None
+    if writer:
+        writer.writeheader()
+
+    def record(result):
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+        if writer:
+            writer.writerow(result)
+        done = sum(counts.values())
+        if done % 100 == 0:
+            print(f"{done} products processed: {counts}")
+
+    in_flight = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for product_resource_id, patch, data_source in patches:
+                if len(in_flight) >= workers * 4:
+                    record(in_flight.popleft().result())
+                if not product_resource_id.startswith("accounts/"):
+                    try:
+                        if index is None:
+                            raise LookupError("not a product resource name and no product index given")
+                        product_resource_id = index.resolve(product_resource_id)
+                    except LookupError as e:
+                        in_flight.append(_failed(product_resource_id, data_source, str(e)))
+                        continue
+                in_flight.append(executor.submit(
+                    _patch_product, credentials, product_resource_id, patch, data_source, dry_run))
+            while in_flight:
+                record(in_flight.popleft().result())
+    finally:
+        if result_file:
+            result_file.close()
+    print(f"{'Dry run' if dry_run else 'Product input inserts'} complete: "
+          + ", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))
+          + (f"\nPer product results saved to {result_path}" if result_path else ""))
+    return counts
@@ -0,0 +1,109 @@
+"""
+In-process LRU + TTL cache with request coalescing.
+
+Used in front of `GetProduct` (see `services.get_product`): a product fetched
+by the landing page flow, the products menu or a bulk job is served from
+memory for `ttl` seconds, and concurrent callers asking for the same key while
+it is being fetched wait for that one call instead of issuing their own.
+Failed loads are not cached, every waiting caller gets the error.
+"""
+
+# imports
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TTLCache(object):
+    """Thread-safe LRU cache of at most `max_size` entries, each kept for `ttl` seconds."""
+
+    def __init__(self, max_size=1024, ttl=300.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._in_flight = {}  # key -> Future of the running load
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """The cached value of `key` if it has not expired, else `default`."""
+        with self._lock:
+            return self._get(key, default)
+
+    def _get(self, key, default):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if entry[0] <= self.clock():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._put(key, value)
+
+    def _put(self, key, value):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get_or_load(self, key, load):
+        """Returns the cached value of `key`, or calls `load()` once for all concurrent
+        callers of the same key and caches its result. Exceptions of `load` are raised
+        to every waiting caller and not cached."""
+        missing = object()
+        with self._lock:
+            value = self._get(key, missing)
+            if value is not missing:
+                self.hits += 1
+                return value
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+                leader = True
+        if not leader:
+            return future.result()
+        try:
+            value = load()
+        except BaseException as e:
+            with self._lock:
+                if self._in_flight.get(key) is future:
+                    del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            # an invalidate() during the load drops the in-flight entry, the result is then not cached
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+                self._put(key, value)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key):
+        """Drops `key`, a load already running for it is not cached."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._in_flight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._in_flight.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "coalesced": self.coalesced}
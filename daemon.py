@@ -0,0 +1,139 @@
+"""
+Long-running scheduler mode.
+
+Holds a single set of credentials and the cached service clients for the life
+of the process and runs report jobs on fixed intervals, writing each report to
+a directory. This replaces one cron invocation per report, which pays the
+interpreter start, imports, authorization and channel setup every time.
+
+Usage:
+  python main.py --daemon feeds=60 accountissues=1440 lperrors=1440 --report-dir reports
+  (job=interval in minutes)
+"""
+
+# imports
+import os
+import time
+import helpers
+import metrics
+import records
+import services
+import tracing
+
+
+def job_feeds(credentials):
+    """Feed status report, failed feeds are written as a separate file."""
+    with tracing.span("list_feeds"):
+        all_feed_data, feed_table, feed_count = services.get_feeds_list(credentials)
+    import history
+    with history.open_default() as feed_history:
+        with tracing.span("feed_statuses", feeds=feed_count):
+            feed_status_data, feed_status_table, failed_feeds, fail_count, not_fail_count = services.get_feed_status(
+                credentials, all_feed_data, history=feed_history)
+        anomalies = history.anomaly_report(feed_history)
+    print(f"Feeds: {feed_count} total, {not_fail_count} without problems, {fail_count} FAILED")
+    for anomaly in anomalies:
+        print(f"  {anomaly}")
+    reports = {"feeds_status": feed_status_table}
+    if failed_feeds:
+        import pandas as pd
+        reports["failed_feeds"] = pd.DataFrame(failed_feeds)
+    return reports
+
+def job_account_issues(credentials):
+    """Account issues report for all merchants."""
+    account_issues_data, account_issues_table, account_issues_count = services.get_account_errors(credentials)
+    print(f"Account issues: {account_issues_count}")
+    return {"account_errors": account_issues_table}
+
+def job_lp_errors(credentials):
+    """Disapproved products due to landing page errors."""
+    prod_menu_choice = "landing_page_errors"
+    summary = records.IssueSummary()
+    disapproved_product_data, disapproved_product_data_table, disapproved_product_count = services.disapproved_products(
+        credentials, prod_menu_choice, summary=summary)
+    print(f"Disapproved products ({prod_menu_choice}): {disapproved_product_count}")
+    return {f"{prod_menu_choice}-summary": summary.to_frame(), prod_menu_choice: disapproved_product_data_table}
+
+# job name map, names match the '--auto' choices
+job_map = {
+    "feeds": job_feeds,
+    "accountissues": job_account_issues,
+    "lperrors": job_lp_errors,
+}
+
+def parse_job_specs(job_specs):
+    """Parses 'job=minutes' strings into a {job: interval_seconds} dict.
+    Raises ValueError for unknown jobs or invalid intervals."""
+    jobs = {}
+    for spec in job_specs:
+        name, _, minutes = spec.partition("=")
+        name = name.strip().lower()
+        if name not in job_map:
+            raise ValueError(f"Unknown daemon job '{name}', choose from: {', '.join(job_map)}")
+        try:
+            interval = float(minutes) * 60 if minutes else 60 * 60
+        except ValueError:
+            raise ValueError(f"Invalid interval for job '{name}': '{minutes}'")
+        if interval <= 0:
+            raise ValueError(f"Interval for job '{name}' must be positive")
+        jobs[name] = interval
+    return jobs
+
+def write_reports(reports, report_dir, timestamp):
+    """Writes each non-empty report table as `<name>-<timestamp>.csv` and returns the paths."""
+    os.makedirs(report_dir, exist_ok=True)
+    paths = []
+    for name, table in reports.items():
+        if table is None or table.empty:
+            continue
+        path = os.path.join(report_dir, f"{name}-{timestamp}.csv")
+        table.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+def run_job(name, credentials, report_dir):
+    """Runs a single job, errors are reported and swallowed so the daemon keeps running."""
+    timestamp = helpers.generate_timestamp()
+    start_time = time.time()
+    print(f"\n[{timestamp}] Running job '{name}'...")
+    try:
+        with tracing.span(f"job:{name}"):
+            reports = job_map[name](credentials)
+            with tracing.span("write"):
+                paths = write_reports(reports, report_dir, timestamp)
+        for path in paths:
+            print(f"Report saved: {path}")
+    except Exception as e:
+        print(f"Job '{name}' failed: {repr(e)}")
+    print(f"Job '{name}' finished in {round(time.time() - start_time, 2)} seconds")
+
+def run_daemon(credentials, jobs, report_dir, max_runs=None, metrics_out=None):
+    """Runs `jobs` ({name: interval_seconds}) until interrupted.
+
+    All jobs run once at startup and are then rescheduled relative to their
+    previous start time. `max_runs` limits the total number of job runs (for testing).
+    If `metrics_out` is set, the cumulative API metrics are written there after every job.
+    """
+    next_run = {name: time.monotonic() for name in jobs}
+    runs = 0
+    print(f"Daemon started, jobs: "
+          + ", ".join(f"{name} every {round(interval / 60, 2)} min" for name, interval in jobs.items())
+          + f"\nReports directory: {os.path.abspath(report_dir)}\n"
+          "Press CTRL+C to stop.")
+    try:
+        while max_runs is None or runs < max_runs:
+            name = min(next_run, key=next_run.get)
+            delay = next_run[name] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            started = time.monotonic()
+            run_job(name, credentials, report_dir)
+            if metrics_out:
+                metrics.registry.write(metrics_out)
+            runs += 1
+            next_run[name] = started + jobs[name]
+    except KeyboardInterrupt:
+        print("\nDaemon stopped at user request.")
+    finally:
+        services.clear_clients()
@@ -0,0 +1,101 @@
+"""
+Priority-aware request scheduling.
+
+Every Merchant API request waits for a permit from its shard's `Scheduler`
+(see `services.throttle`) before it is sent. Permits are handed out one at a
+time at the shard's rate limit, by priority class first (interactive actions
+such as a single product lookup or a feed reprocess, then regular reports,
+then bulk paging and bulk jobs) and round-robin across merchants within a
+class, so one large account can't starve the others.
+
+Functions in services.py pass their natural priority; bulk jobs run their
+calls under `with dispatch.priority(dispatch.BULK):`, which overrides it for
+the current thread.
+"""
+
+# imports
+import contextlib
+import threading
+import time
+from collections import OrderedDict, deque
+
+INTERACTIVE = 0  # single product lookups, product input inserts, feed reprocessing
+NORMAL = 1  # reports: accounts, account issues, feeds, feed statuses
+BULK = 2  # product scans, bulk jobs, index refreshes
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BULK: "bulk"}
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def priority(level):
+    """Runs the calls of the current thread with priority `level`."""
+    previous = getattr(_local, "priority", None)
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+def current_priority(default=NORMAL):
+    """The priority set with `priority()` for this thread, else `default`."""
+    level = getattr(_local, "priority", None)
+    return default if level is None else level
+
+
+class Scheduler(object):
+    """Hands out request permits by priority, round-robin across merchants within
+    a priority class. The permit holder then waits on the rate limiter, so
+    permits are granted at the limiter's rate."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        # priority -> OrderedDict of merchant -> deque of waiting tickets, in round-robin order
+        self._queues = {}
+        self._busy = False
+        self.granted = {}
+
+    def waiting(self):
+        """Number of waiting requests per priority."""
+        with self._cond:
+            return {level: sum(len(tickets) for tickets in merchants.values())
+                    for level, merchants in sorted(self._queues.items()) if merchants}
+
+    def _next(self):
+        for level in sorted(self._queues):
+            merchants = self._queues[level]
+            if not merchants:
+                continue
+            merchant_id, tickets = next(iter(merchants.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                merchants.move_to_end(merchant_id)  # this merchant's next request waits for the others
+            else:
+                del merchants[merchant_id]
+            self.granted[level] = self.granted.get(level, 0) + 1
+            return ticket
+        return None
+
+    def acquire(self, limiter, level=NORMAL, merchant_id=None):
+        """Blocks until this request's turn and the `limiter` allow it to be sent.
+        Returns the seconds waited."""
+        start_time = time.monotonic()
+        ticket = [False]
+        with self._cond:
+            self._queues.setdefault(level, OrderedDict()).setdefault(merchant_id, deque()).append(ticket)
+            while not ticket[0]:
+                if self._busy:
+                    self._cond.wait()
+                    continue
+                self._busy = True
+                self._next()[0] = True
+                if not ticket[0]:
+                    self._cond.notify_all()
+                    self._cond.wait()
+        try:
+            limiter.acquire()
+        finally:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+        return time.monotonic() - start_time
@@ -0,0 +1,426 @@
+"""
+Local fake of the Merchant API for offline benchmarks.
+
+Serves the DataSources, FileUploads, Products, ProductInputs, Accounts and
+AccountIssues services over a real in-process gRPC server, so the service
+functions run through the same client libraries, channel and proto
+(de)serialization as against production. The catalog is generated
+deterministically per page, latency is sampled from a configurable
+distribution and a share of requests can be rejected with
+RESOURCE_EXHAUSTED (HTTP 429).
+
+Usage:
+  with FakeMerchantAPI(catalog_size=5000, latency_ms=20) as fake:
+      fake.install()  # route services.get_client to the fake server
+      services.disapproved_products(fake.credentials, "all_disapproved", merchants=fake.merchants)
+"""
+
+# imports
+import bisect
+import datetime
+import random
+import threading
+import time
+from concurrent import futures
+
+# issue codes used for generated products: (code, severity, attribute)
+_ITEM_ISSUES = [
+    ("landing_page_error", "DISAPPROVED", "link"),
+    ("mobile_landing_page_error", "DISAPPROVED", "mobile_link"),
+    ("image_link_broken", "DISAPPROVED", "image_link"),
+    ("invalid_upc", "DISAPPROVED", "gtin"),
+    ("policy_violation", "DISAPPROVED", ""),
+    ("price_mismatch", "DISAPPROVED", "price"),
+    ("missing_size", "NOT_IMPACTED", "size"),
+]
+_ACCOUNT_ISSUES = [("CRITICAL", "Misrepresentation"), ("ERROR", "Missing shipping"), ("SUGGESTION", "Add returns policy")]
+_PROCESSING_STATES = ["SUCCEEDED", "SUCCEEDED", "SUCCEEDED", "IN_PROGRESS", "FAILED"]
+
+
+class CallStats(object):
+    """Thread-safe per-method client call latencies, recorded by `_TimingInterceptor`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+
+    def record(self, method, seconds):
+        with self._lock:
+            bisect.insort(self.latencies.setdefault(method, []), seconds)
+
+    def reset(self):
+        with self._lock:
+            self.latencies = {}
+
+    def all_latencies(self):
+        with self._lock:
+            return sorted(value for values in self.latencies.values() for value in values)
+
+def _interceptor_base():
+    import grpc
+
+    class _TimingInterceptor(grpc.UnaryUnaryClientInterceptor):
+        """Client interceptor measuring wall time per unary call."""
+        def __init__(self, stats):
+            self._stats = stats
+
+        def intercept_unary_unary(self, continuation, client_call_details, request):
+            start_time = time.perf_counter()
+            try:
+                response = continuation(client_call_details, request)
+                response.result()  # wait for completion before timing
+                return response
+            finally:
+                method = client_call_details.method.rsplit("/", 1)[-1]
+                self._stats.record(method, time.perf_counter() - start_time)
+
+    return _TimingInterceptor
+
+class FakeMerchantAPI(object):
+    """In-process fake Merchant API server.
+
+    Args:
+      merchant_count: number of merchant accounts served.
+      catalog_size: products per merchant.
+      feeds_per_merchant: data sources per merchant.
+      page_size: maximum page size honored by list methods.
+      latency_ms: mean injected server latency per RPC.
+      latency_dist: "fixed", "uniform", "exponential" or "lognormal".
+      rate_429: probability a request is rejected with RESOURCE_EXHAUSTED.
+      disapproved_rate: share of products with a disapproved destination.
+      seed: random seed, the generated catalog is deterministic per seed.
+      upload_interval: seconds between the generated file uploads of a data source.
+    """
+
+    def __init__(self, merchant_count=3, catalog_size=1000, feeds_per_merchant=10,
+                 page_size=250, latency_ms=0.0, latency_dist="fixed", rate_429=0.0,
+                 disapproved_rate=0.2, seed=1234, max_workers=16, upload_interval=3600.0):
+        if latency_dist not in ("fixed", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency_dist}")
+        self.merchant_count = merchant_count
+        self.catalog_size = catalog_size
+        self.feeds_per_merchant = feeds_per_merchant
+        self.page_size = page_size
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.rate_429 = rate_429
+        self.disapproved_rate = disapproved_rate
+        self.seed = seed
+        self.upload_interval = upload_interval
+        self.max_workers = max_workers
+        self.merchants = [
+            {"propName": f"prop{index:03d}", "merchantId": str(1000000 + index)}
+            for index in range(merchant_count)
+        ]
+        self._merchant_index = {merchant["merchantId"]: index for index, merchant in enumerate(self.merchants)}
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.request_counts = {}
+        self.rejected_counts = {}
+        self.inserted_inputs = []
+        self._page_cache = {}
+        self.stats = CallStats()
+        self.credentials = None
+        self.address = None
+        self._server = None
+        self._channel = None
+        self._previous_factory = None
+
+    # lifecycle
+    def start(self):
+        import grpc
+        from google.auth.credentials import AnonymousCredentials
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=self.max_workers))
+        for service, handlers in self._handlers().items():
+            self._server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(service, handlers),))
+        port = self._server.add_insecure_port("127.0.0.1:0")
+        self._server.start()
+        self.address = f"127.0.0.1:{port}"
+        self._channel = grpc.intercept_channel(
+            grpc.insecure_channel(self.address), _interceptor_base()(self.stats))
+        self.credentials = AnonymousCredentials()
+        return self
+
+    def stop(self):
+        self.uninstall()
+        if self._channel is not None:
+            self._channel.close()
+        if self._server is not None:
+            self._server.stop(grace=None)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def client(self, client_cls, credentials=None):
+        """Builds a `client_cls` bound to the fake server channel."""
+        transport_cls = client_cls.get_transport_class("grpc")
+        return client_cls(transport=transport_cls(channel=self._channel))
+
+    def install(self):
+        """Routes `services.get_client` to this fake until `uninstall`."""
+        import services
+        services.clear_clients()
+        self._previous_factory = services.set_client_factory(self.client)
+
+    def uninstall(self):
+        if self._previous_factory is None:
+            return
+        import services
+        services.clear_clients()
+        services.set_client_factory(self._previous_factory)
+        self._previous_factory = None
+
+    # request handling
+    def _sample_latency(self):
+        mean = self.latency_ms / 1000.0
+        if mean <= 0:
+            return 0.0
+        with self._rng_lock:
+            if self.latency_dist == "fixed":
+                return mean
+            if self.latency_dist == "uniform":
+                return self._rng.uniform(0, 2 * mean)
+            if self.latency_dist == "exponential":
+                return self._rng.expovariate(1 / mean)
+            # lognormal with sigma 1, scaled so the mean matches
+            return self._rng.lognormvariate(0, 1) * mean / 1.6487
+
+    def _wrap(self, name, func):
+        import grpc
+
+        def handler(request, context):
+            with self._rng_lock:
+                self.request_counts[name] = self.request_counts.get(name, 0) + 1
+                rejected = self.rate_429 > 0 and self._rng.random() < self.rate_429
+            delay = self._sample_latency()
+            if delay:
+                time.sleep(delay)
+            if rejected:
+                with self._rng_lock:
+                    self.rejected_counts[name] = self.rejected_counts.get(name, 0) + 1
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Quota exceeded (fake)")
+            return func(request, context)
+        return handler
+
+    def _handlers(self):
+        import grpc
+        from google.protobuf import empty_pb2
+        from google.shopping.merchant_accounts_v1beta.types import accounts, accountissue
+        from google.shopping.merchant_datasources_v1beta.types import datasources, fileuploads
+        from google.shopping.merchant_products_v1beta.types import products, productinputs
+
+        def unary(name, func, request_cls, response_serializer):
+            return grpc.unary_unary_rpc_method_handler(
+                self._wrap(name, func),
+                request_deserializer=request_cls.deserialize,
+                response_serializer=response_serializer)
+
+        prefix = "google.shopping.merchant"
+        return {
+            f"{prefix}.accounts.v1beta.AccountsService": {
+                "GetAccount": unary("GetAccount", self.get_account, accounts.GetAccountRequest,
+                                    accounts.Account.serialize),
+            },
+            f"{prefix}.accounts.v1beta.AccountIssueService": {
+                "ListAccountIssues": unary("ListAccountIssues", self.list_account_issues,
+                                           accountissue.ListAccountIssuesRequest,
+                                           accountissue.ListAccountIssuesResponse.serialize),
+            },
+            f"{prefix}.datasources.v1beta.DataSourcesService": {
+                "ListDataSources": unary("ListDataSources", self.list_data_sources,
+                                         datasources.ListDataSourcesRequest,
+                                         datasources.ListDataSourcesResponse.serialize),
+                "FetchDataSource": unary("FetchDataSource", self.fetch_data_source,
+                                         datasources.FetchDataSourceRequest,
+                                         empty_pb2.Empty.SerializeToString),
+                "CreateDataSource": unary("CreateDataSource", self.create_data_source,
+                                          datasources.CreateDataSourceRequest,
+                                          datasources.DataSource.serialize),
+            },
+            f"{prefix}.datasources.v1beta.FileUploadsService": {
+                "GetFileUpload": unary("GetFileUpload", self.get_file_upload,
+                                       fileuploads.GetFileUploadRequest,
+                                       fileuploads.FileUpload.serialize),
+            },
+            f"{prefix}.products.v1beta.ProductsService": {
+                # pages are served pre-serialized, see `_product_page`
+                "ListProducts": unary("ListProducts", self.list_products, products.ListProductsRequest,
+                                      bytes),
+                "GetProduct": unary("GetProduct", self.get_product, products.GetProductRequest,
+                                    products.Product.serialize),
+            },
+            f"{prefix}.products.v1beta.ProductInputsService": {
+                "InsertProductInput": unary("InsertProductInput", self.insert_product_input,
+                                            productinputs.InsertProductInputRequest,
+                                            productinputs.ProductInput.serialize),
+            },
+        }
+
+    def _merchant(self, resource, context):
+        import grpc
+        merchant_id = resource.split("/")[1] if resource.startswith("accounts/") else None
+        if merchant_id not in self._merchant_index:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Unknown account: {resource}")
+        return merchant_id
+
+    # generated data
+    def make_product(self, merchant_id, index):
+        """Deterministically generates product `index` of `merchant_id`."""
+        from google.shopping import merchant_products_v1beta as products
+        rng = random.Random(f"{self.seed}:{merchant_id}:{index}")
+        offer_id = f"SKU{index:07d}"
+        feed = rng.randrange(max(1, self.feeds_per_merchant))
+        product = products.Product(
+            name=f"accounts/{merchant_id}/products/online~en~US~{offer_id}",
+            offer_id=offer_id,
+            content_language="en",
+            feed_label="US",
+            data_source=f"accounts/{merchant_id}/dataSources/{feed + 1}",
+        )
+        attributes = product.attributes
+        attributes.title = f"Product {index} for {merchant_id}"
+        attributes.link = f"https://shop{merchant_id}.example.com/p/{offer_id}"
+        attributes.image_link = f"https://img{merchant_id}.example.com/{offer_id}.jpg"
+        attributes.gtin = [f"{rng.randrange(10 ** 11, 10 ** 12)}"]
+        attributes.price.amount_micros = rng.randrange(1, 500) * 1000000 + 990000
+        attributes.price.currency_code = "USD"
+        if rng.random() < 0.3:
+            attributes.sale_price.amount_micros = attributes.price.amount_micros // 2
+            attributes.sale_price.currency_code = "USD"
+        status = product.product_status
+        destination = products.ProductStatus.DestinationStatus(
+            reporting_context="SHOPPING_ADS", approved_countries=["US"])
+        issues = []
+        if rng.random() < self.disapproved_rate:
+            destination = products.ProductStatus.DestinationStatus(
+                reporting_context="SHOPPING_ADS", disapproved_countries=["US"])
+            for code, severity, attribute in rng.sample(_ITEM_ISSUES, rng.randint(1, 2)):
+                issues.append(products.ProductStatus.ItemLevelIssue(
+                    code=code, severity=severity, attribute=attribute,
+                    description=f"{code.replace('_', ' ').capitalize()}",
+                    applicable_countries=["US"]))
+        status.destination_statuses = [destination]
+        status.item_level_issues = issues
+        return product
+
+    # service methods
+    def get_account(self, request, context):
+        from google.shopping.merchant_accounts_v1beta.types import accounts
+        merchant_id = self._merchant(request.name, context)
+        return accounts.Account(
+            name=request.name, account_id=int(merchant_id),
+            account_name=f"Fake account {merchant_id}", language_code="en",
+            time_zone={"id": "America/Los_Angeles"})
+
+    def list_account_issues(self, request, context):
+        from google.shopping.merchant_accounts_v1beta.types import accountissue
+        merchant_id = self._merchant(request.parent, context)
+        issues = [
+            accountissue.AccountIssue(
+                name=f"{request.parent}/issues/{index}", title=title, severity=severity,
+                detail=f"{title} for {merchant_id}", documentation_uri="https://support.google.com/merchants")
+            for index, (severity, title) in enumerate(_ACCOUNT_ISSUES[:int(merchant_id) % 3 + 1])
+        ]
+        return accountissue.ListAccountIssuesResponse(account_issues=issues)
+
+    def _data_source(self, merchant_id, index):
+        from google.shopping.merchant_datasources_v1beta.types import datasources
+        data_source = datasources.DataSource(
+            name=f"accounts/{merchant_id}/dataSources/{index + 1}",
+            data_source_id=index + 1,
+            display_name=f"Feed {index + 1}",
+        )
+        data_source.primary_product_data_source.countries = ["US"]
+        data_source.primary_product_data_source.content_language = "en"
+        data_source.primary_product_data_source.feed_label = "US"
+        data_source.file_input.fetch_settings.fetch_uri = f"https://shop{merchant_id}.example.com/feed{index + 1}.xml"
+        data_source.file_input.fetch_settings.time_zone = "America/Los_Angeles"
+        return data_source
+
+    def list_data_sources(self, request, context):
+        from google.shopping.merchant_datasources_v1beta.types import datasources
+        merchant_id = self._merchant(request.parent, context)
+        return datasources.ListDataSourcesResponse(
+            data_sources=[self._data_source(merchant_id, index) for index in range(self.feeds_per_merchant)])
+
+    def fetch_data_source(self, request, context):
+        from google.protobuf import empty_pb2
+        self._merchant(request.name, context)
+        return empty_pb2.Empty()
+
+    def create_data_source(self, request, context):
+        merchant_id = self._merchant(request.parent, context)
+        data_source = request.data_source
+        data_source.name = f"accounts/{merchant_id}/dataSources/{self.feeds_per_merchant + 1}"
+        return data_source
+
+    def get_file_upload(self, request, context):
+        from google.shopping.merchant_datasources_v1beta.types import fileuploads
+        merchant_id = self._merchant(request.name, context)
+        # a new upload every `upload_interval` seconds
+        upload_slot = int(time.time() // self.upload_interval)
+        rng = random.Random(f"{self.seed}:{request.name}:{upload_slot}")
+        state = rng.choice(_PROCESSING_STATES)
+        upload = fileuploads.FileUpload(
+            name=request.name, processing_state=state,
+            items_total=rng.randrange(0, self.catalog_size + 1))
+        upload.upload_time = datetime.datetime.fromtimestamp(
+            upload_slot * self.upload_interval, tz=datetime.timezone.utc)
+        if state == "FAILED":
+            upload.issues = [fileuploads.FileUpload.Issue(
+                title="Fetch failed", description=f"Could not fetch feed for {merchant_id}",
+                code="fetch_failed", count=1, severity="ERROR")]
+        return upload
+
+    def _product_page(self, merchant_id, start, page_size):
+        """Returns a serialized `ListProductsResponse`, cached so the server's
+        own proto building does not compete with the client for the GIL."""
+        from google.shopping.merchant_products_v1beta.types import products
+        key = (merchant_id, start, page_size)
+        page = self._page_cache.get(key)
+        if page is None:
+            end = min(start + page_size, self.catalog_size)
+            response = products.ListProductsResponse(
+                products=[self.make_product(merchant_id, index) for index in range(start, end)])
+            if end < self.catalog_size:
+                response.next_page_token = str(end)
+            page = products.ListProductsResponse.serialize(response)
+            self._page_cache[key] = page
+        return page
+
+    def prewarm(self, page_size=None):
+        """Generates every product page up front (for `page_size` requests)."""
+        page_size = min(page_size or self.page_size, self.page_size)
+        for merchant in self.merchants:
+            for start in range(0, self.catalog_size, page_size):
+                self._product_page(merchant["merchantId"], start, page_size)
+
+    def list_products(self, request, context):
+        merchant_id = self._merchant(request.parent, context)
+        page_size = min(request.page_size or self.page_size, self.page_size)
+        start = int(request.page_token) if request.page_token else 0
+        return self._product_page(merchant_id, start, page_size)
+
+    def get_product(self, request, context):
+        import grpc
+        merchant_id = self._merchant(request.name, context)
+        offer_id = request.name.rsplit("~", 1)[-1]
+        try:
+            index = int(offer_id.replace("SKU", ""))
+        except ValueError:
+            index = -1
+        if not 0 <= index < self.catalog_size:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Product not found: {request.name}")
+        return self.make_product(merchant_id, index)
+
+    def insert_product_input(self, request, context):
+        merchant_id = self._merchant(request.parent, context)
+        product_input = request.product_input
+        product_input.name = f"accounts/{merchant_id}/productInputs/online~{product_input.content_language}~{product_input.feed_label}~{product_input.offer_id}"
+        product_input.product = product_input.name.replace("productInputs", "products")
+        with self._rng_lock:
+            self.inserted_inputs.append(product_input)
+        return product_input
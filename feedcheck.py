@@ -0,0 +1,256 @@
+"""
+Feed source pre-checks.
+
+Before failed feeds are reprocessed, each feed's `fetch_uri` is downloaded and
+checked locally, so fetches that would fail again (an unreachable URL, a
+truncated upload, a file that can't be parsed, a file with far fewer items
+than the last successful upload) are not sent to the API and cost no quota.
+Text feeds that are not valid UTF-8 are read as ISO-8859-1 (Latin-1), which
+Merchant Center also accepts, and only get a warning.
+
+Files are read in chunks and parsed incrementally, so memory stays bounded
+for multi-GB feeds: XML (RSS `item` / Atom `entry`) is counted with expat
+handlers without building a tree, CSV/TSV rows are decoded and counted
+one at a time. Gzip compressed feeds are decompressed on the fly.
+
+Usage:
+  python feedcheck.py https://example.com/feed.xml --expected 12000
+  python feedcheck.py file:///tmp/feed.tsv
+"""
+
+# imports
+import argparse
+import codecs
+import csv
+import http.client
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+from xml.parsers import expat
+
+RESULT_FIELDS = ("prop", "feed_name", "url", "status", "format", "items", "expected_items",
+                 "bytes", "seconds", "problems", "feed_resource_id")
+CHUNK_SIZE = 1024 * 1024
+USER_AGENT = "GMCM-Feed-Check/1.0"
+# item elements of RSS 2.0 and Atom product feeds
+_XML_ITEMS = ("item", "entry")
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZIP_MAGIC = b"PK\x03\x04"
+
+
+class FeedProblem(Exception):
+    """The feed file is not usable, e.g. truncated or not decodable."""
+
+
+def _chunks(response, chunk_size, counter):
+    """Raw chunks of a response, gzip content decompressed. `counter` gets the
+    downloaded byte count."""
+    first = response.read(chunk_size)
+    counter["bytes"] = len(first)
+    decompressor = zlib.decompressobj(wbits=47) if first[:2] == _GZIP_MAGIC else None
+    chunk = first
+    while chunk:
+        if decompressor:
+            try:
+                data = decompressor.decompress(chunk)
+            except zlib.error as e:
+                raise FeedProblem(f"corrupt gzip data: {e}")
+            if data:
+                yield data
+        else:
+            yield chunk
+        try:
+            chunk = response.read(chunk_size)
+        except http.client.IncompleteRead as e:
+            counter["bytes"] += len(e.partial)
+            raise FeedProblem("connection closed before the end of the file (truncated download)")
+        counter["bytes"] += len(chunk)
+    if decompressor and not decompressor.eof:
+        raise FeedProblem("gzip stream ends early (truncated download)")
+
+def _is_xml(first):
+    if first.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return first[:64].decode("utf-16", errors="ignore").lstrip().startswith("<")
+    return first.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"<")
+
+def _count_xml(chunks):
+    """Counts item elements with expat handlers, no element tree is built."""
+    parser = expat.ParserCreate(namespace_separator="}")
+    open_elements = []
+    items = 0
+
+    def start(name, attributes):
+        open_elements.append(name.rpartition("}")[2])
+
+    def end(name):
+        nonlocal items
+        if open_elements.pop() in _XML_ITEMS:
+            items += 1
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    try:
+        for chunk in chunks:
+            parser.Parse(chunk, False)
+    except expat.ExpatError as e:
+        raise FeedProblem(f"invalid XML: {expat.ErrorString(e.code)} at line {e.lineno}")
+    try:
+        parser.Parse(b"", True)
+    except expat.ExpatError as e:
+        if open_elements:
+            raise FeedProblem(f"XML ends inside <{open_elements[-1]}> (truncated download)")
+        raise FeedProblem(f"invalid XML: {expat.ErrorString(e.code)}")
+    return items
+
+def _decode(chunks, first, warnings):
+    """Decodes chunks (UTF-8, or UTF-16 with a BOM) into text. From the first invalid
+    UTF-8 byte on, the rest of the file is read as ISO-8859-1 and a warning is added."""
+    utf16 = first.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE))
+    decoder = codecs.getincrementaldecoder("utf-16" if utf16 else "utf-8-sig")()
+    latin1 = False
+    position = 0
+    for chunk in chunks:
+        try:
+            yield decoder.decode(chunk)
+        except UnicodeDecodeError as e:
+            if utf16:
+                raise FeedProblem(f"not valid UTF-16 text near byte {position + e.start}")
+            warnings.append(f"not valid UTF-8 near byte {position + e.start}, read as ISO-8859-1")
+            # the failed chunk is decoded again, with the bytes the UTF-8 decoder held back
+            pending = decoder.getstate()[0] + chunk
+            if position == 0 and pending.startswith(codecs.BOM_UTF8):
+                pending = pending[len(codecs.BOM_UTF8):]
+            decoder = codecs.getincrementaldecoder("latin-1")()
+            latin1 = True
+            yield decoder.decode(pending)
+        position += len(chunk)
+    try:
+        yield decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        if utf16:
+            raise FeedProblem("file ends inside a multi-byte character (truncated download)")
+        if not latin1:
+            warnings.append("not valid UTF-8 at the end of the file, read as ISO-8859-1")
+        yield decoder.getstate()[0].decode("latin-1")
+
+def _lines(texts):
+    pending = ""
+    for text in texts:
+        lines = (pending + text).splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        yield from lines
+    if pending:
+        yield pending
+
+def _count_delimited(chunks, first, problems, warnings):
+    """Counts the data rows of a CSV/TSV file (delimiter taken from the header line)."""
+    lines = _lines(_decode(chunks, first, warnings))
+    header_line = next(lines, "")
+    delimiter = "\t" if header_line.count("\t") >= header_line.count(",") else ","
+    header = next(csv.reader([header_line], delimiter=delimiter), [])
+    if not any(column.strip() for column in header):
+        raise FeedProblem("empty file or missing header row")
+    rows = 0
+    bad_rows = 0
+    last_row = None
+    try:
+        for row in csv.reader(lines, delimiter=delimiter):
+            if not any(field.strip() for field in row):
+                continue
+            rows += 1
+            if len(row) != len(header):
+                bad_rows += 1
+            last_row = row
+    except csv.Error as e:
+        raise FeedProblem(f"invalid {'TSV' if delimiter == chr(9) else 'CSV'}: {e}")
+    if last_row is not None and len(last_row) < len(header):
+        raise FeedProblem(f"last row has {len(last_row)} of {len(header)} columns (truncated download)")
+    if bad_rows:
+        problems.append(f"{bad_rows} rows with a column count different from the header")
+    return ("TSV" if delimiter == "\t" else "CSV"), rows
+
+def check_feed(url, expected_items=None, min_ratio=0.5, timeout=60.0, chunk_size=CHUNK_SIZE):
+    """Downloads and checks one feed file. `expected_items` (e.g. the last items_total)
+    flags files with fewer than `min_ratio` of the expected items.
+    Returns a result dict (see `RESULT_FIELDS`), status "ok", "bad" or "unchecked".
+    Warnings (e.g. a Latin-1 file) are listed in `problems` but don't make a feed bad."""
+    result = {"url": url, "status": "bad", "format": "", "items": None, "expected_items": expected_items,
+              "bytes": 0, "seconds": None, "problems": ""}
+    problems = []
+    warnings = []
+    counter = {"bytes": 0}
+    start_time = time.perf_counter()
+    if not url:
+        problems.append("no fetch URL")
+    elif url.lower().startswith("sftp://"):
+        result["status"] = "unchecked"
+        problems.append("SFTP sources are not checked")
+    else:
+        try:
+            with urlopen(Request(url, headers={"User-Agent": USER_AGENT}), timeout=timeout) as response:
+                chunks = _chunks(response, chunk_size, counter)
+                first = next(chunks, b"")
+                length = response.headers.get("Content-Length") if response.headers else None
+                if first.startswith(_ZIP_MAGIC):
+                    result.update(status="unchecked", format="ZIP")
+                    problems.append("ZIP archives are not checked")
+                else:
+                    def stream():
+                        yield first
+                        yield from chunks
+                    if _is_xml(first):
+                        result["format"] = "XML"
+                        result["items"] = _count_xml(stream())
+                    else:
+                        result["format"], result["items"] = _count_delimited(stream(), first, problems, warnings)
+                    if length and length.isdigit() and counter["bytes"] < int(length):
+                        raise FeedProblem(f"received {counter['bytes']} of {length} bytes (truncated download)")
+                    if not result["items"]:
+                        problems.append("no items")
+                    elif expected_items and result["items"] < expected_items * min_ratio:
+                        problems.append(f"{result['items']} items vs {expected_items} expected")
+                    if not problems:
+                        result["status"] = "ok"
+        except FeedProblem as e:
+            problems.append(str(e))
+        except Exception as e:
+            problems.append(f"download failed: {str(e).splitlines()[0] if str(e) else type(e).__name__}")
+    result.update(bytes=counter["bytes"], seconds=round(time.perf_counter() - start_time, 2),
+                  problems="; ".join(problems + [f"warning: {warning}" for warning in warnings]))
+    return result
+
+def precheck_feeds(failed_feeds, all_feed_data, feed_history=None, workers=4, **kwargs):
+    """Checks the source files of the feeds in `failed_feeds` (one row per feed issue,
+    from `services.get_feed_status`), `workers` downloads at a time. The expected item
+    count is the last successful upload in `feed_history`, if given.
+    Returns (feeds to reprocess, one per feed, and the check results)."""
+    feeds = {feed["feed_resource_id"]: feed for feed in all_feed_data}
+    unique = list({feed["feed_resource_id"]: feed for feed in failed_feeds}.values())
+
+    expected = {feed["feed_resource_id"]: feed_history.expected_items(feed["feed_resource_id"]) if feed_history else None
+                for feed in unique}
+
+    def check(feed):
+        feed_resource_id = feed["feed_resource_id"]
+        result = check_feed(feeds.get(feed_resource_id, {}).get("url"), expected[feed_resource_id], **kwargs)
+        result.update(prop=feed["prop"], feed_name=feed["feed_name"], feed_resource_id=feed_resource_id)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(check, unique))
+    to_reprocess = [feed for feed, result in zip(unique, results) if result["status"] != "bad"]
+    return to_reprocess, [{field: result[field] for field in RESULT_FIELDS} for result in results]
+
+def main():
+    parser = argparse.ArgumentParser(prog="feedcheck", description="Check feed source files before reprocessing")
+    parser.add_argument("urls", nargs="+", help="Feed URLs (http, https, ftp or file)")
+    parser.add_argument("--expected", type=int, help="Expected item count, e.g. the last items_total")
+    parser.add_argument("--min-ratio", type=float, default=0.5, help="Minimum share of the expected items")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    import helpers
+    helpers.display_table([check_feed(url, args.expected, args.min_ratio, args.timeout) for url in args.urls])
+
+if __name__ == '__main__':
+    main()
@@ -5,11 +5,7 @@ import sys
 import re
 import json
 import csv
-import pydoc
-import requests
 from datetime import datetime
-import pandas as pd
-from tabulate import tabulate
 from urllib.parse import urljoin, urlparse
 
 create_feed_info_message = (" - Account ID: The Merchant Center account ID (e.g. '1234567890')\n"
@@ -17,11 +13,14 @@ create_feed_info_message = (" - Account ID: The Merchant Center account ID (e.g.
 " - Fetch URI: The URL to fetch the feed data (e.g. 'https://www.example.com/feed.xml')\n"
 " - Content Language: The language of the feed data (e.g. 'en')\n"
 " - Countries: The countries the feed is targeting (e.g. 'US,CA,MX')\n"
-" - Feed Label: The label for the feed (e.g. 'Tennis')\n")
+" - Feed Label: The label for the feed (e.g. 'Tennis')\n"
+" - Optional, Time Zone: IANA time zone of the daily fetch (e.g. 'America/New_York', default in auth.py)\n"
+" - Optional, Fetch Hour: Hour of the daily fetch, 0-23 (default in auth.py)\n")
 
 # exceptions wrapper
 def handle_exceptions(func):
     def wrapper(*args, **kwargs):
+        import requests
         try:
             return func(*args, **kwargs)
         except requests.exceptions.RequestException as e:
@@ -65,9 +64,9 @@ def display_dict(dict_data):
   print(json.dumps(dict_data, indent=2))
 
 def display_table(table_data):
-    table_output = tabulate(tabular_data=table_data, headers="keys", tablefmt="simple_grid", showindex=False)
-    pydoc.pager(table_output)
-    # print(table_output)
+    """Pages through a report table, see viewer.py for the filter/sort commands."""
+    import viewer
+    viewer.view(table_data)
 
 def parse_input_details(resource):
     parts = resource.split("/")
@@ -76,6 +75,13 @@ def parse_input_details(resource):
     channel, content_lang, feed_label, offer_id = product_details.split("~")
     return account, channel, content_lang, feed_label, offer_id
 
+def merchant_id_from_resource(resource):
+    """Returns the merchant ID from an `accounts/{id}/...` resource name, or None."""
+    parts = str(resource).split("/")
+    if len(parts) >= 2 and parts[0] == "accounts":
+        return parts[1]
+    return None
+
 def process_file(file_path):
     """Parses the CSV file and returns structured feed data."""
     feed_data = []
@@ -92,7 +98,9 @@ def process_file(file_path):
                     "fetch_uri": row["url"],
                     "content_lang": row["lang"],
                     "countries": row["country"],
-                    "feed_label": row["label"]
+                    "feed_label": row["label"],
+                    "time_zone": row.get("time_zone") or "",
+                    "fetch_hour": row.get("fetch_hour") or "",
                 }
                 feed_data.append(feed_entry)
     except Exception as e:
@@ -0,0 +1,237 @@
+"""
+Feed health history.
+
+Every feed status poll (processing state, items_total, issue count) is appended
+to a local SQLite database, indexed by feed and poll time, so trend and anomaly
+checks run locally instead of re-fetching upload history from the API.
+
+The Merchant API only serves a data source's latest file upload, so finished
+uploads (SUCCEEDED/FAILED) are also kept, once per upload time, building the
+per-feed upload timeline shown in the feeds report.
+
+Usage:
+  python history.py drops --threshold 0.2 --days 7   feeds whose item count dropped >20% vs their 7 day median
+  python history.py failing --runs 3                 feeds that FAILED in each of their last 3 polls
+  python history.py trend accounts/123/dataSources/456 --days 30
+  python history.py uploads --last 10                 success rate and timeline of the last 10 uploads per feed
+"""
+
+# imports
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feed_status (
+    polled_at REAL NOT NULL,
+    feed_resource_id TEXT NOT NULL,
+    prop TEXT,
+    merchant_id TEXT,
+    feed_id INTEGER,
+    feed_name TEXT,
+    status TEXT,
+    items_total INTEGER,
+    issue_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS feed_status_feed_time ON feed_status (feed_resource_id, polled_at);
+CREATE INDEX IF NOT EXISTS feed_status_time ON feed_status (polled_at);
+CREATE TABLE IF NOT EXISTS file_uploads (
+    feed_resource_id TEXT NOT NULL,
+    upload_time REAL NOT NULL,
+    prop TEXT,
+    feed_name TEXT,
+    status TEXT,
+    items_total INTEGER,
+    items_created INTEGER,
+    items_updated INTEGER,
+    issues TEXT,
+    PRIMARY KEY (feed_resource_id, upload_time)
+);
+"""
+# upload states that no longer change
+_FINISHED_STATES = ("SUCCEEDED", "FAILED")
+_COLUMNS = ("feed_resource_id", "prop", "merchant_id", "feed_id", "feed_name", "status", "items_total", "issue_count")
+_DAY = 86400
+
+
+class FeedHistory(object):
+    """SQLite store of feed status polls."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def record(self, polls, polled_at=None):
+        """Appends polls, tuples in `_COLUMNS` order, in one transaction. Returns the row count."""
+        polled_at = time.time() if polled_at is None else polled_at
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO feed_status (polled_at, {', '.join(_COLUMNS)}) VALUES (?{', ?' * len(_COLUMNS)})",
+                [(polled_at, *poll) for poll in polls])
+        return len(polls)
+
+    def record_uploads(self, uploads):
+        """Keeps finished uploads from (feed_resource_id, prop, feed_name, FileUpload)
+        tuples, uploads already stored are skipped. Returns the number of new uploads."""
+        rows = []
+        for feed_resource_id, prop, feed_name, upload in uploads:
+            status = upload.processing_state.name
+            if status not in _FINISHED_STATES or not upload.upload_time:
+                continue
+            issues = [{"title": issue.title, "severity": issue.severity.name, "count": issue.count}
+                      for issue in upload.issues]
+            rows.append((feed_resource_id, upload.upload_time.timestamp(), prop, feed_name, status,
+                         upload.items_total, upload.items_created, upload.items_updated, json.dumps(issues)))
+        with self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO file_uploads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            return self.connection.total_changes - before
+
+    def upload_timeline(self, last=10):
+        """Per feed: success rate, FAILED count, a timeline of the last `last` uploads
+        (oldest to newest, S = SUCCEEDED, F = FAILED) and the latest issue titles."""
+        timeline = []
+        current = None
+        for row in self.connection.execute(
+                """
+                SELECT * FROM (
+                    SELECT *, ROW_NUMBER() OVER (PARTITION BY feed_resource_id ORDER BY upload_time DESC) AS recent
+                    FROM file_uploads
+                )
+                WHERE recent <= ?
+                ORDER BY prop, feed_name, feed_resource_id, upload_time
+                """, (last,)):
+            if current is None or current["feed_resource_id"] != row["feed_resource_id"]:
+                current = {"prop": row["prop"], "feed_name": row["feed_name"],
+                           "feed_resource_id": row["feed_resource_id"], "uploads": 0, "failed": 0, "timeline": ""}
+                timeline.append(current)
+            current["uploads"] += 1
+            current["failed"] += row["status"] == "FAILED"
+            current["timeline"] += row["status"][0]
+            current["last_upload"] = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["upload_time"]))
+            current["last_issues"] = "; ".join(issue["title"] for issue in json.loads(row["issues"]))
+        for entry in timeline:
+            entry["success_rate"] = round(1 - entry["failed"] / entry["uploads"], 3)
+        return timeline
+
+    def expected_items(self, feed_resource_id):
+        """items_total of the feed's last SUCCEEDED upload, or of its last poll with
+        items if no upload is stored. None if the feed has no history."""
+        row = self.connection.execute(
+            "SELECT items_total FROM file_uploads WHERE feed_resource_id = ? AND status = 'SUCCEEDED' "
+            "ORDER BY upload_time DESC LIMIT 1", (feed_resource_id,)).fetchone()
+        if row is None:
+            row = self.connection.execute(
+                "SELECT items_total FROM feed_status WHERE feed_resource_id = ? AND items_total > 0 "
+                "ORDER BY polled_at DESC LIMIT 1", (feed_resource_id,)).fetchone()
+        return row["items_total"] if row else None
+
+    def trend(self, feed_resource_id, days=30):
+        """Polls of one feed over the last `days` days, oldest first."""
+        return [dict(row) for row in self.connection.execute(
+            "SELECT * FROM feed_status WHERE feed_resource_id = ? AND polled_at >= ? ORDER BY polled_at",
+            (feed_resource_id, time.time() - days * _DAY))]
+
+    def item_count_drops(self, threshold=0.2, days=7):
+        """Feeds whose latest SUCCEEDED items_total is more than `threshold` below the
+        median of their earlier SUCCEEDED polls in the last `days` days. Other polls
+        (IN_PROGRESS, FAILED) report no items and are left out."""
+        since = time.time() - days * _DAY
+        history = {}
+        latest = {}
+        for row in self.connection.execute(
+                "SELECT * FROM feed_status WHERE polled_at >= ? AND items_total IS NOT NULL "
+                "AND status = 'SUCCEEDED' ORDER BY feed_resource_id, polled_at", (since,)):
+            feed = row["feed_resource_id"]
+            if feed in latest:
+                history.setdefault(feed, []).append(latest[feed]["items_total"])
+            latest[feed] = row
+        drops = []
+        for feed, values in history.items():
+            median = statistics.median(values)
+            current = latest[feed]["items_total"]
+            if median and current < median * (1 - threshold):
+                drops.append({**dict(latest[feed]), "median_items": median,
+                              "change": round(current / median - 1, 4)})
+        return sorted(drops, key=lambda drop: drop["change"])
+
+    def failing_streaks(self, runs=3):
+        """Feeds whose last `runs` polls were all FAILED."""
+        return [dict(row) for row in self.connection.execute(
+            """
+            SELECT feed_resource_id, prop, feed_name, COUNT(*) AS runs, MAX(polled_at) AS last_polled_at
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY feed_resource_id ORDER BY polled_at DESC) AS recent
+                FROM feed_status
+            )
+            WHERE recent <= ?
+            GROUP BY feed_resource_id
+            HAVING COUNT(*) = ? AND SUM(status = 'FAILED') = ?
+            ORDER BY prop, feed_name
+            """, (runs, runs, runs))]
+
+def open_default():
+    """Opens the history database configured in auth.py."""
+    from auth import Configure as ac
+    return FeedHistory(ac().get_config()["feed_history_path"])
+
+def anomaly_report(store, threshold=0.2, days=7, runs=3):
+    """Printable lines for item count drops and failing streaks, empty if none."""
+    lines = []
+    for drop in store.item_count_drops(threshold, days):
+        lines.append(f"Item count drop: {drop['prop']} / {drop['feed_name']} - {drop['items_total']} items "
+                     f"vs {days} day median {drop['median_items']:g} ({drop['change']:+.0%})")
+    for streak in store.failing_streaks(runs):
+        lines.append(f"Failing: {streak['prop']} / {streak['feed_name']} - FAILED in the last {streak['runs']} polls")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(prog="history", description="GMCM feed health history")
+    parser.add_argument("--db", help="History database (default: the path configured in auth.py)")
+    subparsers = parser.add_subparsers(dest="query", required=True)
+    drops = subparsers.add_parser("drops", help="Feeds whose item count dropped vs their median")
+    drops.add_argument("--threshold", type=float, default=0.2)
+    drops.add_argument("--days", type=float, default=7)
+    failing = subparsers.add_parser("failing", help="Feeds failing N polls in a row")
+    failing.add_argument("--runs", type=int, default=3)
+    uploads = subparsers.add_parser("uploads", help="Success rate and timeline of the last uploads per feed")
+    uploads.add_argument("--last", type=int, default=10)
+    trend = subparsers.add_parser("trend", help="Poll history of one feed")
+    trend.add_argument("feed_resource_id")
+    trend.add_argument("--days", type=float, default=30)
+    args = parser.parse_args()
+    import helpers
+    with (FeedHistory(args.db) if args.db else open_default()) as store:
+        if args.query == "drops":
+            rows = store.item_count_drops(args.threshold, args.days)
+        elif args.query == "failing":
+            rows = store.failing_streaks(args.runs)
+        elif args.query == "uploads":
+            rows = store.upload_timeline(args.last)
+        else:
+            rows = store.trend(args.feed_resource_id, args.days)
+    if rows:
+        helpers.display_table(rows)
+    else:
+        print("No matching feeds.")
+
+if __name__ == '__main__':
+    main()
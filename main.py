@@ -1,19 +1,23 @@
 # imports
 from __future__ import print_function
+import os
 import time
 import json
 import sys
 import copy
 import argparse
 from typing import Tuple, Union, Optional, Dict, List, Any
-from tabulate import tabulate
 import auth
 import services
 import helpers
+import metrics
+import ratelimit
+import records
+import tracing
 
 # function map for testing
 testing_map = {
-    "create_datasource": services.create_feed,
+    "create_datasource": lambda credentials: create_datasource(credentials),
     "product_updates": services.get_product_auto,
     "get_shipping_info": services.get_shipping_info,
 }
@@ -32,6 +36,7 @@ def get_all_property_info(credentials):
     return init_data
 
 def create_datasource(credentials):
+    import bulk
     while True:
         print("Create data source using a file or input parameters?\n"
             "1. File upload\n"
@@ -49,12 +54,14 @@ def create_datasource(credentials):
                 print("Processing file...")
                 create_feed_file_data = helpers.process_file(file_path)
                 if create_feed_file_data:
-                    print("File processed, review the data below:")
-                    print(json.dumps(create_feed_file_data, indent=2))
+                    result_path = f"{os.path.splitext(file_path)[0]}-results.csv"
+                    print(f"File processed, {len(create_feed_file_data)} feeds found.\n"
+                          f"Rows already created in {result_path} (from an earlier run) are skipped.")
                     input("Press ENTER to continue...")
-                    services.create_feed(credentials, create_feed_file_data)
+                    bulk.create_data_sources(credentials, create_feed_file_data, result_path=result_path)
                 else:
                     print("Error processing file. Please check the format and try again.")
+            return
         elif source_choice == "2":
             print("Input parameters selected, please enter the following information:")
             print(helpers.create_feed_info_message)
@@ -64,12 +71,24 @@ def create_datasource(credentials):
             content_lang = input("Enter the content language: ").strip()
             countries = input("Enter the countries: ").strip()
             feed_label = input("Enter the feed label: ").strip()
+            time_zone = input("Enter the fetch time zone (ENTER for the default): ").strip()
+            fetch_hour = input("Enter the fetch hour, 0-23 (ENTER for the default): ").strip()
             print("Parameters entered, processing data...")
-            create_feed_data = (account_id,feed_name,fetch_uri,content_lang,countries,feed_label)
+            create_feed_data = {
+                "account_id": account_id,
+                "feed_name": feed_name,
+                "fetch_uri": fetch_uri,
+                "content_lang": content_lang,
+                "countries": countries,
+                "feed_label": feed_label,
+                "time_zone": time_zone,
+                "fetch_hour": fetch_hour,
+            }
             print("Feed data processed, review the data below: \n")
             print(json.dumps(create_feed_data, indent=2))
             input("Press ENTER to continue...")
-            services.create_feed(credentials, create_feed_file_data)
+            bulk.create_data_sources(credentials, [create_feed_data])
+            return
 
 def get_account_issues(credentials, prop_dict, prop_table, account_count):
     timestamp = helpers.generate_timestamp()
@@ -98,13 +117,20 @@ def get_account_issues(credentials, prop_dict, prop_table, account_count):
         print(f"\nSaving file for review as {account_issues_filename}\n")
         account_issues_table.to_csv(account_issues_filename, index=False)
 
+@tracing.traced("feeds_report")
 def feeds_report(credentials):
     timestamp = helpers.generate_timestamp()
     start_time_fetch = time.time()
     print("Fetching feed data...")
-    all_feed_data, feed_table, feed_count = services.get_feeds_list(credentials)
+    with tracing.span("list_feeds"):
+        all_feed_data, feed_table, feed_count = services.get_feeds_list(credentials)
     print("Feed data obtained, processing statuses...")
-    feed_status_data, feed_status_table, failed_feeds, fail_count, not_fail_count = services.get_feed_status(credentials, all_feed_data)
+    import history
+    with history.open_default() as feed_history:
+        with tracing.span("feed_statuses", feeds=feed_count):
+            feed_status_data, feed_status_table, failed_feeds, fail_count, not_fail_count = services.get_feed_status(
+                credentials, all_feed_data, history=feed_history)
+        anomalies = history.anomaly_report(feed_history)
     end_time_fetch = time.time()
     display_failed_feeds = copy.deepcopy(failed_feeds)
     for feed_data in display_failed_feeds:
@@ -119,6 +145,8 @@ def feeds_report(credentials):
     total_time_fetch = float(round(end_time_fetch - start_time_fetch, 2))
     total_time_fetch_string = f"Time fetching feeds: {total_time_fetch} seconds"
     reprocess_start_time = time.time()
+    if anomalies:
+        print("Feed health warnings (from the local feed history):\n  " + "\n  ".join(anomalies))
     if fail_count == 0:
         print("All feeds are good! :) ")
     elif fail_count > 0:
@@ -129,6 +157,7 @@ def feeds_report(credentials):
             # print(failed_feeds)
             # helpers.display_table(table_data=failed_feeds)
             # display without pydoc for easy review (short list)
+            from tabulate import tabulate
             table_output = tabulate(tabular_data=display_failed_feeds, headers="keys", tablefmt="simple_grid", showindex=False)
             print(table_output)
         # print(failed_feeds)
@@ -138,9 +167,25 @@ def feeds_report(credentials):
         print("\nWould you like to fetch them for reprocessing?")
         retry = input("Enter Y to retry, N to exit: ").strip().upper()
         if retry == "Y":
-            print("\nReprocessing failed feeds...")
-            services.fetch_feed(credentials, feed_info=failed_feeds)
-            print("Reprocessing complete!\n")
+            # failed_feeds has one row per feed issue, each feed is reprocessed once
+            reprocess_feeds = list({feed["feed_resource_id"]: feed for feed in failed_feeds}.values())
+            print("Download and check the feed source files first (only good feeds are reprocessed)?")
+            check_opt = input("Yes or No (Y or N): ").lower().strip()
+            if check_opt == "y":
+                import feedcheck
+                print("\nChecking feed source files...")
+                with tracing.span("feed_precheck", feeds=len(reprocess_feeds)), history.open_default() as feed_history:
+                    reprocess_feeds, check_results = feedcheck.precheck_feeds(reprocess_feeds, all_feed_data, feed_history)
+                from tabulate import tabulate
+                print(tabulate(tabular_data=[{field: result[field] for field in feedcheck.RESULT_FIELDS[:-1]}
+                                             for result in check_results],
+                               headers="keys", tablefmt="simple_grid", showindex=False))
+                print(f"{len(reprocess_feeds)} of {len(check_results)} feeds passed the source check")
+            if reprocess_feeds:
+                print("\nReprocessing failed feeds...")
+                with tracing.span("reprocess", feeds=len(reprocess_feeds)):
+                    services.fetch_feed(credentials, feed_info=reprocess_feeds)
+                print("Reprocessing complete!\n")
     reprocess_end_time = time.time()
     reprocess_total_time = round(reprocess_end_time - reprocess_start_time, 2)
     reprocess_total_time_string = f"Time for reprocessing: {reprocess_total_time} seconds"
@@ -159,14 +204,21 @@ def feeds_report(credentials):
     if view_choice == "Y":
         print("\nHow would you like to view the feed report?\n"
             "1. View a table on screen\n"
-            "2. Download a CSV of the report\n")
-        report_choice = input("Select 1 or 2: ").strip().upper()
+            "2. Download a CSV of the report\n"
+            "3. View the upload timeline (success rate of the last 10 uploads per feed)\n")
+        report_choice = input("Select 1, 2 or 3: ").strip().upper()
         if report_choice == "1":
-            helpers.display_table(table_data=feed_status_table)
+            with tracing.span("render"):
+                helpers.display_table(table_data=feed_status_table)
         elif report_choice == "2":
             feeds_status_filename = f"feeds_status-{timestamp}.csv"
             print(f"\nSaving file for review as {feeds_status_filename}\n")
-            feed_table.to_csv(feeds_status_filename, index=False)
+            with tracing.span("write", path=feeds_status_filename):
+                feed_table.to_csv(feeds_status_filename, index=False)
+        elif report_choice == "3":
+            with history.open_default() as feed_history:
+                upload_timeline = feed_history.upload_timeline(last=10)
+            helpers.display_table(table_data=upload_timeline)
     elif view_choice == "N":
         print("\nExiting...")
     else:
@@ -201,23 +253,30 @@ def products_report(credentials):
             prod_menu_choice = "invalid_upc"
         elif prod_menu_opt == "7":
             prod_menu_choice = "no_impact"
-        elif prod_menu_choice == "8":
+        elif prod_menu_opt == "8":
             product_entry, original_product_entry = services.get_product_single(credentials)
-            print("Success, product details: \n")
-            print(json.dumps(product_entry, indent=2))
+            if product_entry is not None:
+                print("Success, product details: \n")
+                print(json.dumps(product_entry, indent=2))
             # print (original_product_entry)
+            continue
         # elif prod_menu_choice == "9":   
         else:
-            print("Select from the numbered options only (1-9)")
+            print("Select from the numbered options only (1-8)")
+            continue
         print(f"Executing {prod_menu_choice} report...")
         start_time = time.time()
-        disapproved_product_data, disapproved_product_data_table, disapproved_product_count = services.disapproved_products(credentials, prod_menu_choice)
+        summary = records.IssueSummary()
+        disapproved_product_data, disapproved_product_data_table, disapproved_product_count = services.disapproved_products(credentials, prod_menu_choice, summary=summary)
         end_time = time.time()
         execution_time = f"Total execution time: {round(end_time - start_time, 2)} seconds"
         print(f"Disapproved products compiled, time and date of request: {timestamp}\n"
               f"Total number of disapproved products: {disapproved_product_count}\n"
-              f"{execution_time}\n"
-              "View products errors report?")
+              f"{execution_time}\n")
+        print(summary.report())
+        if prod_menu_choice == "invalid_upc":
+            add_gtin_accounts(disapproved_product_data_table)
+        print("\nView all product errors (raw rows)?")
         output_opt = input("Yes or No (Y or N): ").lower().strip()
         if output_opt == "y":
             helpers.display_table(table_data=disapproved_product_data_table)
@@ -227,6 +286,34 @@ def products_report(credentials):
             disapproved_product_data_filename = f"{prod_menu_choice}-{timestamp}.csv"
             print(f"\nSaving file for review as {disapproved_product_data_filename}\n")
             disapproved_product_data_table.to_csv(disapproved_product_data_filename, index=False)
+        check_report_urls(disapproved_product_data_table, prod_menu_choice, timestamp)
+
+def add_gtin_accounts(disapproved_product_data_table):
+    """Adds the accounts using each GTIN (from the product index) to an invalid_upc report."""
+    import productindex
+    with productindex.open_default() as index:
+        if not len(index):
+            print("The product index is empty, run 'python productindex.py refresh' to find GTINs used in several accounts")
+            return
+        productindex.annotate_shared_gtins(disapproved_product_data_table, index)
+    if "gtin_accounts" in disapproved_product_data_table.columns:
+        shared = disapproved_product_data_table["gtin_accounts"].str.contains(",", regex=False).sum()
+        print(f"{shared} report rows have a GTIN that is used in more than one account (see 'gtin_accounts')")
+
+def check_report_urls(disapproved_product_data_table, prod_menu_choice, timestamp):
+    """Offers a local health check of the landing page / image URLs of a product report."""
+    if prod_menu_choice not in ("landing_page_errors", "broken_images") or disapproved_product_data_table.empty:
+        return
+    column = "imageLink" if prod_menu_choice == "broken_images" else "product_link"
+    print(f"Check the '{column}' URLs locally now (confirms fixes before reprocessing)?")
+    check_opt = input("Yes or No (Y or N): ").lower().strip()
+    if check_opt == "y":
+        import urlcheck
+        url_check_table = urlcheck.check_report(disapproved_product_data_table, column)
+        helpers.display_table(table_data=url_check_table)
+        url_check_filename = f"url_check-{prod_menu_choice}-{timestamp}.csv"
+        print(f"\nSaving URL check results as {url_check_filename}\n")
+        url_check_table.to_csv(url_check_filename, index=False)
 
 def products_update(credentials):
     """
@@ -241,8 +328,9 @@ def products_update(credentials):
               "TESTING - Update the landing page URLs for: \n"
               "1. Multiple products via disapproved report or CSV\n"
               "2. A single product using the product_resource_id\n"
+              "3. Bulk update from a CSV (product_resource_id or offer ID / GTIN / link + one column per attribute, e.g. link)\n"
               "ex. Type 'EX' at anytime to quit\n")
-        product_update_choice = helpers.custom_input("Enter 1 or 2: ").strip()
+        product_update_choice = helpers.custom_input("Enter 1, 2 or 3: ").strip()
         if product_update_choice == "1":
             all_lp_errors_data, all_lp_errors_table = services.process_lp_errors_multi(credentials)
             # Output testing for all_lp_errors_data
@@ -252,6 +340,8 @@ def products_update(credentials):
             # helpers.display_table(table_data=all_lp_errors_table)
         if product_update_choice == "2":
             product_entry, original_product_entry = services.get_product_single(credentials)
+            if product_entry is None:
+                continue
             product_link = product_entry["product_link"]
             product_resource_id = product_entry["product_resource_id"]
             product_data_source = product_entry["feed_resource_id"]
@@ -274,8 +364,20 @@ def products_update(credentials):
                     )
             else:
                 break
+        elif product_update_choice == "3":
+            import bulk
+            file_path = input("Enter the path to the CSV file: ").strip()
+            dry_run = input("Dry run only (show the changes without sending them)? Y or N: ").lower().strip() != "n"
+            result_path = f"product_inputs-{'dry_run-' if dry_run else ''}{timestamp}.csv"
+            try:
+                import productindex
+                with productindex.open_default() as index:
+                    bulk.insert_product_inputs(credentials, bulk.read_product_patches(file_path),
+                                               dry_run=dry_run, result_path=result_path, index=index)
+            except (OSError, ValueError) as e:
+                print(f"Error reading CSV file: {e}")
         else:
-            print("Select option 1 or 2")
+            print("Select option 1, 2 or 3")
         end_time = time.time()
         execution_time = f"Total execution time: {round(end_time - start_time, 2)} seconds"
 
@@ -294,13 +396,19 @@ def auto_exec(main_flags: argparse.Namespace):
         prod_menu_choice = "landing_page_errors"
         print(f"Executing {prod_menu_choice} report...")
         start_time = time.time()
-        disapproved_product_data, disapproved_product_data_table, disapproved_product_count = services.disapproved_products(credentials, prod_menu_choice)
+        summary = records.IssueSummary()
+        if main_flags.workers > 1:
+            import parallel
+            disapproved_product_data, disapproved_product_data_table, disapproved_product_count = parallel.disapproved_products(prod_menu_choice, main_flags.workers, summary=summary)
+        else:
+            disapproved_product_data, disapproved_product_data_table, disapproved_product_count = services.disapproved_products(credentials, prod_menu_choice, summary=summary)
         end_time = time.time()
         execution_time = f"Total execution time: {round(end_time - start_time, 2)} seconds"
         print(f"Disapproved products compiled, time and date of request: {timestamp}\n"
               f"Total number of disapproved products: {disapproved_product_count}\n"
-              f"{execution_time}\n"
-              "View product errors report?")
+              f"{execution_time}\n")
+        print(summary.report())
+        print("\nView all product errors (raw rows)?")
         output_opt = input("Yes or No (Y or N): ").lower().strip()
         if output_opt == "y":
             helpers.display_table(table_data=disapproved_product_data_table)
@@ -310,6 +418,7 @@ def auto_exec(main_flags: argparse.Namespace):
             disapproved_product_data_filename = f"{prod_menu_choice}-{timestamp}.csv"
             print(f"\nSaving file for review as {disapproved_product_data_filename}\n")
             disapproved_product_data_table.to_csv(disapproved_product_data_filename, index=False)
+        check_report_urls(disapproved_product_data_table, prod_menu_choice, timestamp)
     else:
         print(f"Invalid argument input: {main_flags}\n"
               "Please try again, use '--help' for more info.")
@@ -379,7 +488,86 @@ def main() -> None:
         choices=testing_map.keys(),
         help="Test function for debugging purposes using function name"
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        metavar='N',
+        help=("Number of worker processes for product scans ('--auto lperrors'),\n"
+              "merchants are split across the workers which share the rate budget\n")
+    )
+    parser.add_argument(
+        '--daemon',
+        nargs='+',
+        metavar='JOB=MINUTES',
+        help=("Run as a long-lived scheduler, keeping credentials and clients warm:\n"
+              "JOB is one of the '--auto' options, MINUTES is the run interval\n"
+              "ex: --daemon feeds=60 accountissues=1440 lperrors=1440\n")
+    )
+    parser.add_argument(
+        '--report-dir',
+        default='reports',
+        help="Directory for reports written in daemon mode (default: reports)"
+    )
+    parser.add_argument(
+        '--metrics',
+        action='store_true',
+        help="Print a per-method API call summary (latency, retries, 429s, bytes) at the end of the run"
+    )
+    parser.add_argument(
+        '--metrics-out',
+        metavar='PATH',
+        help=("Export API call metrics to PATH at the end of the run (after every job in daemon mode):\n"
+              "JSON if PATH ends in .json, Prometheus text format otherwise\n")
+    )
+    parser.add_argument(
+        '--trace',
+        metavar='PATH',
+        help=("Record trace spans for pipeline phases and every API call and write them to PATH:\n"
+              "OpenTelemetry-style JSON lines if PATH ends in .jsonl, otherwise Chrome trace\n"
+              "format (open in https://ui.perfetto.dev or chrome://tracing for a flame view)\n")
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help=("Profile the '--auto' job with cProfile and tracemalloc, writes\n"
+              "profile-<job>-<timestamp>.pstats and a top allocations summary\n"
+              "(-alloc.txt) next to the report\n")
+    )
+    parser.add_argument(
+        '--shared-quota',
+        action='store_true',
+        help=("Share each credential's rate budget with every other GMCM process on this\n"
+              "host started with --shared-quota (e.g. overlapping cron jobs), through\n"
+              "lock files in authfiles/quota/\n")
+    )
     main_flags: argparse.Namespace = parser.parse_args()
+    if main_flags.profile and not main_flags.auto:
+        parser.error("--profile requires --auto")
+    if main_flags.shared_quota:
+        ratelimit.share_across_processes(auth.Configure().get_config()["shared_quota_dir"])
+    if main_flags.trace:
+        tracing.enable()
+    try:
+        run(parser, main_flags)
+    finally:
+        if main_flags.trace:
+            print(f"{tracing.export(main_flags.trace)} trace spans saved to {main_flags.trace}")
+        if main_flags.metrics:
+            print(metrics.registry.summary())
+        if main_flags.metrics_out:
+            print(f"API metrics saved to {metrics.registry.write(main_flags.metrics_out)}")
+
+def run(parser, main_flags):
+    if main_flags.daemon:
+        import daemon
+        try:
+            jobs = daemon.parse_job_specs(main_flags.daemon)
+        except ValueError as e:
+            parser.error(str(e))
+        credentials = initialize_auth()
+        daemon.run_daemon(credentials, jobs, main_flags.report_dir, metrics_out=main_flags.metrics_out)
+        return
     if main_flags.func:
         if main_flags.func in testing_map:
             credentials = initialize_auth()
@@ -393,6 +581,10 @@ def main() -> None:
         credentials = initialize_auth()
         init_data = get_all_property_info(credentials=credentials)
         main_menu(init_data)
+    elif main_flags.profile:
+        import profiling
+        with profiling.profile_run(main_flags.auto):
+            auto_exec(main_flags)
     else:
         auto_exec(main_flags)
 
@@ -0,0 +1,225 @@
+"""
+Per-RPC instrumentation.
+
+Every client returned by `services.get_client` is wrapped in an
+`InstrumentedClient` recording, per API method: call count, errors, a latency
+histogram, 429 (quota) events, retries and bytes received. Time spent sleeping
+in the rate limiters is recorded as well. The registry prints an end-of-run
+summary and exports Prometheus text format or JSON.
+"""
+
+# imports
+import bisect
+import json
+import threading
+import time
+import tracing
+
+# histogram bucket upper bounds in seconds (Prometheus style, +Inf implied)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# client methods that issue an RPC
+_RPC_PREFIXES = ("get_", "list_", "insert_", "fetch_", "create_", "update_", "delete_")
+
+
+class MethodStats(object):
+    """Counters and latency histogram for a single API method."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.bytes_received = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.latency_sum += seconds
+        self.latency_max = max(self.latency_max, seconds)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def quantile(self, fraction):
+        """Approximate quantile from the histogram (bucket upper bound)."""
+        total = sum(self.buckets)
+        if not total:
+            return 0.0
+        rank = fraction * total
+        running = 0
+        for index, count in enumerate(self.buckets):
+            running += count
+            if running >= rank:
+                if index < len(LATENCY_BUCKETS):
+                    return min(LATENCY_BUCKETS[index], round(self.latency_max, 6))
+                return self.latency_max
+        return self.latency_max
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rate_limited_429": self.rate_limited,
+            "retries": self.retries,
+            "bytes_received": self.bytes_received,
+            "latency_sum_seconds": round(self.latency_sum, 6),
+            "latency_max_seconds": round(self.latency_max, 6),
+            "latency_p50_seconds": self.quantile(0.5),
+            "latency_p99_seconds": self.quantile(0.99),
+            "latency_buckets": {
+                **{str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.buckets)},
+                "+Inf": self.buckets[-1],
+            },
+        }
+
+class Metrics(object):
+    """Thread-safe registry of per-method RPC statistics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.methods = {}
+            self.throttle_seconds = 0.0
+            self.throttle_waits = 0
+            self.started = time.time()
+
+    def _method(self, method):
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = MethodStats()
+        return stats
+
+    def record_call(self, method, seconds, error=None, bytes_received=0):
+        with self._lock:
+            stats = self._method(method)
+            stats.calls += 1
+            stats.observe(seconds)
+            stats.bytes_received += bytes_received
+            if error is not None:
+                stats.errors += 1
+                if getattr(error, "code", None) == 429:
+                    stats.rate_limited += 1
+
+    def record_retry(self, method):
+        with self._lock:
+            self._method(method).retries += 1
+
+    def record_throttle(self, seconds):
+        with self._lock:
+            self.throttle_waits += 1
+            self.throttle_seconds += seconds
+
+    # output
+    def to_dict(self):
+        with self._lock:
+            return {
+                "elapsed_seconds": round(time.time() - self.started, 3),
+                "throttle_sleep_seconds": round(self.throttle_seconds, 3),
+                "throttle_waits": self.throttle_waits,
+                "methods": {method: stats.to_dict() for method, stats in sorted(self.methods.items())},
+            }
+
+    def to_prometheus(self):
+        """Prometheus text exposition format."""
+        data = self.to_dict()
+        lines = [
+            "# HELP gmcm_rpc_calls_total RPCs issued per API method.",
+            "# TYPE gmcm_rpc_calls_total counter",
+        ]
+        methods = data["methods"]
+        for method, stats in methods.items():
+            lines.append(f'gmcm_rpc_calls_total{{method="{method}"}} {stats["calls"]}')
+        for name, key, help_text in (
+                ("gmcm_rpc_errors_total", "errors", "Failed RPCs per API method."),
+                ("gmcm_rpc_rate_limited_total", "rate_limited_429", "RPCs rejected with 429 / RESOURCE_EXHAUSTED."),
+                ("gmcm_rpc_retries_total", "retries", "RPC retries after rate limit errors."),
+                ("gmcm_rpc_received_bytes_total", "bytes_received", "Serialized response bytes received.")):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for method, stats in methods.items():
+                lines.append(f'{name}{{method="{method}"}} {stats[key]}')
+        lines.append("# HELP gmcm_rpc_latency_seconds RPC latency per API method.")
+        lines.append("# TYPE gmcm_rpc_latency_seconds histogram")
+        for method, stats in methods.items():
+            cumulative = 0
+            for bound, count in stats["latency_buckets"].items():
+                cumulative += count
+                lines.append(f'gmcm_rpc_latency_seconds_bucket{{method="{method}",le="{bound}"}} {cumulative}')
+            lines.append(f'gmcm_rpc_latency_seconds_sum{{method="{method}"}} {stats["latency_sum_seconds"]}')
+            lines.append(f'gmcm_rpc_latency_seconds_count{{method="{method}"}} {stats["calls"]}')
+        lines.append("# HELP gmcm_throttle_sleep_seconds_total Time spent waiting in rate limiters.")
+        lines.append("# TYPE gmcm_throttle_sleep_seconds_total counter")
+        lines.append(f"gmcm_throttle_sleep_seconds_total {data['throttle_sleep_seconds']}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Human readable end-of-run summary table."""
+        data = self.to_dict()
+        lines = [
+            f"\nAPI call summary ({data['elapsed_seconds']}s elapsed, "
+            f"{data['throttle_sleep_seconds']}s waiting on rate limits over {data['throttle_waits']} waits):",
+            f"{'method':<34}{'calls':>7}{'errors':>7}{'429s':>6}{'retries':>8}{'p50 s':>8}{'p99 s':>8}{'max s':>8}{'total s':>9}{'KB recv':>10}",
+        ]
+        for method, stats in data["methods"].items():
+            lines.append(
+                f"{method:<34}{stats['calls']:>7}{stats['errors']:>7}{stats['rate_limited_429']:>6}"
+                f"{stats['retries']:>8}{stats['latency_p50_seconds']:>8}{stats['latency_p99_seconds']:>8}"
+                f"{round(stats['latency_max_seconds'], 3):>8}{round(stats['latency_sum_seconds'], 2):>9}"
+                f"{round(stats['bytes_received'] / 1024, 1):>10}")
+        if not data["methods"]:
+            lines.append("No API calls recorded.")
+        return "\n".join(lines)
+
+    def write(self, path):
+        """Writes JSON if `path` ends in .json, Prometheus text format otherwise."""
+        with open(path, "w") as outfile:
+            if path.endswith(".json"):
+                json.dump(self.to_dict(), outfile, indent=2)
+            else:
+                outfile.write(self.to_prometheus())
+        return path
+
+# process wide registry
+registry = Metrics()
+
+def response_size(response):
+    """Serialized size of a proto-plus/protobuf response or pager, 0 if unknown."""
+    response = getattr(response, "_response", response)  # pagers keep the raw page
+    try:
+        if hasattr(response, "ByteSize"):
+            return response.ByteSize()
+        return type(response).pb(response).ByteSize()
+    except Exception:
+        return 0
+
+class InstrumentedClient(object):
+    """Proxy around a Merchant API client timing every RPC method call
+    (and recording it as a child span when tracing is enabled)."""
+
+    def __init__(self, client, metrics=None):
+        self._client = client
+        self._metrics = metrics or registry
+        self._prefix = type(client).__name__.replace("ServiceClient", "")
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or not name.startswith(_RPC_PREFIXES) or name.endswith("_path"):
+            return attr
+        method = f"{self._prefix}.{name}"
+        metrics = self._metrics
+
+        def timed(*args, **kwargs):
+            with tracing.span(method) as rpc_span:
+                start_time = time.perf_counter()
+                try:
+                    response = attr(*args, **kwargs)
+                except Exception as e:
+                    metrics.record_call(method, time.perf_counter() - start_time, error=e)
+                    raise
+                size = response_size(response)
+                metrics.record_call(method, time.perf_counter() - start_time, bytes_received=size)
+                rpc_span.set_attribute("bytes_received", size)
+            return response
+        return timed
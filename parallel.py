@@ -0,0 +1,82 @@
+"""
+Multi-process execution of merchant scans.
+
+Parsing `ListProducts` responses is CPU-bound pure Python, so one process tops
+out at a single core on large catalogs. The functions here spread the
+merchants in merchant-info.json over a process pool. Every worker authorizes
+once (the access-token cache makes this cheap), builds its own clients and
+gets an equal share of each credential's rate budget, or draws from the
+shared bucket when `ratelimit.share_across_processes` is on. Partial results are
+streamed back per merchant and merged into one report by the parent.
+"""
+
+# imports
+import contextlib
+import io
+import multiprocessing
+import time
+import ratelimit
+import records
+import services
+from auth import Configure as ac
+from ratelimit import RateLimiter, SharedRateLimiter
+
+# per worker process state, set by _init_worker
+_worker_credentials = None
+
+
+def _init_worker(workers, shared_quota_dir=None):
+    """Pool initializer: authorizes and scales every rate limiter to 1/workers
+    (shared limiters already split the budget between the processes)."""
+    global _worker_credentials
+    import auth
+    ratelimit.share_across_processes(shared_quota_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _worker_credentials = auth.authorize()
+    if isinstance(_worker_credentials, auth.CredentialPool):
+        shards = list(_worker_credentials)
+    else:
+        shards = [services.get_shard(_worker_credentials)]
+    for shard in shards:
+        if not isinstance(shard.limiter, SharedRateLimiter):
+            shard.limiter = RateLimiter(shard.limiter.rate / workers)
+
+def _scan_disapproved(merchant, prod_menu_choice):
+    """Worker task: disapproved products and their aggregates for a single merchant."""
+    summary = records.IssueSummary()
+    data, _, _ = services.disapproved_products(
+        _worker_credentials, prod_menu_choice, merchants=[merchant], summary=summary)
+    return merchant.get("propName"), data, summary
+
+def run_pool(task, task_args, workers):
+    """Runs `task(*args)` for every entry of `task_args` in a pool of `workers`
+    processes and yields the results as they complete."""
+    context = multiprocessing.get_context("spawn")  # no forking of gRPC/auth threads
+    with context.Pool(processes=workers, initializer=_init_worker, initargs=(workers, ratelimit.shared_directory())) as pool:
+        for result in pool.imap_unordered(_star, [(task, args) for args in task_args]):
+            yield result
+
+def _star(task_and_args):
+    task, args = task_and_args
+    return task(*args)
+
+def disapproved_products(prod_menu_choice, workers, merchants=None, summary=None):
+    """Parallel version of `services.disapproved_products`, returns the same
+    (data, table, count) triple. Worker aggregates are merged into `summary`."""
+    merchants = merchants if merchants is not None else ac.read_merchant_ids()
+    merchants = [merchant for merchant in merchants if merchant.get("merchantId")]
+    workers = max(1, min(workers, len(merchants)))
+    print(f"Scanning {len(merchants)} merchants with {workers} worker processes...")
+    start_time = time.time()
+    disapproved_product_data = []
+    for done, (prop_name, data, worker_summary) in enumerate(
+            run_pool(_scan_disapproved, [(merchant, prod_menu_choice) for merchant in merchants], workers), 1):
+        disapproved_product_data.extend(data)
+        if summary is not None:
+            summary.merge(worker_summary)
+        print(f"[{done}/{len(merchants)}] {prop_name}: {len(data)} rows "
+              f"({round(time.time() - start_time, 2)}s)")
+    disapproved_product_count = len(disapproved_product_data)
+    disapproved_product_data_table = records.product_issues_frame(
+        disapproved_product_data, records.PRODUCT_ISSUE_EXTRA_FIELDS.get(prod_menu_choice, ()))
+    return disapproved_product_data, disapproved_product_data_table, disapproved_product_count
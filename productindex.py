@@ -0,0 +1,264 @@
+"""
+Cross-account product index.
+
+Maps offer IDs, GTINs and product links to `Product` resource names across
+every merchant in merchant-info.json, stored in a local SQLite database with
+an index per key, so a SKU, GTIN or URL resolves to its products (and
+accounts) with one indexed lookup instead of a scan of every account.
+
+The index is refreshed per merchant from `ListProducts`: merchants indexed
+within `max_age` are skipped, a complete scan replaces the merchant's
+entries (products that disappeared are dropped) and an interrupted scan keeps
+the previous ones. Products fetched one at a time can be added with `add`.
+
+Usage:
+  python productindex.py refresh --max-age-hours 24
+  python productindex.py find SKU0001234
+  python productindex.py shared-gtins
+"""
+
+# imports
+import argparse
+import os
+import sqlite3
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    product_name TEXT PRIMARY KEY,
+    merchant_id TEXT NOT NULL,
+    prop TEXT,
+    offer_id TEXT,
+    link TEXT,
+    data_source TEXT,
+    scan_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS products_offer_id ON products (offer_id);
+CREATE INDEX IF NOT EXISTS products_link ON products (link);
+CREATE INDEX IF NOT EXISTS products_merchant ON products (merchant_id, scan_id);
+CREATE TABLE IF NOT EXISTS gtins (
+    gtin TEXT NOT NULL,
+    product_name TEXT NOT NULL,
+    PRIMARY KEY (gtin, product_name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS gtins_product ON gtins (product_name);
+CREATE TABLE IF NOT EXISTS merchants (
+    merchant_id TEXT PRIMARY KEY,
+    prop TEXT,
+    refreshed_at REAL,
+    product_count INTEGER
+);
+"""
+_PAGE_SIZE = 1000
+
+
+class ProductIndex(object):
+    """SQLite store of offer ID / GTIN / link -> product resource name."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def _upsert(self, rows, scan_id=None):
+        """Writes (product_name, merchant_id, prop, offer_id, link, data_source, gtins) rows."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(*row[:6], scan_id) for row in rows])
+        self.connection.executemany("DELETE FROM gtins WHERE product_name = ?", [(row[0],) for row in rows])
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO gtins VALUES (?, ?)",
+            [(gtin, row[0]) for row in rows for gtin in row[6] if gtin])
+
+    def add(self, product, prop=None):
+        """Indexes a single `Product` (e.g. one fetched with `services.get_product`)."""
+        import helpers
+        import records
+        with self.connection:
+            self._upsert([_row(records.raw(product), helpers.merchant_id_from_resource(product.name), prop)])
+
+    def refresh_merchant(self, credentials, prop, merchant_id):
+        """Re-indexes one merchant from a full `ListProducts` scan, returns the product count."""
+        import dispatch
+        import services
+        from google.shopping.merchant_products_v1beta import ProductsServiceClient, ListProductsRequest
+        client = services.get_client(ProductsServiceClient, credentials, merchant_id)
+        scan_id = time.time_ns()
+        count = 0
+        for response in services.prefetch_pages(
+                credentials, merchant_id, client.list_products,
+                lambda page_token: ListProductsRequest(parent=f"accounts/{merchant_id}", page_token=page_token,
+                                                       page_size=_PAGE_SIZE),
+                priority=dispatch.BULK, retry_method="Products.list_products"):
+            rows = [_row(product, merchant_id, prop) for product in response.products.pb]
+            with self.connection:
+                self._upsert(rows, scan_id)
+            count += len(rows)
+        with self.connection:
+            stale = [(row[0],) for row in self.connection.execute(
+                "SELECT product_name FROM products WHERE merchant_id = ? AND (scan_id IS NULL OR scan_id != ?)",
+                (merchant_id, scan_id))]
+            self.connection.executemany("DELETE FROM gtins WHERE product_name = ?", stale)
+            self.connection.executemany("DELETE FROM products WHERE product_name = ?", stale)
+            self.connection.execute("INSERT OR REPLACE INTO merchants VALUES (?, ?, ?, ?)",
+                                    (merchant_id, prop, time.time(), count))
+        return count
+
+    def refresh(self, credentials, merchants=None, max_age=None):
+        """Refreshes every merchant (merchant-info.json if `merchants` is None) not indexed
+        within `max_age` seconds. Returns {merchant_id: product count} of the refreshed ones."""
+        import services
+        import tracing
+        refreshed_at = {row["merchant_id"]: row["refreshed_at"]
+                        for row in self.connection.execute("SELECT merchant_id, refreshed_at FROM merchants")}
+        counts = {}
+        for merchant in services.load_merchants(merchants):
+            prop = merchant.get("propName")
+            merchant_id = str(merchant.get("merchantId") or "")
+            if not merchant_id:
+                print(f"Merchant ID missing for {prop}! Skipping...")
+                continue
+            if max_age is not None and time.time() - refreshed_at.get(merchant_id, 0) < max_age:
+                continue
+            with tracing.span("index_merchant", prop=prop, merchant_id=merchant_id):
+                try:
+                    counts[merchant_id] = self.refresh_merchant(credentials, prop, merchant_id)
+                except Exception as e:
+                    print(f"Index refresh failed for {prop} (ID: {merchant_id}): {str(e).splitlines()[0]}")
+        return counts
+
+    def find(self, term):
+        """Products matching a resource name, offer ID, GTIN or product link, as dicts
+        with a `match` key (name, offer_id, gtin or link)."""
+        term = term.strip()
+        if not term:
+            return []
+        if term.startswith("accounts/"):
+            query, params, match = "p.product_name = ?", (term,), "name"
+        elif term.lower().startswith(("http://", "https://")):
+            query, params, match = "p.link = ?", (term,), "link"
+        else:
+            query = ("p.offer_id = ? OR p.product_name IN (SELECT product_name FROM gtins WHERE gtin = ?)")
+            params, match = (term, term), None
+        matches = []
+        for row in self.connection.execute(
+                f"SELECT p.* FROM products p WHERE {query} ORDER BY p.prop, p.product_name", params):
+            product = dict(row)
+            product.pop("scan_id")
+            product["match"] = match or ("offer_id" if row["offer_id"] == term else "gtin")
+            matches.append(product)
+        return matches
+
+    def resolve(self, term):
+        """The single product resource name for `term`. Raises LookupError if no
+        or several products match."""
+        if term.startswith("accounts/"):
+            return term
+        matches = self.find(term)
+        if len(matches) != 1:
+            raise LookupError(f"'{term}' matches {len(matches)} indexed products"
+                              + (": " + ", ".join(match["product_name"] for match in matches[:5]) if matches else ""))
+        return matches[0]["product_name"]
+
+    def gtin_accounts(self, gtins):
+        """{gtin: sorted merchant IDs using it} for the given GTINs."""
+        accounts = {}
+        gtins = list(dict.fromkeys(gtin for gtin in gtins if gtin))
+        for start in range(0, len(gtins), 500):
+            batch = gtins[start:start + 500]
+            for row in self.connection.execute(
+                    f"SELECT DISTINCT g.gtin, p.merchant_id FROM gtins g JOIN products p USING (product_name) "
+                    f"WHERE g.gtin IN ({', '.join('?' * len(batch))}) ORDER BY p.merchant_id", batch):
+                accounts.setdefault(row["gtin"], []).append(row["merchant_id"])
+        return accounts
+
+    def shared_gtins(self, min_accounts=2):
+        """GTINs used by products of at least `min_accounts` merchants."""
+        return [dict(row) for row in self.connection.execute(
+            """
+            SELECT g.gtin, COUNT(DISTINCT p.merchant_id) AS accounts, COUNT(*) AS products,
+                   GROUP_CONCAT(DISTINCT p.prop) AS props
+            FROM gtins g JOIN products p USING (product_name)
+            GROUP BY g.gtin
+            HAVING COUNT(DISTINCT p.merchant_id) >= ?
+            ORDER BY accounts DESC, g.gtin
+            """, (min_accounts,))]
+
+    def merchants(self):
+        return [dict(row) for row in self.connection.execute("SELECT * FROM merchants ORDER BY prop")]
+
+def _row(product, merchant_id, prop):
+    """Index row of a raw `Product` message."""
+    attributes = product.attributes
+    return (product.name, str(merchant_id), prop, product.offer_id, attributes.link or None,
+            product.data_source, list(attributes.gtin))
+
+def open_default():
+    """Opens the product index configured in auth.py."""
+    from auth import Configure as ac
+    return ProductIndex(ac().get_config()["product_index_path"])
+
+def annotate_shared_gtins(table, index):
+    """Adds a `gtin_accounts` column (merchant IDs using any of the row's GTINs) to an
+    invalid_upc report DataFrame, returns the table."""
+    if table.empty or "gtin" not in table.columns:
+        return table
+    gtin_lists = [str(gtins).split(",") if isinstance(gtins, str) else [] for gtins in table["gtin"]]
+    accounts = index.gtin_accounts(gtin for gtins in gtin_lists for gtin in gtins)
+    table["gtin_accounts"] = [",".join(sorted({merchant_id for gtin in gtins for merchant_id in accounts.get(gtin, ())}))
+                              for gtins in gtin_lists]
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(prog="productindex", description="GMCM cross-account product index")
+    parser.add_argument("--db", help="Index database (default: the path configured in auth.py)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    refresh = subparsers.add_parser("refresh", help="Re-index merchants from their product listings")
+    refresh.add_argument("--max-age-hours", type=float, help="Skip merchants indexed more recently than this")
+    find = subparsers.add_parser("find", help="Products by resource name, offer ID, GTIN or link")
+    find.add_argument("terms", nargs="+")
+    shared = subparsers.add_parser("shared-gtins", help="GTINs used in more than one account")
+    shared.add_argument("--min-accounts", type=int, default=2)
+    subparsers.add_parser("status", help="Indexed merchants and when they were refreshed")
+    args = parser.parse_args()
+    import helpers
+    with (ProductIndex(args.db) if args.db else open_default()) as index:
+        if args.command == "refresh":
+            import auth
+            credentials = auth.authorize()
+            start_time = time.time()
+            counts = index.refresh(credentials, max_age=args.max_age_hours * 3600 if args.max_age_hours else None)
+            print(f"Indexed {sum(counts.values())} products of {len(counts)} merchants "
+                  f"in {round(time.time() - start_time, 2)} seconds ({len(index)} products in the index)")
+            return
+        if args.command == "find":
+            rows = [match for term in args.terms for match in index.find(term)]
+        elif args.command == "shared-gtins":
+            rows = index.shared_gtins(args.min_accounts)
+        else:
+            rows = index.merchants()
+            for row in rows:
+                row["refreshed_at"] = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["refreshed_at"]))
+    if rows:
+        helpers.display_table(rows)
+    else:
+        print("No matching products.")
+
+if __name__ == '__main__':
+    main()
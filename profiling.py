@@ -0,0 +1,66 @@
+"""
+CPU and allocation profiling for '--auto' jobs.
+
+`profile_run` wraps a job in cProfile and tracemalloc and writes, next to the
+job's reports:
+  profile-<job>-<timestamp>.pstats     cProfile stats (open with pstats, snakeviz, ...)
+  profile-<job>-<timestamp>-alloc.txt  top allocation sites and the top CPU functions
+"""
+
+# imports
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import tracemalloc
+import helpers
+
+
+@contextlib.contextmanager
+def profile_run(job_name, out_dir=".", top=25, frames=5):
+    """Profiles the enclosed block, yields the dict of output paths (filled on exit)."""
+    timestamp = helpers.generate_timestamp()
+    base_path = os.path.join(out_dir, f"profile-{job_name}-{timestamp}")
+    paths = {"pstats": f"{base_path}.pstats", "alloc": f"{base_path}-alloc.txt"}
+    os.makedirs(out_dir, exist_ok=True)
+    tracemalloc.start(frames)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield paths
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        profiler.dump_stats(paths["pstats"])
+        with open(paths["alloc"], "w") as outfile:
+            outfile.write(allocation_summary(snapshot, current, peak, top))
+            outfile.write("\n")
+            outfile.write(cpu_summary(profiler, top))
+        print(f"Profile saved: {paths['pstats']}\n"
+              f"Allocation summary saved: {paths['alloc']} (peak traced memory {peak / 1024 / 1024:.1f} MB)")
+
+def allocation_summary(snapshot, current, peak, top=25):
+    """Top allocation sites by size, grouped by the allocating line."""
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+    lines = [f"Traced memory: current {current / 1024 / 1024:.1f} MB, peak {peak / 1024 / 1024:.1f} MB",
+             f"Top {top} allocation sites (still allocated at the end of the run):"]
+    for index, stat in enumerate(snapshot.statistics("traceback")[:top], 1):
+        frame = stat.traceback[-1]  # innermost frame
+        lines.append(f"{index:>3}. {stat.size / 1024:10.1f} KB {stat.count:>9} blocks  {frame.filename}:{frame.lineno}")
+        for caller in reversed(list(stat.traceback)[:-1]):
+            lines.append(f"          called from {caller.filename}:{caller.lineno}")
+    return "\n".join(lines) + "\n"
+
+def cpu_summary(profiler, top=25):
+    """Top functions by cumulative time."""
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer)
+    stats.sort_stats("cumulative").print_stats(top)
+    return f"Top {top} functions by cumulative CPU time:\n{buffer.getvalue()}"
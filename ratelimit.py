@@ -0,0 +1,133 @@
+"""
+Rate limiting for Merchant API requests.
+
+The Merchant API quota is enforced per GCP project, the default budget used
+throughout GMCM is 4 requests per second (see readme).
+
+Every process throttles on its own unless `share_across_processes` is
+called: limiters created by `limiter_for` then keep their bucket in a file
+per credential, locked with flock, so concurrent GMCM processes (e.g.
+overlapping cron jobs) using the same credentials share one budget.
+"""
+
+# imports
+import hashlib
+import os
+import struct
+import threading
+import time
+try:
+    import fcntl
+except ImportError:  # Windows, limiters stay per process
+    fcntl = None
+
+DEFAULT_RATE = 4.0  # requests per second
+
+# directory of the shared bucket files, None if limiters are per process
+_shared_dir = None
+
+
+class RateLimiter(object):
+    """Thread-safe token bucket allowing `rate` requests per second with
+    bursts of up to `burst` requests."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        """Takes `tokens` from the bucket and returns how long the caller must wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` requests may be sent, returns the seconds slept."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class SharedRateLimiter(object):
+    """Token bucket stored in the file at `path`, shared by every process (and
+    thread) using that file. Same interface as `RateLimiter`."""
+
+    _STATE = struct.Struct("<dd")  # tokens, wall clock time of the last update
+
+    def __init__(self, path, rate=DEFAULT_RATE, burst=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.path = path
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # flock doesn't exclude threads sharing one file descriptor
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        """Takes `tokens` from the shared bucket and returns how long the caller must wait."""
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                state = os.pread(self._fd, self._STATE.size, 0)
+                now = time.time()
+                if len(state) == self._STATE.size:
+                    stored, updated = self._STATE.unpack(state)
+                    stored = min(self.burst, stored + max(0.0, now - updated) * self.rate)
+                else:
+                    stored = float(self.burst)
+                stored -= tokens
+                os.pwrite(self._fd, self._STATE.pack(stored, now), 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        if stored >= 0:
+            return 0.0
+        return -stored / self.rate
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` requests may be sent, returns the seconds slept."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def close(self):
+        os.close(self._fd)
+
+def share_across_processes(directory):
+    """Makes limiters created by `limiter_for` from now on share their budget with
+    other processes through bucket files in `directory`. None turns sharing off.
+    Returns False if file locks are not supported on this platform."""
+    global _shared_dir
+    if directory is None:
+        _shared_dir = None
+        return True
+    if fcntl is None:
+        print("Shared quota is not supported on this platform, rate limits apply per process.")
+        return False
+    os.makedirs(directory, exist_ok=True)
+    _shared_dir = directory
+    return True
+
+def shared_directory():
+    """The directory set with `share_across_processes`, None if limiters are per process."""
+    return _shared_dir
+
+def limiter_for(key, rate=DEFAULT_RATE):
+    """A limiter for the quota identified by `key` (e.g. a GCP project ID): shared
+    with other processes if `share_across_processes` was called, else a `RateLimiter`."""
+    if _shared_dir is None:
+        return RateLimiter(rate)
+    digest = hashlib.sha1(str(key).encode("utf-8")).hexdigest()[:16]
+    return SharedRateLimiter(os.path.join(_shared_dir, f"quota-{digest}.bucket"), rate)
@@ -0,0 +1,274 @@
+"""
+Compact row records for large reports.
+
+A disapproved-product scan can produce hundreds of thousands of rows. Keeping
+them as dicts of proto-plus messages costs several KB per row, so rows are
+stored as NamedTuples instead: repeated strings (prop, merchant ID, issue code,
+severity, attribute, feed label, currency) are interned so every row shares one
+copy, and prices are flattened to integer micros. Tables are built column-wise
+straight from the records.
+
+Product loops read the underlying protobuf messages (`raw`) instead of the
+proto-plus wrappers, whose every field access goes through the marshal layer,
+and only read the fields a report needs.
+"""
+
+# imports
+import sys
+from typing import NamedTuple, Optional
+
+_intern = sys.intern
+
+
+class ProductIssue(NamedTuple):
+    """One item level issue of a disapproved product."""
+    prop: str
+    merchant_id: str
+    product_id: str
+    price_micros: Optional[int]
+    currency: str
+    product_name: str
+    product_link: str
+    product_resource_id: str
+    feed_label: str
+    i_code: str
+    i_severity: Optional[str]
+    i_attribute: str
+    i_description: str
+    image_link: Optional[str] = None
+    gtin: Optional[str] = None
+
+# record field -> report column, in report order
+PRODUCT_ISSUE_COLUMNS = {
+    "prop": "prop",
+    "merchant_id": "merchantID",
+    "product_id": "productID",
+    "price_micros": "sold_price",
+    "currency": "currency",
+    "product_name": "product_name",
+    "product_link": "product_link",
+    "product_resource_id": "product_resource_id",
+    "feed_label": "feed_label",
+    "i_code": "i_code",
+    "i_severity": "i_severity",
+    "i_attribute": "i_attribute",
+    "i_description": "i_description",
+    "image_link": "imageLink",
+    "gtin": "gtin",
+}
+# optional columns per disapproved products menu choice
+PRODUCT_ISSUE_EXTRA_FIELDS = {
+    "broken_images": ("image_link",),
+    "invalid_upc": ("gtin",),
+}
+
+def intern(value):
+    """Interns a string shared by many rows, passes None through."""
+    return _intern(value) if value else value
+
+def price_micros(price):
+    """Flattens a `Price` message (proto-plus or raw) to (amount_micros, currency_code), (None, "") if unset."""
+    if not price or not price.currency_code:
+        return None, ""
+    return int(price.amount_micros), _intern(price.currency_code)
+
+def raw(message):
+    """The protobuf message underneath a proto-plus message, no copy is made."""
+    return type(message).pb(message)
+
+def enum_names(enum):
+    """{number: name} of a proto-plus enum, for enum fields read from raw messages."""
+    return {int(member): member.name for member in enum}
+
+# issue filters of the disapproved products menu: (code, severity name, attribute) -> bool
+ISSUE_FILTERS = {
+    "all_disapproved": lambda code, severity, attribute: bool(severity) and severity != "NOT_IMPACTED",
+    "landing_page_errors": lambda code, severity, attribute: "landing_page_error" in code,
+    "broken_images": lambda code, severity, attribute: code == "image_link_broken",
+    "price_updates": lambda code, severity, attribute: "price" in attribute,
+    "policy_violations": lambda code, severity, attribute: "policy_violation" in code,
+    "invalid_upc": lambda code, severity, attribute: "invalid_upc" in code,
+    "no_impact": lambda code, severity, attribute: severity == "NOT_IMPACTED",
+}
+# product detail key -> `Attributes` field, in display order
+PRODUCT_DETAIL_FIELDS = {
+    "product_name": "title",
+    "product_link": "link",
+    "mobile_link": "mobile_link",
+    "canonical_link": "canonical_link",
+    "image_link": "image_link",
+    "ads_redirect": "ads_redirect",
+    "display_ads_link": "display_ads_link",
+    "link_template": "link_template",
+    "mobile_link_template": "mobile_link_template",
+}
+
+def product_details(product, fields=None):
+    """Product detail dict of a `Product` read from the raw message: resource names,
+    the `fields` keys of `PRODUCT_DETAIL_FIELDS` (all by default), prices as amounts,
+    GTINs and custom attributes."""
+    product = raw(product)
+    attributes = product.attributes
+    details = {
+        "feed_resource_id": product.data_source,
+        "product_resource_id": product.name,
+        "productID": product.offer_id,
+    }
+    for key in fields or PRODUCT_DETAIL_FIELDS:
+        details[key] = getattr(attributes, PRODUCT_DETAIL_FIELDS[key])
+    price, currency = price_micros(attributes.price)
+    sale_price, sale_currency = price_micros(attributes.sale_price)
+    details["product_price"] = micros_to_amount(price)
+    details["product_sale_price"] = micros_to_amount(sale_price)
+    details["currency"] = currency or sale_currency
+    details["gtin"] = ",".join(attributes.gtin)
+    details["custom_attributes"] = [{"name": attr.name, "value": attr.value} for attr in product.custom_attributes]
+    return details
+
+def _issue_enum_names():
+    from google.shopping.merchant_products_v1beta import ProductStatus
+    from google.shopping.type import ReportingContext
+    return (enum_names(ProductStatus.ItemLevelIssue.Severity),
+            enum_names(ReportingContext.ReportingContextEnum))
+
+def product_issue_records(products, prop, merchant_id, prod_menu_choice, summary=None, seen=None):
+    """Yields a `ProductIssue` per matching item level issue of raw `Product` messages
+    (e.g. `response.products.pb`) that are disapproved for at least one destination.
+    Product fields are only read for products with a matching issue. Records already
+    in the `seen` set are skipped, new ones are added to it. A passed `IssueSummary`
+    gets one entry per yielded record, counted for the reporting contexts of its issues
+    (the disapproved destinations if the issues have none)."""
+    issue_filter = ISSUE_FILTERS.get(prod_menu_choice)
+    if issue_filter is None:
+        return
+    extra_fields = PRODUCT_ISSUE_EXTRA_FIELDS.get(prod_menu_choice, ())
+    severity_names, context_names = _issue_enum_names()
+    for product in products:
+        product_status = product.product_status
+        destination_names = [intern(context_names.get(destination.reporting_context, ""))
+                             for destination in product_status.destination_statuses
+                             if destination.disapproved_countries]
+        if not destination_names:
+            continue
+        matches = []
+        for issue in product_status.item_level_issues:
+            severity = severity_names.get(issue.severity) if issue.severity else None
+            if issue_filter(issue.code, severity, issue.attribute):
+                matches.append((issue, severity))
+        if not matches:
+            continue
+        attributes = product.attributes
+        amount_micros, currency = price_micros(
+            attributes.sale_price if attributes.HasField("sale_price") else attributes.price)
+        product_name = product.name
+        product_fields = (prop, merchant_id, product.offer_id, amount_micros, currency, attributes.title,
+                          attributes.link, product_name, intern(product.feed_label))
+        image_link = attributes.image_link if "image_link" in extra_fields else None
+        gtin = ",".join(attributes.gtin) if "gtin" in extra_fields else None
+        # issues reported once per reporting context collapse into one record
+        record_contexts = {}
+        for issue, severity in matches:
+            record = ProductIssue(*product_fields, _intern(issue.code), intern(severity), intern(issue.attribute),
+                                  issue.description, image_link, gtin)
+            contexts = record_contexts.setdefault(record, [])
+            if issue.reporting_context:
+                contexts.append(intern(context_names.get(issue.reporting_context, "")))
+        for record, contexts in record_contexts.items():
+            if seen is not None:
+                if record in seen:
+                    continue
+                seen.add(record)
+            if summary is not None:
+                summary.add(prop, record.i_code, record.i_severity, list(dict.fromkeys(contexts)) or destination_names,
+                            product_name, product.data_source)
+            yield record
+
+def micros_to_amount(micros):
+    return None if micros is None else micros / 1000000
+
+def to_columns(records, fields):
+    """Transposes `records` into {field: list of values} for the given fields."""
+    if not records:
+        return {field: [] for field in fields}
+    indexes = [records[0]._fields.index(field) for field in fields]
+    columns = list(zip(*records))
+    return {field: list(columns[index]) for field, index in zip(fields, indexes)}
+
+def product_issues_frame(records, extra_fields=()):
+    """Builds the disapproved products DataFrame column-wise, sorted by prop.
+    Optional columns (image_link, gtin) are only included when listed in `extra_fields`."""
+    import tables
+    fields = [field for field in PRODUCT_ISSUE_COLUMNS
+              if field not in ("image_link", "gtin") or field in extra_fields]
+    columns = to_columns(records, fields)
+    columns["price_micros"] = [micros_to_amount(micros) for micros in columns["price_micros"]]
+    builder = tables.ColumnBuilder.from_columns(
+        {PRODUCT_ISSUE_COLUMNS[field]: values for field, values in columns.items()},
+        categories=("prop", "merchantID", "currency", "feed_label", "i_code", "i_severity", "i_attribute"),
+        dtypes={"sold_price": "Float64"})
+    return builder.to_frame(sort_by="prop")
+
+class IssueSummary(object):
+    """Running aggregates of a disapproved products scan, updated as rows stream in:
+    issue count and affected products per (prop, issue code, severity, destination)
+    and issue count per (prop, feed)."""
+
+    def __init__(self):
+        self.issues = {}
+        self.products = {}
+        self.feeds = {}
+
+    def add(self, prop, code, severity, destinations, product, feed):
+        """Counts one issue of `product` for each of its `destinations` and once for its feed."""
+        for destination in destinations:
+            key = (prop, code, severity, destination)
+            self.issues[key] = self.issues.get(key, 0) + 1
+            products = self.products.get(key)
+            if products is None:
+                products = self.products[key] = set()
+            products.add(product)
+        feed_key = (prop, feed)
+        self.feeds[feed_key] = self.feeds.get(feed_key, 0) + 1
+
+    def merge(self, other):
+        """Adds the aggregates of another summary (e.g. from a worker process)."""
+        for key, count in other.issues.items():
+            self.issues[key] = self.issues.get(key, 0) + count
+            self.products.setdefault(key, set()).update(other.products[key])
+        for key, count in other.feeds.items():
+            self.feeds[key] = self.feeds.get(key, 0) + count
+        return self
+
+    def __len__(self):
+        return len(self.issues)
+
+    def top_feeds(self, top=10):
+        """The `top` (prop, feed, issue count) entries with the most issues."""
+        ranked = sorted(self.feeds.items(), key=lambda item: item[1], reverse=True)[:top]
+        return [(prop, feed, count) for (prop, feed), count in ranked]
+
+    def to_frame(self):
+        """Summary table sorted by prop, then issue count (descending)."""
+        import tables
+        builder = tables.ColumnBuilder(
+            ("prop", "i_code", "i_severity", "destination", "issues", "products"),
+            categories=("prop", "i_code", "i_severity", "destination"))
+        for key, count in sorted(self.issues.items(), key=lambda item: -item[1]):
+            builder.append(*key, count, len(self.products[key]))
+        return builder.to_frame(sort_by="prop")
+
+    def report(self, top=10):
+        """Printable summary: issue counts and the top offending feeds."""
+        import viewer
+        if not self.issues:
+            return "No issues found."
+        table = self.to_frame()
+        lines = ["Issues by prop / issue code / severity / destination:"]
+        lines += viewer.render_rows(list(table.columns), table.itertuples(index=False, name=None),
+                                    viewer.column_widths(table, max_width=60))
+        feeds = self.top_feeds(top)
+        lines.append(f"Top {len(feeds)} feeds by issue count:")
+        lines += viewer.render_rows(["prop", "feed", "issues"], feeds,
+                                    [max([len(str(row[index])) for row in feeds] + [len(header)])
+                                     for index, header in enumerate(("prop", "feed", "issues"))])
+        return "\n".join(lines)
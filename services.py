@@ -1,44 +1,172 @@
 # imports
-import pandas as pd
 import random
+import threading
 import time
+import cache
+import dispatch
 import helpers
-from auth import Configure as ac
-from google.api_core.exceptions import TooManyRequests, ResourceExhausted
-from google.type import timeofday_pb2
-from google.shopping.type import Channel, Price
-from google.shopping.merchant_accounts_v1beta import (
-    AccountsServiceClient, 
-    GetAccountRequest, 
-    AccountIssueServiceClient, 
-    ListAccountIssuesRequest,
-    GetShippingSettingsRequest,
-    ShippingSettingsServiceClient)
-from google.shopping.merchant_datasources_v1beta import (
-    DataSourcesServiceClient, 
-    FileUploadsServiceClient, 
-    ListDataSourcesRequest, 
-    FetchDataSourceRequest, 
-    GetFileUploadRequest,
-    CreateDataSourceRequest,
-    DataSource,
-    FileInput,
-    PrimaryProductDataSource)
-from google.shopping.merchant_products_v1beta import (
-    ProductsServiceClient,
-    ListProductsRequest,
-    GetProductRequest,
-    ProductInput,
-    Attributes,
-    ProductInputsServiceClient,
-    InsertProductInputRequest)
+import metrics
+import records
+import tables
+import tracing
+from auth import Configure as ac, CredentialPool, Shard
+
+# NOTE: pandas and the Merchant API client libraries are imported inside the
+# functions that use them, so the CLI starts fast and only pays the import cost
+# of the subsystem that actually runs.
+
+# clients
+_client_cache = {}
+_default_shards = {}
+_cache_lock = threading.Lock()  # clients are shared by the bulk/concurrent helpers
+# GetProduct responses, shared by the products menu, the landing page flow and bulk jobs
+product_cache = cache.TTLCache(max_size=2048, ttl=300.0)
+
+def _default_client_factory(client_cls, credentials):
+    return client_cls(credentials=credentials)
+
+_client_factory = _default_client_factory
+
+def set_client_factory(factory):
+    """Replaces how clients are built (`factory(client_cls, credentials)`), e.g.
+    to target the local fake API in `fakeapi.py`. Returns the previous factory."""
+    global _client_factory
+    previous = _client_factory
+    _client_factory = factory
+    return previous
+
+def get_shard(credentials, merchant_id=None):
+    """Returns the `auth.Shard` serving `merchant_id`.
+    A `CredentialPool` routes by merchant, plain credentials are wrapped in a
+    single default shard so every caller gets a rate limiter."""
+    if isinstance(credentials, CredentialPool):
+        return credentials.shard_for(merchant_id)
+    if isinstance(credentials, Shard):
+        return credentials
+    key = id(credentials)
+    with _cache_lock:
+        shard = _default_shards.get(key)
+        if shard is None:
+            shard = Shard("default", credentials)
+            _default_shards[key] = shard
+    return shard
+
+def get_client(client_cls, credentials, merchant_id=None):
+    """Returns a cached `client_cls` instance for the merchant's credential shard
+    so gRPC channels stay open across calls instead of being rebuilt each time.
+    Clients are wrapped in `metrics.InstrumentedClient` to record every RPC."""
+    shard_credentials = get_shard(credentials, merchant_id).credentials
+    key = (client_cls.__name__, id(shard_credentials))
+    with _cache_lock:
+        cached = _client_cache.get(key)
+        if cached is None:
+            # keep a reference to the credentials so the id() key stays valid
+            client = metrics.InstrumentedClient(_client_factory(client_cls, shard_credentials))
+            cached = (shard_credentials, client)
+            _client_cache[key] = cached
+    return cached[1]
+
+def throttle(credentials, merchant_id=None, priority=dispatch.NORMAL):
+    """Waits for the merchant's turn in its shard's request scheduler and rate limiter,
+    returns the seconds waited. A `dispatch.priority()` block overrides `priority`."""
+    shard = get_shard(credentials, merchant_id)
+    waited = shard.scheduler.acquire(shard.limiter, dispatch.current_priority(priority), merchant_id)
+    metrics.registry.record_throttle(waited)
+    return waited
+
+def prefetch_pages(credentials, merchant_id, list_method, make_request, depth=2, priority=dispatch.BULK,
+                   retry_method="list"):
+    """Yields the responses of a paged list call, `list_method(request=make_request(page_token))`.
+    A background thread requests page N+1 as soon as page N arrives, so the caller
+    processes page N while the next one is on the wire. At most `depth` fetched pages
+    wait in the queue and requests still go out one at a time through `throttle`,
+    429 errors are retried with backoff (recorded as `retry_method` retries).
+    An error of the list call is raised to the caller after the pages before it."""
+    import queue
+    from google.api_core.exceptions import TooManyRequests, ResourceExhausted
+    max_retries = 5
+    base_sleep = 1.0
+    pages = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+    level = dispatch.current_priority(priority)
+    parent = tracing.current_span()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def request_page(request):
+        retries = 0
+        while True:
+            try:
+                throttle(credentials, merchant_id, level)
+                return list_method(request=request)
+            except (TooManyRequests, ResourceExhausted):
+                if retries == max_retries or stop.is_set():
+                    raise
+                wait_time = base_sleep * (2 ** retries) * random.uniform(0.8, 1.2)
+                metrics.registry.record_retry(retry_method)
+                time.sleep(wait_time)
+                retries += 1
+
+    def fetch():
+        page_token = None
+        end = (None, None)
+        with tracing.attach(parent):
+            try:
+                while not stop.is_set():
+                    response = request_page(make_request(page_token))
+                    page_token = response.next_page_token
+                    if not put((response, None)) or not page_token:
+                        break
+            except BaseException as e:
+                end = (None, e)
+            finally:
+                # always queue the end marker, the caller blocks on the queue
+                put(end)
+
+    threading.Thread(target=fetch, name=f"pager-{merchant_id}", daemon=True).start()
+    try:
+        while True:
+            response, error = pages.get()
+            if error is not None:
+                raise error
+            if response is None:
+                return
+            yield response
+    finally:
+        # a caller that stops early ends the fetcher after its current request
+        stop.set()
+
+def clear_clients():
+    """Drops all cached clients, closing their transports."""
+    for _, client in _client_cache.values():
+        try:
+            client.transport.close()
+        except Exception:
+            pass
+    _client_cache.clear()
+    _default_shards.clear()
+
+def load_merchants(merchants=None):
+    """Returns `merchants`, or the merchant-info.json registry if None."""
+    if merchants is not None:
+        return merchants
+    with tracing.span("load_registry"):
+        return ac.read_merchant_ids()
 
 # accounts
-def get_accounts(credentials):
+def get_accounts(credentials, merchants=None):
     """Retrieves all top and sub-account information and returns as a dictionary and table."""
-    client = AccountsServiceClient(credentials=credentials)
+    import pandas as pd
+    from google.shopping.merchant_accounts_v1beta import AccountsServiceClient, GetAccountRequest
     account_count = 0
-    merchant_ids = ac.read_merchant_ids()
+    merchant_ids = load_merchants(merchants)
     accounts_data = []
     for merchant in merchant_ids:
         prop_name = merchant.get('propName')
@@ -47,8 +175,10 @@ def get_accounts(credentials):
             print(f"Skipping entry {prop_name} due to missing 'merchantId'")
             continue
         parent = f"accounts/{merchant_id}"
+        client = get_client(AccountsServiceClient, credentials, merchant_id)
         request = GetAccountRequest(name=parent)
         try:
+            throttle(credentials, merchant_id)
             response = client.get_account(request=request)
             account_info = {
                 "prop": prop_name,
@@ -68,12 +198,14 @@ def get_accounts(credentials):
     prop_table = pd.DataFrame(accounts_data).sort_values('prop')
     return prop_dict, prop_table, account_count
 
-def get_account_errors(credentials):
+def get_account_errors(credentials, merchants=None):
     """Retrieves all account issues for a list of merchant accounts."""
-    client = AccountIssueServiceClient(credentials=credentials)
+    from google.shopping.merchant_accounts_v1beta import AccountIssueServiceClient, ListAccountIssuesRequest
     account_issues_count = 0
-    merchant_ids = ac.read_merchant_ids()
-    account_issues_data = []
+    merchant_ids = load_merchants(merchants)
+    account_issues_data = tables.ColumnBuilder(
+        ("prop", "mID", "issueID", "title", "severity", "detail", "doc_uri"),
+        categories=("prop", "mID", "severity"))
     for merchant in merchant_ids:
         prop_name = merchant.get("propName")
         merchant_id = merchant.get("merchantId")
@@ -81,21 +213,16 @@ def get_account_errors(credentials):
             print(f"Merchant ID missing for {prop_name}! Skipping...")
             continue
         parent = f"accounts/{merchant_id}"
+        client = get_client(AccountIssueServiceClient, credentials, merchant_id)
         request = ListAccountIssuesRequest(parent=parent)
         try:
+            throttle(credentials, merchant_id)
             response = client.list_account_issues(request=request)
             prop_issue_count = 0  # issue tracking for specific prop
             for issue in response:        
-                account_issue = {
-                    "prop": prop_name,
-                    "mID": merchant_id,
-                    "issueID": issue.name,
-                    "title": issue.title,
-                    "severity": issue.severity.name,
-                    "detail": issue.detail,
-                    "doc_uri": issue.documentation_uri,
-                }
-                account_issues_data.append(account_issue)
+                account_issues_data.append(
+                    prop_name, merchant_id, issue.name, issue.title,
+                    issue.severity.name, issue.detail, issue.documentation_uri)
                 account_issues_count += 1
                 prop_issue_count += 1
             # print(f"'{prop_name}' has {prop_issue_count} issue(s).")
@@ -106,22 +233,23 @@ def get_account_errors(credentials):
             print(f"Unexpected error for {prop_name}: {e}")
     # sort issues by severity (CRITICAL > ERROR > SEVERITY_UNSPECIFIED > SUGGESTION).
     severity_order = {"CRITICAL": 1, "ERROR": 2, "SEVERITY_UNSPECIFIED": 3, "SUGGESTION": 4}
-    account_issues_data.sort(key=lambda x: severity_order.get(x["severity"], 5))
+    account_issues_data.order_by("severity", key=lambda severity: severity_order.get(severity, 5))
     # transform to df table
-    account_issues_table = (
-        pd.DataFrame(account_issues_data).sort_values('prop') 
-        if account_issues_data 
-        else pd.DataFrame())
+    account_issues_table = account_issues_data.to_frame(sort_by="prop")
     return account_issues_data, account_issues_table, account_issues_count
 
 # feeds / data sources
-def get_feeds_list(credentials):
+def get_feeds_list(credentials, merchants=None, failed=None):
     """Complies the `DataSource` resources for all accounts in the merchant-info file.
-    Returns a list of feed status data and a formatted DataFrame."""
-    client = DataSourcesServiceClient(credentials=credentials)
+    Returns a list of feed status data and a formatted DataFrame. The IDs of
+    merchants whose list request failed are added to the `failed` set if given."""
+    from google.shopping.merchant_datasources_v1beta import DataSourcesServiceClient, ListDataSourcesRequest
     feed_count = 0
-    merchant_ids = ac.read_merchant_ids()
-    all_feed_data = []
+    merchant_ids = load_merchants(merchants)
+    all_feed_data = tables.ColumnBuilder(
+        ("prop", "mID", "feed_name", "feed_id", "feed_type", "countries", "language", "feed_label",
+         "url", "fetch_time", "fetch_timezone", "fetch_frequency", "feed_resource_id"),
+        categories=("prop", "mID", "feed_type", "language", "feed_label", "fetch_timezone"))
     for merchant in merchant_ids:
         prop_name = merchant.get("propName")
         merchant_id = merchant.get("merchantId")
@@ -129,154 +257,167 @@ def get_feeds_list(credentials):
             print(f"Merchant ID missing for {prop_name}! Skipping...")
             continue
         parent = f"accounts/{merchant_id}"
+        client = get_client(DataSourcesServiceClient, credentials, merchant_id)
         request = ListDataSourcesRequest(parent=parent)
-        try:
-            response = client.list_data_sources(request=request)
-            for data_source in response.data_sources:
-                feed_type = next(
-                    (
-                        attr.replace("_data_source", "")
-                        for attr in [
-                            "primary_product_data_source",
-                            "supplemental_product_data_source",
-                            "local_inventory_data_source",
-                            "regional_inventory_data_source",
-                            "promotion_data_source",
-                        ]
-                        if getattr(data_source, attr, None)
-                    ),
-                    "undefined",
-                )
-                url = getattr(data_source.file_input.fetch_settings, "fetch_uri", None)
-                countries = getattr(data_source.primary_product_data_source, "countries", None)
-                language = getattr(data_source.primary_product_data_source, "content_language", None)
-                feed_label = getattr(data_source.primary_product_data_source, "feed_label", None)
-                fetch_time = getattr(data_source.file_input.fetch_settings, "time_of_day", None)
-                fetch_timezone = getattr(data_source.file_input.fetch_settings, "time_zone", None)
-                fetch_frequency = getattr(data_source.file_input.fetch_settings, "frequency", None)
-                if feed_type == "undefined" and url:
-                    feed_type = "review"
-                prop_feed_data = {
-                    "prop": prop_name,
-                    "mID": merchant_id,
-                    "feed_name": data_source.display_name,
-                    "feed_id": data_source.data_source_id,
-                    "feed_type": feed_type,
-                    "countries": countries,
-                    "language": language,
-                    "feed_label": feed_label,
-                    "url": url,
-                    "fetch_time": fetch_time,
-                    "fetch_timezone": fetch_timezone,
-                    "fetch_frequency": fetch_frequency,
-                    "feed_resource_id": data_source.name
-                }
-                all_feed_data.append(prop_feed_data)
-                feed_count += 1
-        except RuntimeError as e:
-            print(f"List request failed for {prop_name}: {e}")
-        except Exception as e:
-            print(f"Unexpected error for {prop_name}: {e}")
-    feed_table = (
-        pd.DataFrame(all_feed_data).sort_values('prop')
-        if all_feed_data
-        else pd.DataFrame()
-    )
+        with tracing.span("merchant_feeds", prop=prop_name, merchant_id=merchant_id):
+            try:
+                throttle(credentials, merchant_id)
+                response = client.list_data_sources(request=request)
+                for data_source in response.data_sources:
+                    feed_type = next(
+                        (
+                            attr.replace("_data_source", "")
+                            for attr in [
+                                "primary_product_data_source",
+                                "supplemental_product_data_source",
+                                "local_inventory_data_source",
+                                "regional_inventory_data_source",
+                                "promotion_data_source",
+                            ]
+                            if getattr(data_source, attr, None)
+                        ),
+                        "undefined",
+                    )
+                    url = getattr(data_source.file_input.fetch_settings, "fetch_uri", None)
+                    countries = getattr(data_source.primary_product_data_source, "countries", None)
+                    language = getattr(data_source.primary_product_data_source, "content_language", None)
+                    feed_label = getattr(data_source.primary_product_data_source, "feed_label", None)
+                    fetch_time = getattr(data_source.file_input.fetch_settings, "time_of_day", None)
+                    fetch_timezone = getattr(data_source.file_input.fetch_settings, "time_zone", None)
+                    fetch_frequency = getattr(data_source.file_input.fetch_settings, "frequency", None)
+                    if feed_type == "undefined" and url:
+                        feed_type = "review"
+                    all_feed_data.append(
+                        prop_name, merchant_id, data_source.display_name, data_source.data_source_id,
+                        feed_type, countries, language, feed_label, url, fetch_time, fetch_timezone,
+                        fetch_frequency, data_source.name)
+                    feed_count += 1
+            except RuntimeError as e:
+                print(f"List request failed for {prop_name}: {e}")
+                if failed is not None:
+                    failed.add(str(merchant_id))
+            except Exception as e:
+                print(f"Unexpected error for {prop_name}: {e}")
+                if failed is not None:
+                    failed.add(str(merchant_id))
+    feed_table = all_feed_data.to_frame(sort_by="prop")
     return all_feed_data, feed_table, feed_count
 
-def get_feed_status(credentials, all_feed_data):
-    """
-    Fetches the processing status of each feed in `all_feed_data`.
-    If the processing state is FAILED, collects issues and allows reprocessing.
-    Implements rate limiting and retries on 429 errors.
-    Returns a list of feed status data and a formatted DataFrame.
-    """
-    client = FileUploadsServiceClient(credentials=credentials)
-    feed_status_data = []
-    failed_feeds = []
-    fail_count = 0
-    not_fail_count = 0
-    request_interval = 0.25  # 4 requests/sec limit (500 per minute)
+def get_latest_upload(credentials, feed, client=None):
+    """Fetches `fileUploads/latest` of a feed with rate limiting and retries on 429 errors.
+    Returns the `FileUpload` or None if it could not be fetched."""
+    from google.api_core.exceptions import TooManyRequests
+    from google.shopping.merchant_datasources_v1beta import FileUploadsServiceClient, GetFileUploadRequest
     max_retries = 5
     base_sleep = 1.0
-    for idx, feed in enumerate(all_feed_data):
-        prop_name = feed["prop"]
-        merchant_id = feed["mID"]
-        feed_url = feed["url"]
-        feed_name = feed["feed_name"]
-        feed_id = feed["feed_id"]
-        feed_resource_id = feed['feed_resource_id']
-        upload_id = f"{feed_resource_id}/fileUploads/latest"
-        request = GetFileUploadRequest(name=upload_id)
-        retries = 0
+    retry_method = "FileUploads.get_file_upload"
+    prop_name = feed["prop"]
+    merchant_id = feed["mID"]
+    upload_id = f"{feed['feed_resource_id']}/fileUploads/latest"
+    request = GetFileUploadRequest(name=upload_id)
+    client = client or get_client(FileUploadsServiceClient, credentials, merchant_id)
+    retries = 0
+    with tracing.span("feed_status", prop=prop_name, feed=feed["feed_name"], feed_id=feed["feed_id"]):
         while retries <= max_retries:
             try:
-                response = client.get_file_upload(request=request)
-                processed_status = response.processing_state.name
-                if processed_status == "FAILED" and response.issues:
-                    for issue in response.issues:
-                        failed_feed_data = {
-                            "prop": prop_name,
-                            # "mID": merchant_id,
-                            "feed_name": feed_name,
-                            "feed_id": feed_id,
-                            "status": processed_status,
-                            "i_title": issue.title,
-                            "i_severity": issue.severity.name,
-                            # "issue_desc": issue.description, 
-                            # "items_total": response.items_total,
-                            # "items_created": response.items_created,
-                            # "items_updated": response.items_updated,
-                            # "upload_time": response.upload_time,
-                            # "feed_url": feed_url,
-                            "feed_resource_id": feed_resource_id,
-                        }
-                        status_data = {
-                            "prop": prop_name,
-                            "mID": merchant_id,
-                            "feed_name": feed_name,
-                            "feed_id": feed_id,
-                            "status": processed_status,
-                            "items_total": response.items_total,
-                            "feed_url": feed_url,
-                        }
-                        failed_feeds.append(failed_feed_data)
-                        feed_status_data.append(status_data)
-                    fail_count += 1
-                else:
-                    status_data = {
-                        "prop": prop_name,
-                        "mID": merchant_id,
-                        "feed_name": feed_name,
-                        "feed_id": feed_id,
-                        "status": processed_status,
-                        "items_total": response.items_total,
-                        "feed_url": feed_url,
-                    }
-                    feed_status_data.append(status_data)
-                    # print(f"Prop: {prop_name} / Feed: {feed['feed_name']} - Status: {processed_status}")
-                    # print(f"Prop: {prop_name} / Feed {idx + 1}/{len(all_feed_data)}: {feed['feed_name']} - Status: {processed_status}")
-                    not_fail_count += 1
-                time.sleep(request_interval)
-                break  # if success exit retry loop
+                throttle(credentials, merchant_id)  # 4 requests/sec limit per shard
+                return client.get_file_upload(request=request)
             except TooManyRequests as e:
                 if retries == max_retries:
                     print(f"Max retries reached for {prop_name} / Feed: {feed['feed_name']}. Skipping...")
                     break
                 wait_time = base_sleep * (2 ** retries) * random.uniform(0.8, 1.2)
                 print(f"Rate limit reached for {prop_name} / Feed: {feed['feed_name']}, Retrying in {wait_time:.2f} seconds...")
+                metrics.registry.record_retry(retry_method)
                 time.sleep(wait_time)
                 retries += 1
             except Exception as e:
                 error_message = str(e).split("\n")[0]
                 print(f"\nERROR: {prop_name} / {feed['feed_name']} - {error_message}\n")
                 break
+    return None
+
+def get_latest_uploads(credentials, feeds, workers=4):
+    """Fetches the latest upload of every feed, `workers` requests in flight at a time
+    (all of them still pass the per-shard rate limiters). Returns the uploads in feed order."""
+    from concurrent.futures import ThreadPoolExecutor
+    from google.shopping.merchant_datasources_v1beta import FileUploadsServiceClient
+    clients = [get_client(FileUploadsServiceClient, credentials, feed["mID"]) for feed in feeds]
+    if workers <= 1 or len(feeds) <= 1:
+        return [get_latest_upload(credentials, feed, client) for feed, client in zip(feeds, clients)]
+    parent = tracing.current_span()
+
+    def fetch(feed, client):
+        # worker threads nest their feed spans under the caller's span
+        with tracing.attach(parent):
+            return get_latest_upload(credentials, feed, client)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fetch, feeds, clients))
+
+def get_feed_status(credentials, all_feed_data, history=None, workers=4):
+    """
+    Fetches the processing status of each feed in `all_feed_data`.
+    If the processing state is FAILED, collects issues and allows reprocessing.
+    Implements rate limiting and retries on 429 errors, `workers` feeds are polled concurrently.
+    Every poll (and upload) is appended to `history` (a `history.FeedHistory`) if given.
+    Returns a list of feed status data and a formatted DataFrame.
+    """
+    feed_status_data = tables.ColumnBuilder(
+        ("prop", "mID", "feed_name", "feed_id", "status", "items_total", "feed_url"),
+        categories=("prop", "mID", "status"), dtypes={"items_total": "int64"})
+    failed_feeds = []
+    polls = []
+    uploads = []
+    fail_count = 0
+    not_fail_count = 0
+    feeds = list(all_feed_data)
+    for feed, response in zip(feeds, get_latest_uploads(credentials, feeds, workers)):
+        if response is None:
+            continue
+        prop_name = feed["prop"]
+        merchant_id = feed["mID"]
+        feed_url = feed["url"]
+        feed_name = feed["feed_name"]
+        feed_id = feed["feed_id"]
+        feed_resource_id = feed['feed_resource_id']
+        processed_status = response.processing_state.name
+        polls.append((feed_resource_id, prop_name, merchant_id, feed_id, feed_name,
+                      processed_status, response.items_total, len(response.issues)))
+        uploads.append((feed_resource_id, prop_name, feed_name, response))
+        if processed_status == "FAILED" and response.issues:
+            for issue in response.issues:
+                failed_feed_data = {
+                    "prop": prop_name,
+                    # "mID": merchant_id,
+                    "feed_name": feed_name,
+                    "feed_id": feed_id,
+                    "status": processed_status,
+                    "i_title": issue.title,
+                    "i_severity": issue.severity.name,
+                    # "issue_desc": issue.description, 
+                    # "items_total": response.items_total,
+                    # "items_created": response.items_created,
+                    # "items_updated": response.items_updated,
+                    # "upload_time": response.upload_time,
+                    # "feed_url": feed_url,
+                    "feed_resource_id": feed_resource_id,
+                }
+                failed_feeds.append(failed_feed_data)
+                feed_status_data.append(prop_name, merchant_id, feed_name, feed_id,
+                                        processed_status, response.items_total, feed_url)
+            fail_count += 1
+        else:
+            feed_status_data.append(prop_name, merchant_id, feed_name, feed_id,
+                                    processed_status, response.items_total, feed_url)
+            # print(f"Prop: {prop_name} / Feed: {feed['feed_name']} - Status: {processed_status}")
+            not_fail_count += 1
+    if history is not None and polls:
+        history.record(polls)
+        history.record_uploads(uploads)
     severity_order = {"FAILED": 1, "IN_PROGRESS": 2, "PROCESSING_STATE_UNSPECIFIED": 3, "SUCCEEDED": 4}
-    feed_status_data.sort(key=lambda x: severity_order.get(x['status'], 5))
-    feed_status_table = (
-        pd.DataFrame(feed_status_data).sort_values("prop")
-        if feed_status_data else pd.DataFrame()
-    )
+    feed_status_data.order_by("status", key=lambda status: severity_order.get(status, 5))
+    feed_status_table = feed_status_data.to_frame(sort_by="prop")
     return feed_status_data, feed_status_table, failed_feeds, fail_count, not_fail_count
 
 def fetch_feed(credentials, feed_info):
@@ -284,106 +425,128 @@ def fetch_feed(credentials, feed_info):
     Reprocesses feeds with errors by calling `fetch_data_source`.
     Implements rate limiting and retries on 429 errors.
     """
-    client = DataSourcesServiceClient(credentials=credentials)
-    request_interval = 0.25  # 4 requests/sec limit (500 per minute)
+    from google.api_core.exceptions import TooManyRequests, ResourceExhausted
+    from google.shopping.merchant_datasources_v1beta import DataSourcesServiceClient, FetchDataSourceRequest
     max_retries = 5
     base_sleep = 1.0
+    retry_method = "DataSources.fetch_data_source"
     for feed in feed_info:
         prop_name = feed["prop"]
+        merchant_id = helpers.merchant_id_from_resource(feed["feed_resource_id"])
+        client = get_client(DataSourcesServiceClient, credentials, merchant_id)
         retries = 0
-        while retries <= max_retries:
-            try:
-                request = FetchDataSourceRequest(name=feed["feed_resource_id"])
-                print(f"Reprocessing initiated for feed: {prop_name} / {feed['feed_name']}")
-                response = client.fetch_data_source(request=request)
-                break 
-            except (TooManyRequests, ResourceExhausted):
-                if retries == max_retries:
-                    print(f"Max retries reached for {prop_name} / Feed: {feed['feed_name']}. Skipping...")
+        with tracing.span("reprocess_feed", prop=prop_name, feed=feed["feed_name"]):
+            while retries <= max_retries:
+                try:
+                    request = FetchDataSourceRequest(name=feed["feed_resource_id"])
+                    print(f"Reprocessing initiated for feed: {prop_name} / {feed['feed_name']}")
+                    throttle(credentials, merchant_id, dispatch.INTERACTIVE)  # 4 requests/sec limit per shard
+                    response = client.fetch_data_source(request=request)
+                    break 
+                except (TooManyRequests, ResourceExhausted):
+                    if retries == max_retries:
+                        print(f"Max retries reached for {prop_name} / Feed: {feed['feed_name']}. Skipping...")
+                        break
+                    wait_time = base_sleep * (2 ** retries) * random.uniform(0.8, 1.2)
+                    print(f"Rate limit reached for {prop_name} / Feed: {feed['feed_name']}, Retrying in {wait_time:.2f} seconds...")
+                    metrics.registry.record_retry(retry_method)
+                    time.sleep(wait_time)
+                    retries += 1
+                except Exception as e:
+                    error_message = str(e).split("\n")[0]
+                    print(f"\nERROR: {prop_name} / {feed['feed_name']} - {error_message}\n")
                     break
-                wait_time = base_sleep * (2 ** retries) * random.uniform(0.8, 1.2)
-                print(f"Rate limit reached for {prop_name} / Feed: {feed['feed_name']}, Retrying in {wait_time:.2f} seconds...")
-                time.sleep(wait_time)
-                retries += 1
-            except Exception as e:
-                error_message = str(e).split("\n")[0]
-                print(f"\nERROR: {prop_name} / {feed['feed_name']} - {error_message}\n")
-                break
-        time.sleep(request_interval)
 
 # products
 def get_product_single(credentials):
     """Gets the specified `Product` resource.
-    Product resource name/ID has the format `channel~contentLanguage~feedLabel~offerId`"""
-    client = ProductsServiceClient(credentials=credentials)
-    product_resource_id = input("Enter a product resource name: ")
-    request = GetProductRequest(name=product_resource_id)
+    Product resource name/ID has the format `channel~contentLanguage~feedLabel~offerId`,
+    an offer ID, GTIN or product link is looked up in the product index.
+    Returns (None, None) if no product was found."""
+    product_resource_id = choose_product(input("Enter a product resource name, offer ID, GTIN or product link: "))
+    if not product_resource_id:
+        return None, None
     try:
-        response = client.get_product(request=request)
+        response = get_product(credentials, product_resource_id)
         original_product_info = response
-        product_entry = {
-            "feed_resource_id": response.data_source,
-            "product_resource_id": response.name,
-            "productID": response.offer_id,
-            "product_name": str(getattr(response.attributes, "title", None)),
-            "product_price": getattr(response.attributes, "price", None),
-            "product_sale_price": getattr(response.attributes,"sale_price", None),
-            "product_link": str(getattr(response.attributes, "link", None)),
-            "mobile_link": str(getattr(response.attributes, "mobile_link", None)),
-            "canonical_link": str(getattr(response.attributes, "canonical_link", None)),
-            "image_link": str(getattr(response.attributes, "image_link", None)),
-            "ads_redirect": str(getattr(response.attributes, "ads_redirect", None)),
-            "display_ads_link": str(getattr(response.attributes, "display_ads_link", None)),
-            "link_template": str(getattr(response.attributes, "link_template", None)),
-            "mobile_link_template": str(getattr(response.attributes, "mobile_link_template", None)),
-            "gtin": str(getattr(response.attributes, "gtin", None)),
-        }
-        if hasattr(response, "custom_attributes"):
-            product_entry["custom_attributes"] = [
-                {"name": attr.name, "value": attr.value} for attr in response.custom_attributes]
+        product_entry = records.product_details(response)
         return product_entry, original_product_info
-    except RuntimeError as e:
+    except Exception as e:
         print("Get failed")
         print(e)
+        return None, None
+
+def choose_product(term):
+    """Resolves an offer ID, GTIN or product link to a product resource name with the
+    product index (see productindex.py), asking which one when several products match.
+    Returns None if nothing matches."""
+    import productindex
+    term = term.strip()
+    if not term or term.startswith("accounts/"):
+        return term or None
+    with productindex.open_default() as index:
+        matches = index.find(term)
+    if not matches:
+        print(f"No indexed product matches '{term}', refresh the index with 'python productindex.py refresh'")
+        return None
+    if len(matches) == 1:
+        return matches[0]["product_name"]
+    print(f"'{term}' matches {len(matches)} products:")
+    for number, match in enumerate(matches, 1):
+        print(f"{number}. {match['prop']} ({match['merchant_id']}) - {match['product_name']} [{match['match']}]")
+    choice = input(f"Select 1-{len(matches)}: ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(matches):
+        return matches[int(choice) - 1]["product_name"]
+    return None
 
 def get_product_auto(credentials, product_id):
     """Gets the specified `Product` resource from 
     a supplied CSV or processed disapproved product data"""
-    client = ProductsServiceClient(credentials=credentials)
-    request = GetProductRequest(name=product_id)
     try:
-        response = client.get_product(request=request)
+        response = get_product(credentials, product_id)
         original_product_info = response
-        product_entry = {
-            "feed_resource_id": response.data_source,
-            "product_resource_id": response.name,
-            "productID": response.offer_id,
-            "product_name": str(getattr(response.attributes, "title", None)),
-            "product_price": getattr(response.attributes, "price", None),
-            "product_sale_price": getattr(response.attributes,"sale_price", None),
-            "product_link": str(getattr(response.attributes, "link", None)),
-            "mobile_link": str(getattr(response.attributes, "mobile_link", None)),
-            "canonical_link": str(getattr(response.attributes, "canonical_link", None)),
-            "image_link": str(getattr(response.attributes, "image_link", None)),
-            "ads_redirect": str(getattr(response.attributes, "ads_redirect", None)),
-            "display_ads_link": str(getattr(response.attributes, "display_ads_link", None)),
-            "link_template": str(getattr(response.attributes, "link_template", None)),
-            "mobile_link_template": str(getattr(response.attributes, "mobile_link_template", None)),
-            "gtin": str(getattr(response.attributes, "gtin", None)),
-        }
-        if hasattr(response, "custom_attributes"):
-            product_entry["custom_attributes"] = [
-                {"name": attr.name, "value": attr.value} for attr in response.custom_attributes
-            ]
+        product_entry = records.product_details(response)
         # print(f"Product: {product_entry['product_resource_id']} - success")
         return product_entry, original_product_info
     except RuntimeError as e:
         print(f"Get failed for {product_id}: {e}")
         return None
 
+def get_product(credentials, product_name, use_cache=True):
+    """Gets a `Product` resource with rate limiting and retries on 429 errors, raises on other errors.
+    Responses are kept in `product_cache` and concurrent lookups of one product share
+    a single RPC; `use_cache=False` always fetches. The returned message is shared, don't modify it."""
+    if not use_cache:
+        return _fetch_product(credentials, product_name)
+    return product_cache.get_or_load(product_name, lambda: _fetch_product(credentials, product_name))
+
+def _fetch_product(credentials, product_name):
+    from google.api_core.exceptions import TooManyRequests, ResourceExhausted
+    from google.shopping.merchant_products_v1beta import ProductsServiceClient, GetProductRequest
+    max_retries = 5
+    base_sleep = 1.0
+    retry_method = "Products.get_product"
+    merchant_id = helpers.merchant_id_from_resource(product_name)
+    client = get_client(ProductsServiceClient, credentials, merchant_id)
+    request = GetProductRequest(name=product_name)
+    retries = 0
+    while True:
+        try:
+            throttle(credentials, merchant_id, dispatch.INTERACTIVE)
+            return client.get_product(request=request)
+        except (TooManyRequests, ResourceExhausted):
+            if retries == max_retries:
+                raise
+            wait_time = base_sleep * (2 ** retries) * random.uniform(0.8, 1.2)
+            metrics.registry.record_retry(retry_method)
+            time.sleep(wait_time)
+            retries += 1
+
 def create_product_input(product_resource_id, original_product_entry):
     """Creates a `ProductInput` resource by copying existing attributes.
     Product resource name/ID has the format `channel~contentLanguage~feedLabel~offerId`"""
+    from google.shopping.type import Channel
+    from google.shopping.merchant_products_v1beta import ProductInput, Attributes
     account, channel, content_lang, feed_label, offer_id = helpers.parse_input_details(
         resource=product_resource_id
     )
@@ -399,116 +562,96 @@ def create_product_input(product_resource_id, original_product_entry):
 
 def insert_product_input(credentials, product_account, product_data_source, update_insert):
     # update_item as universal param for other product field update uses
-    client = ProductInputsServiceClient(credentials=credentials)
-    request = InsertProductInputRequest(
-        parent=product_account,
-        data_source=product_data_source,
-        product_input=update_insert,
-        )
     try:
-        response = client.insert_product_input(request=request)
+        response = send_product_input(credentials, product_account, product_data_source, update_insert)
         # product ID returned as response
         print(f"Input success!\n{response}")
-    except RuntimeError as e:
+    except Exception as e:
         print ("Input failed")
         print (e)
 
-def disapproved_products(credentials, prod_menu_choice):
-    """Lists and filters the disapproved `Product` resources for a given account with pagination."""
-    client = ProductsServiceClient(credentials=credentials)
-    merchant_ids = ac.read_merchant_ids()
-    disapproved_product_data = []    
+def send_product_input(credentials, product_account, product_data_source, product_input):
+    """Sends an `InsertProductInputRequest` with rate limiting and retries on 429 errors.
+    Returns the inserted `ProductInput` (the product is dropped from `product_cache`), raises on other errors."""
+    from google.api_core.exceptions import TooManyRequests, ResourceExhausted
+    from google.shopping.merchant_products_v1beta import ProductInputsServiceClient, InsertProductInputRequest
+    max_retries = 5
+    base_sleep = 1.0
+    retry_method = "ProductInputs.insert_product_input"
+    merchant_id = helpers.merchant_id_from_resource(product_account)
+    client = get_client(ProductInputsServiceClient, credentials, merchant_id)
+    request = InsertProductInputRequest(
+        parent=product_account,
+        data_source=product_data_source,
+        product_input=product_input,
+        )
+    retries = 0
+    while True:
+        try:
+            throttle(credentials, merchant_id, dispatch.INTERACTIVE)
+            response = client.insert_product_input(request=request)
+            break
+        except (TooManyRequests, ResourceExhausted):
+            if retries == max_retries:
+                raise
+            wait_time = base_sleep * (2 ** retries) * random.uniform(0.8, 1.2)
+            metrics.registry.record_retry(retry_method)
+            time.sleep(wait_time)
+            retries += 1
+    # the cached product is outdated once its input changed
+    for product_name in {response.product, product_name_from_input(product_account, product_input)} - {""}:
+        product_cache.invalidate(product_name)
+    return response
+
+def product_name_from_input(product_account, product_input):
+    """`Product` resource name of a `ProductInput` (`accounts/{id}/products/channel~lang~label~offerId`)."""
+    from google.shopping.type import Channel
+    channel = "local" if product_input.channel == Channel.ChannelEnum.LOCAL else "online"
+    return (f"{product_account}/products/{channel}~{product_input.content_language}"
+            f"~{product_input.feed_label}~{product_input.offer_id}")
+
+def disapproved_products(credentials, prod_menu_choice, merchants=None, summary=None):
+    """Lists and filters the disapproved `Product` resources for a given account with pagination.
+    `merchants` limits the scan to a subset of the merchant-info entries, a
+    `records.IssueSummary` passed as `summary` is updated with running aggregates."""
+    from google.shopping.merchant_products_v1beta import ProductsServiceClient, ListProductsRequest
+    merchant_ids = load_merchants(merchants)
+    disapproved_product_data = []
+    seen_entries = set()
+    extra_fields = records.PRODUCT_ISSUE_EXTRA_FIELDS.get(prod_menu_choice, ())
     for merchant in merchant_ids:
-        prop_name = merchant.get("propName")
+        prop_name = records.intern(merchant.get("propName"))
         merchant_id = merchant.get("merchantId")
         if not merchant_id:
             print(f"Skipping entry {prop_name} due to missing 'merchantId'")
             continue        
+        merchant_id = records.intern(str(merchant_id))
         parent = f"accounts/{merchant_id}"
-        page_token = None        
-        while True:
-            request = ListProductsRequest(parent=parent, page_token=page_token, page_size=250)
+        client = get_client(ProductsServiceClient, credentials, merchant_id)
+        with tracing.span("scan_merchant", prop=prop_name, merchant_id=merchant_id):
             try:
-                response = client.list_products(request=request)                
-                for product in response.products:
-                    product_name = getattr(product.attributes, "title", None)
-                    product_link = getattr(product.attributes, "link", None)
-                    product_price = getattr(product.attributes, "price", None)
-                    product_sale_price = getattr(product.attributes,"sale_price", None)
-                    feed_label = getattr(product.attributes, "feedLabel", None)
-                    mobile_link = getattr(product.attributes, "mobile_link", None)
-                    canonical_link = getattr(product.attributes, "canonical_link", None)
-                    image_link = getattr(product.attributes, "image_link", None)
-                    ads_redirect = getattr(product.attributes, "ads_redirect", None)
-                    display_ads_link = getattr(product.attributes, "display_ads_link", None)
-                    link_template = getattr(product.attributes, "link_template", None)
-                    mobile_link_template = getattr(product.attributes, "mobile_link_template", None)
-                    gtin = getattr(product.attributes, "gtin", None)
-                    advertised_price = product_sale_price if product_sale_price else product_price              
-                    for destination in product.product_status.destination_statuses:
-                        if not destination.disapproved_countries:
-                            continue  # skip if no disapprovals
-                        for issue in product.product_status.item_level_issues:
-                            issue_code = issue.code if issue else ""
-                            issue_severity = issue.severity.name if issue.severity else None
-                            issue_attribute = issue.attribute if issue else ""
-                            issue_description = issue.description if issue else ""                          
-                            conditions = { # define opt conditions
-                                "all_disapproved": issue_severity and issue_severity != "NOT_IMPACTED",
-                                "landing_page_errors": "landing_page_error" in issue_code,
-                                "broken_images": issue_code == "image_link_broken",
-                                "price_updates": "price" in issue_attribute,
-                                "policy_violations": "policy_violation" in issue_code,
-                                "invalid_upc": "invalid_upc" in issue_code,
-                                "no_impact": issue_severity == "NOT_IMPACTED",
-                            }
-                            if conditions.get(prod_menu_choice, False):
-                                product_entry = {
-                                    "prop": prop_name,
-                                    "merchantID": merchant_id,
-                                    "productID": product.offer_id,
-                                    "sold_price": advertised_price,
-                                    "product_name": product_name,
-                                    "product_link": product_link,
-                                    "product_resource_id": product.name,
-                                    "feed_label": feed_label,                                    
-                                    "i_code": issue_code,
-                                    "i_severity": issue_severity,
-                                    "i_attribute": issue_attribute,
-                                    "i_description": issue_description,
-                                    # "mobile_link": mobile_link,
-                                    # "canonical_link": canonical_link,
-                                    # "ads_redirect" : ads_redirect,
-                                    # "display_ads_link" : display_ads_link,
-                                    # "link_template" : link_template,
-                                    # "mobile_link_template" : mobile_link_template,
-                                }
-                                # image_link or gtin if opt
-                                if prod_menu_choice == "broken_images":
-                                    product_entry["imageLink"] = image_link
-                                if prod_menu_choice == "invalid_upc":
-                                    product_entry["gtin"] = gtin
-                                # remove dupes if any (due to multiple variants related to source product)                                
-                                if product_entry not in disapproved_product_data:
-                                  disapproved_product_data.append(product_entry)
-                page_token = response.next_page_token
-                if not page_token:
-                    break
+                # the next page is fetched while this one is classified
+                for response in prefetch_pages(
+                        credentials, merchant_id, client.list_products,
+                        lambda page_token: ListProductsRequest(parent=parent, page_token=page_token, page_size=250),
+                        retry_method="Products.list_products"):
+                    # raw protobuf products, no proto-plus wrapper per product / field
+                    # dupes (due to multiple variants related to source product) are skipped
+                    # before they reach the summary
+                    disapproved_product_data.extend(records.product_issue_records(
+                        response.products.pb, prop_name, merchant_id, prod_menu_choice, summary,
+                        seen=seen_entries))
             except RuntimeError as e:
                 print(f"List request failed for merchant {prop_name} (ID: {merchant_id})")
                 print(e)
-                break
     disapproved_product_count = len(disapproved_product_data)
-    disapproved_product_data_table = (
-        pd.DataFrame(disapproved_product_data).sort_values("prop")
-        if disapproved_product_data
-        else pd.DataFrame()
-    )
+    disapproved_product_data_table = records.product_issues_frame(disapproved_product_data, extra_fields)
     return disapproved_product_data, disapproved_product_data_table, disapproved_product_count
 
 def process_lp_errors_multi(credentials):
     """Processes product entries with landing page errors 
     from a CSV or processed 'disapproved product' list."""
+    import pandas as pd
     print("\nLanding Page Errors Report\n"
           "Choose an option:\n"
           "1. Provide a CSV file with product_resource_id values\n"
@@ -527,8 +670,8 @@ def process_lp_errors_multi(credentials):
             print(f"Error reading CSV file: {e}")
             return []
     elif choice == "2":
-        lp_errors_data, _ = disapproved_products(credentials=credentials, prod_menu_choice="landing_page_errors")
-        product_ids = [item["product_resource_id"] for item in lp_errors_data]
+        lp_errors_data, _, _ = disapproved_products(credentials=credentials, prod_menu_choice="landing_page_errors")
+        product_ids = [item.product_resource_id for item in lp_errors_data]
     else:
         print("Invalid choice. Please enter 1 or 2.")
         return []
@@ -553,66 +696,79 @@ def process_lp_errors_multi(credentials):
     )
     return all_lp_errors_data, all_lp_errors_table
 
-# testing with TWEU, FR Tennis Shoes
-def create_feed(credentials):
-    feed_account_id = "accounts/8813260"
-    client = DataSourcesServiceClient(credentials=credentials)
+def build_data_source(feed_entry):
+    """Builds a primary product `DataSource` fetched daily from a `helpers.process_file` entry
+    (account_id, feed_name, fetch_uri, content_lang, countries, feed_label and optionally
+    time_zone, fetch_hour). The fetch schedule defaults to the one configured in auth.py."""
+    from google.type import timeofday_pb2
+    from google.shopping.merchant_datasources_v1beta import DataSource, FileInput, PrimaryProductDataSource
+    config = ac().get_config()
     # Creates fetch settings for our file input
     fetch_settings = FileInput.FetchSettings()
     fetch_settings.enabled = True
     # Note that the system only respects hours for the fetch schedule.
-    fetch_settings.time_of_day = timeofday_pb2.TimeOfDay(hours=22)
-    fetch_settings.time_zone = "Europe/Luxembourg"
+    fetch_hour = feed_entry.get("fetch_hour")
+    fetch_settings.time_of_day = timeofday_pb2.TimeOfDay(
+        hours=int(fetch_hour) if str(fetch_hour or "").strip() else config["feed_fetch_hour"])
+    fetch_settings.time_zone = feed_entry.get("time_zone") or config["feed_fetch_time_zone"]
     fetch_settings.frequency = FileInput.FetchSettings.Frequency.FREQUENCY_DAILY
-    fetch_settings.fetch_uri = "https://www.tenniswarehouse-europe.com/bulk/new_google_footwear.html?lang=fr&vat=fr"
+    fetch_settings.fetch_uri = feed_entry["fetch_uri"]
     file_input = FileInput()
     file_input.fetch_settings = fetch_settings
     primary_datasource = PrimaryProductDataSource()
-    primary_datasource.countries = ["FR"]
-    primary_datasource.content_language = "fr"
-    primary_datasource.feed_label = "FR"
+    primary_datasource.countries = [country.strip() for country in feed_entry["countries"].split(",") if country.strip()]
+    primary_datasource.content_language = feed_entry["content_lang"]
+    primary_datasource.feed_label = feed_entry["feed_label"]
     primary_datasource.channel = PrimaryProductDataSource.Channel.ONLINE_PRODUCTS
     data_source = DataSource()
-    data_source.display_name = "FRANCE Tennis Shoes"
+    data_source.display_name = feed_entry["feed_name"]
     data_source.primary_product_data_source = primary_datasource
     data_source.file_input = file_input
+    return data_source
 
-    # debug testing for data source creation
-    print(f"Creating datasource for account: {feed_account_id}\n"
-          f"Feed Name: {data_source.display_name}\n"
-          f"Feed URI: {fetch_settings.fetch_uri}\n"
-          f"Feed Frequency: {fetch_settings.frequency}\n"
-          f"Feed Time of Day: {fetch_settings.time_of_day}\n"
-          f"Feed Time Zone: {fetch_settings.time_zone}\n"
-          f"Feed Channel: {primary_datasource.channel}\n"
-          f"Feed Content Language: {primary_datasource.content_language}\n"
-          f"Feed Countries: {primary_datasource.countries}\n"
-          f"Feed Label: {primary_datasource.feed_label}\n")
-    input("Press Enter to continue...")
-
-    request = CreateDataSourceRequest(parent=feed_account_id, data_source=data_source)
-    try:
-        response = client.create_data_source(request=request)
-        print(f"Datasource successfully created: {response}")
-    except RuntimeError as e:
-        print(f"Error creating datasource:\n{e}\n")
+def create_data_source(credentials, feed_entry):
+    """Creates one data source from a `helpers.process_file` entry with rate limiting
+    and retries on 429 errors. Returns the created `DataSource`, raises on other errors."""
+    from google.api_core.exceptions import TooManyRequests, ResourceExhausted
+    from google.shopping.merchant_datasources_v1beta import DataSourcesServiceClient, CreateDataSourceRequest
+    max_retries = 5
+    base_sleep = 1.0
+    retry_method = "DataSources.create_data_source"
+    merchant_id = str(feed_entry["account_id"])
+    client = get_client(DataSourcesServiceClient, credentials, merchant_id)
+    request = CreateDataSourceRequest(parent=f"accounts/{merchant_id}", data_source=build_data_source(feed_entry))
+    retries = 0
+    with tracing.span("create_feed", merchant_id=merchant_id, feed=feed_entry["feed_name"]):
+        while True:
+            try:
+                throttle(credentials, merchant_id)
+                return client.create_data_source(request=request)
+            except (TooManyRequests, ResourceExhausted):
+                if retries == max_retries:
+                    raise
+                wait_time = base_sleep * (2 ** retries) * random.uniform(0.8, 1.2)
+                metrics.registry.record_retry(retry_method)
+                time.sleep(wait_time)
+                retries += 1
 
 def get_shipping_info(credentials, merchant_id):
     # merchant_id = '547710616'  #TotalPadel-EN test
     """Retrieves the shipping settings for a specific merchant account."""
-    client = ShippingSettingsServiceClient(credentials=credentials)
+    from google.shopping.merchant_accounts_v1beta import ShippingSettingsServiceClient, GetShippingSettingsRequest
+    client = get_client(ShippingSettingsServiceClient, credentials, merchant_id)
     parent = f"accounts/{merchant_id}/shippingSettings"
     request = GetShippingSettingsRequest(name=parent)
     try:
+        throttle(credentials, merchant_id)
         response = client.get_shipping_settings(request=request)
         return response
     except RuntimeError as e:
         print(f"Failed to fetch shipping settings for {merchant_id}: {e}")
 
-def get_shipping_info_all(credentials):
+def get_shipping_info_all(credentials, merchants=None):
     """Retrieves the shipping settings for all accounts in the merchant-info file."""
-    client = ShippingSettingsServiceClient(credentials=credentials)
-    merchant_ids = ac.read_merchant_ids()
+    from google.shopping.merchant_accounts_v1beta import ShippingSettingsServiceClient, GetShippingSettingsRequest
+    merchant_ids = load_merchants(merchants)
     shipping_settings_data = []
     for merchant in merchant_ids:
         prop_name = merchant.get("propName")
@@ -621,8 +777,10 @@ def get_shipping_info_all(credentials):
             print(f"Merchant ID missing for {prop_name}! Skipping...")
             continue
         parent = f"accounts/{merchant_id}/shippingSettings"
+        client = get_client(ShippingSettingsServiceClient, credentials, merchant_id)
         request = GetShippingSettingsRequest(name=parent)
         try:
+            throttle(credentials, merchant_id)
             response = client.get_shipping_settings(request=request)
             shipping_settings = {
                 "prop": prop_name,
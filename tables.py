@@ -0,0 +1,86 @@
+"""
+Column-wise report building.
+
+Report functions used to append one dict per row and then call
+`pd.DataFrame(rows).sort_values(...)`, which stores every key per row, copies
+the data again into the frame and infers each column's dtype. `ColumnBuilder`
+appends values straight into per-column lists and builds the DataFrame from
+them, with low-cardinality columns such as prop, severity and status as
+categoricals.
+
+The builder is also a read-only sequence of rows (read-only mappings created
+on access), so code iterating the returned data, e.g. `get_feed_status` over
+the feeds of `get_feeds_list`, works unchanged. `rows()` returns editable
+copies.
+"""
+
+# imports
+from collections.abc import Sequence
+from types import MappingProxyType
+
+
+class ColumnBuilder(Sequence):
+    """Typed column arrays for one report.
+    `categories`: columns stored as categoricals, `dtypes`: {column: pandas dtype}."""
+
+    def __init__(self, columns, categories=(), dtypes=None):
+        self.columns = tuple(columns)
+        self.categories = frozenset(categories)
+        self.dtypes = dtypes or {}
+        self._data = [[] for _ in self.columns]
+        self._index = {column: index for index, column in enumerate(self.columns)}
+
+    @classmethod
+    def from_columns(cls, columns, categories=(), dtypes=None):
+        """Builds from a {column: list of values} dict, the lists are used as is."""
+        builder = cls(columns, categories, dtypes)
+        builder._data = [columns[column] for column in builder.columns]
+        return builder
+
+    def append(self, *values):
+        """Appends one row, `values` in column order."""
+        for column, value in zip(self._data, values):
+            column.append(value)
+
+    def column(self, name):
+        return self._data[self._index[name]]
+
+    def __len__(self):
+        return len(self._data[0]) if self._data else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        # read-only, a changed row would not be written back to the columns
+        return MappingProxyType({column: values[index] for column, values in zip(self.columns, self._data)})
+
+    def rows(self):
+        """All rows as a list of new dicts (e.g. for json.dumps or to edit)."""
+        return [dict(row) for row in self]
+
+    def order_by(self, column, key=None):
+        """Stable in-place sort of all columns by `column` (values mapped through `key`)."""
+        values = self.column(column)
+        sort_key = (lambda position: key(values[position])) if key else values.__getitem__
+        order = sorted(range(len(values)), key=sort_key)
+        self._data = [[data[position] for position in order] for data in self._data]
+        return self
+
+    def to_frame(self, sort_by=None):
+        """Builds a DataFrame, empty if no rows were added. Sorting is stable, so
+        an earlier `order_by` is kept within equal `sort_by` values."""
+        import pandas as pd
+        if not len(self):
+            return pd.DataFrame()
+        frame = pd.DataFrame({column: self._array(pd, column, values)
+                              for column, values in zip(self.columns, self._data)})
+        if sort_by:
+            frame = frame.sort_values(sort_by, kind="stable", ignore_index=True)
+        return frame
+
+    def _array(self, pd, column, values):
+        if column in self.categories:
+            return pd.Categorical(values)
+        if column in self.dtypes:
+            return pd.array(values, dtype=self.dtypes[column])
+        return values
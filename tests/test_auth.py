@@ -0,0 +1,84 @@
+"""Tests for the access token cache and background refresh, against a local token endpoint."""
+
+# imports
+import http.server
+import json
+import os
+import stat
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import auth
+
+
+class _TokenHandler(http.server.BaseHTTPRequestHandler):
+    """OAuth2 token endpoint stub issuing tok-1, tok-2, ... valid for `expires_in` seconds."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        server = self.server
+        server.issued += 1
+        body = json.dumps({"access_token": f"tok-{server.issued}", "expires_in": server.expires_in,
+                           "token_type": "Bearer"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def token_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _TokenHandler)
+    server.issued = 0
+    server.expires_in = 3600
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.token_uri = f"http://127.0.0.1:{server.server_address[1]}/token"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _credentials(token_uri):
+    import google.oauth2.credentials
+    return google.oauth2.credentials.Credentials(
+        None, refresh_token="refresh-token", client_id="client-id", client_secret="secret", token_uri=token_uri)
+
+def test_token_is_cached_with_owner_only_permissions(tmp_path, token_server):
+    config = {"token_cache_path": str(tmp_path / "authfiles" / "access-token-cache.json")}
+    credentials = auth.prepare_credentials(_credentials(token_server.token_uri), config, background_refresh=False)
+    assert credentials.token == "tok-1"
+    assert stat.S_IMODE(os.stat(config["token_cache_path"]).st_mode) == 0o600
+    # a second run reuses the cached token without calling the endpoint
+    credentials = auth.prepare_credentials(_credentials(token_server.token_uri), config, background_refresh=False)
+    assert credentials.token == "tok-1"
+    assert token_server.issued == 1
+
+def test_refresher_renews_before_lead_time(tmp_path, token_server):
+    token_server.expires_in = 3
+    cache = auth.TokenCache(str(tmp_path / "access-token-cache.json"))
+    credentials = _credentials(token_server.token_uri)
+    refresher = auth.TokenRefresher(credentials, cache, lead_time=2, retry_interval=0.1)
+    refresher.refresh()
+    first_expiry = credentials.expiry
+    refresher.start()
+    key = auth.TokenCache.cache_key(credentials)
+    try:
+        # the refresher updates the credentials, then the cache
+        deadline = time.monotonic() + 5
+        while cache._read().get(key, {}).get("token") == "tok-1" and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        refresher.stop()
+        refresher.join()
+    assert token_server.issued >= 2
+    assert credentials.token != "tok-1"
+    assert cache._read()[key]["token"] == credentials.token
+    # renewed about `lead_time` seconds before the first token expired
+    assert auth._utcnow() < first_expiry
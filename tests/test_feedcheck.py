@@ -0,0 +1,111 @@
+"""Tests for the feed source pre-checks, against local fixture files and a local HTTP server."""
+
+# imports
+import gzip
+import http.server
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import feedcheck
+
+RSS = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+       '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0"><channel><title>Shop</title>\n'
+       + "".join(f"<item><g:id>SKU{index}</g:id><title>Product {index}</title></item>\n" for index in range(3))
+       + "</channel></rss>\n")
+
+
+def _fixture(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return path.as_uri()
+
+def test_xml_ok(tmp_path):
+    result = feedcheck.check_feed(_fixture(tmp_path, "feed.xml", RSS.encode("utf-8")), expected_items=3)
+    assert (result["status"], result["format"], result["items"]) == ("ok", "XML", 3)
+
+def test_xml_truncated(tmp_path):
+    data = RSS.encode("utf-8")
+    result = feedcheck.check_feed(_fixture(tmp_path, "feed.xml", data[:len(data) // 2]))
+    assert result["status"] == "bad"
+    assert "truncated" in result["problems"]
+
+def test_gzip_xml(tmp_path):
+    result = feedcheck.check_feed(_fixture(tmp_path, "feed.xml.gz", gzip.compress(RSS.encode("utf-8"))))
+    assert (result["status"], result["items"]) == ("ok", 3)
+
+def test_gzip_truncated(tmp_path):
+    data = gzip.compress(RSS.encode("utf-8"))
+    result = feedcheck.check_feed(_fixture(tmp_path, "feed.xml.gz", data[:-10]))
+    assert result["status"] == "bad"
+    assert "truncated" in result["problems"]
+
+def test_tsv(tmp_path):
+    data = "id\ttitle\tprice\nSKU1\tShoe\t10 USD\nSKU2\tSock\t2 USD\n".encode("utf-8")
+    result = feedcheck.check_feed(_fixture(tmp_path, "feed.tsv", data))
+    assert (result["status"], result["format"], result["items"]) == ("ok", "TSV", 2)
+
+def test_tsv_last_row_truncated(tmp_path):
+    data = "id\ttitle\tprice\nSKU1\tShoe\t10 USD\nSKU2\tSo".encode("utf-8")
+    result = feedcheck.check_feed(_fixture(tmp_path, "feed.tsv", data))
+    assert result["status"] == "bad"
+    assert "truncated" in result["problems"]
+
+def test_utf16_csv(tmp_path):
+    data = "id,title\nSKU1,Café crème\nSKU2,Thé\n".encode("utf-16")
+    result = feedcheck.check_feed(_fixture(tmp_path, "feed.csv", data))
+    assert (result["status"], result["format"], result["items"]) == ("ok", "CSV", 2)
+
+def test_latin1_csv_is_a_warning(tmp_path):
+    data = "id,title\n1,Café crème\n".encode("latin-1")
+    result = feedcheck.check_feed(_fixture(tmp_path, "feed.csv", data))
+    assert (result["status"], result["items"]) == ("ok", 1)
+    assert result["problems"] == "warning: not valid UTF-8 near byte 14, read as ISO-8859-1"
+
+def test_latin1_after_first_chunk(tmp_path):
+    data = ("id,title\n" + "".join(f"{index},Plain title\n" for index in range(100))).encode("utf-8")
+    data += "100,Crème brûlée\n".encode("latin-1")
+    result = feedcheck.check_feed(_fixture(tmp_path, "feed.csv", data), chunk_size=64)
+    assert (result["status"], result["items"]) == ("ok", 101)
+    assert "ISO-8859-1" in result["problems"]
+
+def test_too_few_items(tmp_path):
+    result = feedcheck.check_feed(_fixture(tmp_path, "feed.xml", RSS.encode("utf-8")), expected_items=100)
+    assert result["status"] == "bad"
+    assert "3 items vs 100 expected" in result["problems"]
+
+def test_no_url():
+    assert feedcheck.check_feed(None)["problems"] == "no fetch URL"
+
+
+class _ShortResponseHandler(http.server.BaseHTTPRequestHandler):
+    """Announces a longer Content-Length than it sends, then closes the connection."""
+
+    def do_GET(self):
+        body = RSS.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body) + 500))
+        self.end_headers()
+        self.wfile.write(body)
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def short_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _ShortResponseHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/feed.xml"
+    server.shutdown()
+    server.server_close()
+
+def test_short_content_length(short_server):
+    result = feedcheck.check_feed(short_server, timeout=5)
+    assert result["status"] == "bad"
+    assert "truncated" in result["problems"]
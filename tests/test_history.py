@@ -0,0 +1,38 @@
+"""Tests for the feed health history store."""
+
+# imports
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history
+
+FEED = "accounts/123/dataSources/456"
+
+
+def _poll(status, items_total):
+    return (FEED, "prop", "123", 456, "Main feed", status, items_total, 0)
+
+def _store(tmp_path, polls):
+    store = history.FeedHistory(str(tmp_path / "history.sqlite"))
+    now = time.time()
+    for age, poll in enumerate(reversed(polls)):
+        store.record([poll], polled_at=now - age * 3600)
+    return store
+
+def test_item_count_drop(tmp_path):
+    with _store(tmp_path, [_poll("SUCCEEDED", 1000), _poll("SUCCEEDED", 1000), _poll("SUCCEEDED", 500)]) as store:
+        drops = store.item_count_drops(threshold=0.2, days=7)
+    assert [(drop["feed_resource_id"], drop["items_total"], drop["median_items"]) for drop in drops] == [(FEED, 500, 1000)]
+
+def test_in_progress_and_failed_polls_are_not_drops(tmp_path):
+    polls = [_poll("SUCCEEDED", 1000), _poll("FAILED", 0), _poll("SUCCEEDED", 1000), _poll("IN_PROGRESS", 0)]
+    with _store(tmp_path, polls) as store:
+        assert store.item_count_drops(threshold=0.2, days=7) == []
+
+def test_failed_polls_are_left_out_of_the_median(tmp_path):
+    polls = [_poll("FAILED", 0), _poll("FAILED", 0), _poll("SUCCEEDED", 1000), _poll("SUCCEEDED", 950)]
+    with _store(tmp_path, polls) as store:
+        assert store.item_count_drops(threshold=0.2, days=7) == []
@@ -0,0 +1,69 @@
+"""Tests for the disapproved products records and their summary."""
+
+# imports
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import records
+from google.shopping import merchant_products_v1beta as products
+
+
+def _multi_destination_product():
+    """A product disapproved in SHOPPING_ADS and FREE_LISTINGS with the same
+    landing page error reported once per reporting context."""
+    status = products.ProductStatus(
+        destination_statuses=[
+            products.ProductStatus.DestinationStatus(reporting_context="SHOPPING_ADS", disapproved_countries=["US"]),
+            products.ProductStatus.DestinationStatus(reporting_context="FREE_LISTINGS", disapproved_countries=["US"]),
+        ],
+        item_level_issues=[
+            products.ProductStatus.ItemLevelIssue(
+                code="landing_page_error", severity="DISAPPROVED", attribute="link",
+                reporting_context=context, description="Unavailable landing page")
+            for context in ("SHOPPING_ADS", "FREE_LISTINGS")
+        ])
+    product = products.Product(
+        name="accounts/123/products/online~en~US~SKU1", offer_id="SKU1", feed_label="US",
+        data_source="accounts/123/dataSources/456", product_status=status,
+        attributes=products.Attributes(title="Shoe", link="https://example.com/shoe"))
+    return products.Product.pb(product)
+
+def test_summary_counts_each_record_for_its_reporting_contexts():
+    summary = records.IssueSummary()
+    seen = set()
+    rows = list(records.product_issue_records(
+        [_multi_destination_product()], "prop", "123", "landing_page_errors", summary, seen=seen))
+    assert len(rows) == 1
+    assert summary.issues == {
+        ("prop", "landing_page_error", "DISAPPROVED", "SHOPPING_ADS"): 1,
+        ("prop", "landing_page_error", "DISAPPROVED", "FREE_LISTINGS"): 1,
+    }
+    assert summary.feeds == {("prop", "accounts/123/dataSources/456"): 1}
+
+def test_summary_skips_records_already_seen():
+    summary = records.IssueSummary()
+    seen = set()
+    product = _multi_destination_product()
+    for _ in range(2):
+        list(records.product_issue_records([product], "prop", "123", "landing_page_errors", summary, seen=seen))
+    assert sum(summary.issues.values()) == 2
+    assert summary.feeds == {("prop", "accounts/123/dataSources/456"): 1}
+
+def test_summary_falls_back_to_disapproved_destinations():
+    product = _multi_destination_product()
+    for issue in product.product_status.item_level_issues:
+        issue.ClearField("reporting_context")
+    summary = records.IssueSummary()
+    rows = list(records.product_issue_records([product], "prop", "123", "landing_page_errors", summary, seen=set()))
+    assert len(rows) == 1
+    assert sorted(key[3] for key in summary.issues) == ["FREE_LISTINGS", "SHOPPING_ADS"]
+    assert sum(summary.feeds.values()) == 1
+
+def test_summary_counts_only_the_issue_context():
+    product = _multi_destination_product()
+    del product.product_status.item_level_issues[1]
+    summary = records.IssueSummary()
+    list(records.product_issue_records([product], "prop", "123", "landing_page_errors", summary, seen=set()))
+    assert list(summary.issues) == [("prop", "landing_page_error", "DISAPPROVED", "SHOPPING_ADS")]
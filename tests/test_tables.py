@@ -0,0 +1,40 @@
+"""Tests for the column-wise report builder."""
+
+# imports
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import tables
+
+
+def make_builder():
+    builder = tables.ColumnBuilder(("feed", "status"), categories=("status",))
+    builder.append("a", "ok")
+    builder.append("b", "failed")
+    return builder
+
+
+def test_rows_on_access_are_read_only():
+    builder = make_builder()
+    assert builder[1] == {"feed": "b", "status": "failed"}
+    with pytest.raises(TypeError):
+        builder[0]["status"] = "failed"
+    with pytest.raises(TypeError):
+        builder[0:1][0]["status"] = "failed"
+    assert builder.column("status") == ["ok", "failed"]
+
+def test_rows_returns_editable_copies():
+    builder = make_builder()
+    rows = builder.rows()
+    assert json.dumps(rows) == '[{"feed": "a", "status": "ok"}, {"feed": "b", "status": "failed"}]'
+    rows[0]["status"] = "failed"
+    assert builder.column("status") == ["ok", "failed"]
+
+def test_to_frame_uses_categoricals():
+    frame = make_builder().to_frame()
+    assert list(frame["feed"]) == ["a", "b"]
+    assert frame["status"].dtype == "category"
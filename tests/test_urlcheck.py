@@ -0,0 +1,93 @@
+"""Tests for the local URL checks, against an aiohttp test server."""
+
+# imports
+import asyncio
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import urlcheck
+from aiohttp import web
+
+
+async def _ok(request):
+    return web.Response(text="ok")
+
+async def _head_not_allowed(request):
+    return web.Response(status=405)
+
+async def _redirect(request):
+    raise web.HTTPFound("/final")
+
+def _app():
+    app = web.Application()
+    app.router.add_get("/ok", _ok)
+    app.router.add_route("HEAD", "/get-only", _head_not_allowed)
+    app.router.add_get("/get-only", _ok, allow_head=False)
+    app.router.add_get("/old", _redirect)
+    app.router.add_get("/final", _ok)
+    return app
+
+def _closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _check(paths, urls=()):
+    """Serves the test app and checks its `paths` plus the extra `urls`, returns {url: result}."""
+    async def run():
+        runner = web.AppRunner(_app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        base = f"http://127.0.0.1:{runner.addresses[0][1]}"
+        try:
+            results = await urlcheck.check_urls_async([base + path for path in paths] + list(urls),
+                                                      delay=0, timeout=5)
+        finally:
+            await runner.cleanup()
+        return {url.replace(base, ""): result for url, result in results.items()}
+    return asyncio.run(run())
+
+def test_ok():
+    result = _check(["/ok"])["/ok"]
+    assert (result["ok"], result["status"], result["method"]) == (True, 200, "HEAD")
+
+def test_head_405_falls_back_to_get():
+    result = _check(["/get-only"])["/get-only"]
+    assert (result["ok"], result["status"], result["method"]) == (True, 200, "GET")
+
+def test_redirect_is_followed():
+    result = _check(["/old"])["/old"]
+    assert result["ok"]
+    assert result["final_url"].endswith("/final")
+    assert result["redirects"].endswith("/old -> " + result["final_url"])
+
+def test_not_found():
+    result = _check(["/missing"])["/missing"]
+    assert (result["ok"], result["status"], result["method"]) == (False, 404, "GET")
+
+def test_connection_refused():
+    url = f"http://127.0.0.1:{_closed_port()}/ok"
+    result = _check([], [url])[url]
+    assert not result["ok"]
+    assert result["status"] is None
+    assert result["error"]
+
+def test_invalid_url():
+    result = _check([], ["not a url"])["not a url"]
+    assert (result["ok"], result["error"]) == (False, "invalid URL")
+
+def test_identical_urls_checked_once():
+    assert len(_check(["/ok", "/ok"])) == 1
+
+def test_report_rows_with_surrounding_whitespace():
+    url = f"http://127.0.0.1:{_closed_port()}/ok"
+    table = pd.DataFrame({"product_resource_id": ["a", "b"], "product_link": [url, f"  {url} "]})
+    joined = urlcheck.check_report(table, "product_link", delay=0, timeout=5)
+    assert len(joined) == 2
+    assert joined["error"].notna().all()
+    assert list(joined["product_link"].sort_values()) == sorted([url, f"  {url} "])
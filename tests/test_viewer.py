@@ -0,0 +1,39 @@
+"""Tests for the paginated table viewer."""
+
+# imports
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import viewer
+
+
+def test_sort_by_column():
+    table = pd.DataFrame({"feed": ["b", "a", "c"], "items": [2, 3, 1]})
+    tv = viewer.TableViewer(table, page_size=10)
+    tv.command("s items desc")
+    assert list(tv.table["feed"]) == ["a", "b", "c"]
+    assert tv.status == "sorted by items desc"
+
+def test_sort_falls_back_to_text_for_uncomparable_values():
+    from google.type.timeofday_pb2 import TimeOfDay
+    table = pd.DataFrame({
+        "feed": ["b", "a", "c"],
+        "fetch_time": [TimeOfDay(hours=9), TimeOfDay(hours=22), TimeOfDay(hours=3)],
+    })
+    tv = viewer.TableViewer(table, page_size=10)
+    tv.command("s fetch_time")
+    # text order: "hours: 22" < "hours: 3" < "hours: 9"
+    assert list(tv.table["feed"]) == ["a", "c", "b"]
+    assert tv.status == "sorted by fetch_time (as text)"
+
+def test_sort_unknown_column():
+    tv = viewer.TableViewer(pd.DataFrame({"feed": ["a"]}), page_size=10)
+    tv.command("s nope")
+    assert tv.status == "No column 'nope'"
+
+def test_column_widths_with_empty_column():
+    table = pd.DataFrame({"feed": ["a", "bb"], "expected_items": [None, None]})
+    assert viewer.column_widths(table) == [4, len("expected_items")]
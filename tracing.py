@@ -0,0 +1,162 @@
+"""
+Optional span tracing for report pipelines.
+
+A small tracer recording OpenTelemetry-shaped spans (trace/span/parent IDs,
+unix nano timestamps, attributes, status) for pipeline phases and every RPC.
+Spans are exported to a local file, either as OTel-style JSON lines ('.jsonl')
+or in Chrome trace event format (any other extension), which opens as a flame
+chart in Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+
+Tracing is off by default and `span()` is a no-op until `enable()` is called.
+"""
+
+# imports
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+_enabled = False
+_trace_id = None
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Span(object):
+    """A finished or in-progress span."""
+    __slots__ = ("name", "span_id", "parent_span_id", "start_ns", "end_ns",
+                 "attributes", "status", "thread_id")
+
+    def __init__(self, name, parent_span_id, attributes):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.status = "OK"
+        self.thread_id = threading.get_ident()
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def to_dict(self):
+        return {
+            "trace_id": _trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "attributes": self.attributes,
+            "status": self.status,
+            "thread_id": self.thread_id,
+        }
+
+class _NoopSpan(object):
+    def set_attribute(self, key, value):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+def enable():
+    """Starts recording spans under a new trace ID."""
+    global _enabled, _trace_id
+    with _lock:
+        _enabled = True
+        _trace_id = os.urandom(16).hex()
+        _spans.clear()
+
+def is_enabled():
+    return _enabled
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Records a span around the block, nested under the current span of this thread."""
+    if not _enabled:
+        yield _NOOP_SPAN
+        return
+    stack = _stack()
+    current = Span(name, stack[-1].span_id if stack else None, attributes)
+    stack.append(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "ERROR"
+        current.attributes["exception"] = repr(e).split("\n")[0]
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        stack.pop()
+        with _lock:
+            _spans.append(current)
+
+def current_span():
+    """The innermost open span of this thread, None if there is none."""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+@contextlib.contextmanager
+def attach(parent):
+    """Nests the spans of this thread under `parent`, a span opened by another
+    thread (e.g. the one that started this worker). No-op if `parent` is None."""
+    if parent is None:
+        yield
+        return
+    stack = _stack()
+    stack.append(parent)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+def traced(name):
+    """Decorator recording a span named `name` around every call of the function."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def finished_spans():
+    with _lock:
+        return list(_spans)
+
+def to_chrome_trace(spans):
+    """Converts spans to Chrome trace event format (complete 'X' events)."""
+    events = []
+    for item in spans:
+        events.append({
+            "name": item.name,
+            "cat": "gmcm",
+            "ph": "X",
+            "ts": item.start_ns / 1000,
+            "dur": (item.end_ns - item.start_ns) / 1000,
+            "pid": os.getpid(),
+            "tid": item.thread_id,
+            "args": {**item.attributes, "span_id": item.span_id,
+                     "parent_span_id": item.parent_span_id, "status": item.status},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def export(path):
+    """Writes the recorded spans to `path`, returns the number of spans written."""
+    spans = sorted(finished_spans(), key=lambda item: item.start_ns)
+    with open(path, "w") as outfile:
+        if path.endswith(".jsonl"):
+            for item in spans:
+                outfile.write(json.dumps(item.to_dict(), default=str) + "\n")
+        else:
+            json.dump(to_chrome_trace(spans), outfile, default=str)
+    return len(spans)
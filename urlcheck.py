@@ -0,0 +1,140 @@
+"""
+Local landing page and image URL health checks.
+
+Checks the `product_link` / `imageLink` URLs of a disapproved products report
+concurrently with aiohttp, so fixes can be confirmed before reprocessing
+instead of waiting for Google to re-crawl. Identical URLs are checked once,
+each host gets its own small connection pool and a minimum delay between
+requests, HEAD is tried first with a GET fallback (many servers reject or
+mishandle HEAD) and redirect chains are collapsed into the final URL.
+
+Usage:
+  python urlcheck.py report.csv --column product_link --out url_check.csv
+"""
+
+# imports
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+RESULT_FIELDS = ("url", "ok", "status", "method", "final_url", "redirects", "elapsed_ms", "error")
+USER_AGENT = "GMCM-URL-Check/1.0"
+# HEAD responses that are retried with GET
+_HEAD_FALLBACK_STATUSES = (400, 403, 404, 405, 406, 500, 501, 503)
+
+
+class HostLimiter(object):
+    """Per-host concurrency limit and minimum delay between request starts."""
+
+    def __init__(self, per_host, delay):
+        self.per_host = per_host
+        self.delay = delay
+        self._hosts = {}
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = [asyncio.Semaphore(self.per_host), asyncio.Lock(), 0.0]
+        return state
+
+    async def __call__(self, host):
+        semaphore, lock, _ = state = self._host(host)
+        await semaphore.acquire()
+        async with lock:
+            wait = state[2] + self.delay - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            state[2] = time.monotonic()
+        return semaphore
+
+async def _request(session, method, url, timeout, max_redirects):
+    import aiohttp
+    async with session.request(method, url, allow_redirects=True, max_redirects=max_redirects,
+                               timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        if method == "GET":
+            await response.content.readany()  # first chunk only, the body is not needed
+        chain = [str(hop.url) for hop in response.history]
+        return response.status, str(response.url), chain
+
+async def check_url(session, limiter, url, timeout=15.0, max_redirects=10):
+    """Checks one URL, returns a result dict (see `RESULT_FIELDS`)."""
+    import aiohttp
+    result = {"url": url, "ok": False, "status": None, "method": "HEAD", "final_url": "",
+              "redirects": "", "elapsed_ms": None, "error": ""}
+    host = urlsplit(url).netloc.lower()
+    if not host:
+        result["error"] = "invalid URL"
+        return result
+    semaphore = await limiter(host)
+    start_time = time.perf_counter()
+    try:
+        status, final_url, chain = await _request(session, "HEAD", url, timeout, max_redirects)
+        if status in _HEAD_FALLBACK_STATUSES:
+            result["method"] = "GET"
+            status, final_url, chain = await _request(session, "GET", url, timeout, max_redirects)
+        result.update(status=status, ok=200 <= status < 300, final_url=final_url,
+                      redirects=" -> ".join(chain + [final_url]) if chain else "")
+    except aiohttp.TooManyRedirects:
+        result["error"] = f"more than {max_redirects} redirects"
+    except asyncio.TimeoutError:
+        result["error"] = f"timed out after {timeout}s"
+    except aiohttp.ClientError as e:
+        result["error"] = str(e).split("\n")[0] or type(e).__name__
+    finally:
+        semaphore.release()
+    result["elapsed_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+    return result
+
+async def check_urls_async(urls, concurrency=50, per_host=4, delay=0.1, timeout=15.0, max_redirects=10):
+    """Checks the unique URLs of `urls` concurrently, returns {url: result}."""
+    import aiohttp
+    unique = list(dict.fromkeys(url.strip() for url in urls if url and str(url).strip()))
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host, ttl_dns_cache=300)
+    limiter = HostLimiter(per_host, delay)
+    async with aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT}) as session:
+        results = await asyncio.gather(*(check_url(session, limiter, url, timeout, max_redirects) for url in unique))
+    return {result["url"]: result for result in results}
+
+def check_urls(urls, **kwargs):
+    """Synchronous wrapper for `check_urls_async`."""
+    return asyncio.run(check_urls_async(urls, **kwargs))
+
+def check_report(table, column, **kwargs):
+    """Checks the URLs in `column` of a report DataFrame, returns the report rows
+    joined with the check results (one row per report row)."""
+    import pandas as pd
+    start_time = time.time()
+    results = check_urls(table[column].dropna().astype(str).tolist(), **kwargs)
+    print(f"Checked {len(results)} unique URLs in {round(time.time() - start_time, 2)} seconds: "
+          f"{sum(result['ok'] for result in results.values())} OK, "
+          f"{sum(not result['ok'] for result in results.values())} failing")
+    checks = pd.DataFrame([results[url] for url in results], columns=RESULT_FIELDS).astype({"status": "Int64"})
+    key_columns = [name for name in ("prop", "product_resource_id") if name in table.columns]
+    # joined on the stripped URL, the key `check_urls_async` dedupes on
+    joined = table[key_columns + [column]].assign(url=table[column].astype(str).str.strip()).merge(
+        checks, how="left", on="url").drop(columns="url")
+    return joined.sort_values(["ok", "status"], kind="stable")
+
+def main():
+    parser = argparse.ArgumentParser(prog="urlcheck", description="Check report URLs locally")
+    parser.add_argument("report", help="CSV report, e.g. a saved landing_page_errors report")
+    parser.add_argument("--column", default="product_link", help="URL column (e.g. product_link, imageLink)")
+    parser.add_argument("--out", help="Write the results to this CSV file")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--per-host", type=int, default=4, help="Connections per host")
+    parser.add_argument("--delay", type=float, default=0.1, help="Minimum seconds between requests to a host")
+    parser.add_argument("--timeout", type=float, default=15.0)
+    args = parser.parse_args()
+    import pandas as pd
+    import helpers
+    joined = check_report(pd.read_csv(args.report), args.column, concurrency=args.concurrency,
+                          per_host=args.per_host, delay=args.delay, timeout=args.timeout)
+    if args.out:
+        joined.to_csv(args.out, index=False)
+        print(f"Results saved to {args.out}")
+    else:
+        helpers.display_table(joined)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Paginated table viewer for reports.
+
+Renders one page of a DataFrame at a time instead of formatting the whole
+table up front. Column widths are fixed once from the headers and a sample of
+rows, so a page renders in constant time regardless of the report size.
+
+Commands (at the ':' prompt):
+  ENTER / n        next page            p            previous page
+  g <page>         go to page           f <col> <text>  filter rows (substring, case-insensitive)
+  s <col> [desc]   sort by column       c            clear filters and sorting
+  h                help                 q            quit
+"""
+
+# imports
+import shutil
+import sys
+
+HELP = __doc__[__doc__.index("Commands"):]
+
+
+class TableViewer(object):
+    """Interactive pager over a DataFrame."""
+
+    def __init__(self, table, page_size=None, sample_size=200, max_width=40):
+        self.source = table
+        self.table = table
+        self.page = 0
+        self.page_size = page_size or max(5, shutil.get_terminal_size().lines - 8)
+        self.widths = column_widths(table, sample_size, max_width)
+        self.status = ""
+
+    @property
+    def page_count(self):
+        return max(1, -(-len(self.table) // self.page_size))
+
+    def render_page(self, page=None):
+        """Returns the lines of one page (header + rows)."""
+        page = self.page if page is None else page
+        start = page * self.page_size
+        rows = self.table.iloc[start:start + self.page_size]
+        return render_rows(list(self.table.columns), rows.itertuples(index=False, name=None), self.widths)
+
+    def show(self, out=None):
+        out = out or sys.stdout
+        out.write("\n".join(self.render_page()) + "\n")
+        out.write(f"Page {self.page + 1}/{self.page_count}, {len(self.table)} of {len(self.source)} rows"
+                  f"{' - ' + self.status if self.status else ''}  (h for help)\n")
+
+    def command(self, line):
+        """Runs a viewer command, returns False when the viewer should close."""
+        parts = line.strip().split(None, 2)
+        action = parts[0].lower() if parts else "n"
+        self.status = ""
+        if action == "q":
+            return False
+        if action == "n":
+            self.page = min(self.page + 1, self.page_count - 1)
+        elif action == "p":
+            self.page = max(self.page - 1, 0)
+        elif action == "g" and len(parts) == 2 and parts[1].isdigit():
+            self.page = min(max(int(parts[1]) - 1, 0), self.page_count - 1)
+        elif action == "f" and len(parts) == 3:
+            self.filter(parts[1], parts[2])
+        elif action == "s" and len(parts) >= 2:
+            self.sort(parts[1], descending=len(parts) == 3 and parts[2].lower() == "desc")
+        elif action == "c":
+            self.table, self.page = self.source, 0
+        elif action == "h":
+            self.status = "\n" + HELP
+        else:
+            self.status = f"Unknown command '{line.strip()}'"
+        return True
+
+    def filter(self, column, text):
+        if column not in self.table.columns:
+            self.status = f"No column '{column}'"
+            return
+        mask = self.table[column].astype(str).str.contains(text, case=False, regex=False, na=False)
+        self.table, self.page = self.table[mask], 0
+        self.status = f"filtered {column} ~ '{text}'"
+
+    def sort(self, column, descending=False):
+        if column not in self.table.columns:
+            self.status = f"No column '{column}'"
+            return
+        try:
+            self.table = self.table.sort_values(column, ascending=not descending, kind="stable")
+            how = ""
+        except TypeError:
+            # values that don't compare (e.g. TimeOfDay messages, repeated fields) sort as text
+            self.table = self.table.sort_values(column, ascending=not descending, kind="stable",
+                                                key=lambda values: values.astype(str))
+            how = " (as text)"
+        self.page = 0
+        self.status = f"sorted by {column}{' desc' if descending else ''}{how}"
+
+    def run(self):
+        while True:
+            self.show()
+            try:
+                line = input(": ")
+            except EOFError:
+                return
+            if not self.command(line):
+                return
+
+def column_widths(table, sample_size=200, max_width=40):
+    """Column widths from the headers and up to `sample_size` evenly spaced rows."""
+    import pandas as pd
+    step = max(1, len(table) // sample_size)
+    sample = table.iloc[::step].head(sample_size)
+    widths = []
+    for column in table.columns:
+        # missing values stay NaN in astype(str) on pandas 3, they count as empty
+        widest = sample[column].astype(str).str.len().max() if len(sample) else 0
+        widths.append(min(max(len(str(column)), 0 if pd.isna(widest) else int(widest)), max_width))
+    return widths
+
+def _cell(value, width):
+    text = "" if value is None else str(value).replace("\n", " ")
+    if len(text) > width:
+        text = text[:width - 1] + "…"
+    return text.ljust(width)
+
+def render_rows(headers, rows, widths):
+    """Grid lines for `headers` and an iterable of row tuples."""
+    border = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+    lines = [border,
+             "| " + " | ".join(_cell(header, width) for header, width in zip(headers, widths)) + " |",
+             border.replace("-", "=")]
+    for row in rows:
+        lines.append("| " + " | ".join(_cell(value, width) for value, width in zip(row, widths)) + " |")
+    lines.append(border)
+    return lines
+
+def view(table, page_size=None):
+    """Shows `table` (DataFrame or list of dicts). Interactive on a terminal,
+    otherwise streams every page to stdout."""
+    import pandas as pd
+    if not isinstance(table, pd.DataFrame):
+        table = pd.DataFrame(list(table))
+    if table.empty:
+        print("No rows to display.")
+        return
+    viewer = TableViewer(table, page_size=page_size)
+    if sys.stdin.isatty() and sys.stdout.isatty():
+        viewer.run()
+        return
+    frame = render_rows(list(table.columns), [], viewer.widths)
+    sys.stdout.write("\n".join(frame[:3]) + "\n")
+    for page in range(viewer.page_count):
+        sys.stdout.write("\n".join(viewer.render_page(page)[3:-1]) + "\n")
+    sys.stdout.write(frame[-1] + "\n")